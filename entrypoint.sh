@@ -27,10 +27,15 @@ echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear -v 2 || echo "Static files collection failed but continuing."
 
 echo "Starting Celery worker..."
-celery -A throwin worker --loglevel=info &
+celery -A throwin worker -Q celery,mail --loglevel=info &
 
 echo "Starting Celery beat..."
 celery -A throwin beat --loglevel=info &
 
+if [ "$ASGI_SERVER" = "True" ] || [ "$ASGI_SERVER" = "true" ]; then
+  echo "Starting Gunicorn server with Uvicorn workers (ASGI)..."
+  exec gunicorn throwin.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+fi
+
 echo "Starting Gunicorn server..."
 exec gunicorn throwin.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
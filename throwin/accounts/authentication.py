@@ -0,0 +1,165 @@
+"""
+JWT authentication backed by a cached user snapshot.
+
+simplejwt loads the user row on every request. Here the user, its profile and
+the restaurant relations read by the role properties are stored as a compact
+snapshot in a two tier cache (in-process + Redis), so authentication and the
+permission classes run without touching the database. Snapshots are dropped
+by the signals in ``accounts.signals`` whenever one of those rows changes, and
+are not cached again for a few seconds so a request that read the row before
+the change cannot cache the old values.
+"""
+
+import functools
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.choices import UserKind
+from common.cache import TwoTierCache
+
+# Never cache the password hash, it is loaded on demand as a deferred field
+EXCLUDED_USER_FIELDS = ("password",)
+
+user_cache = TwoTierCache(
+    "auth:user",
+    local_ttl=getattr(settings, "AUTH_USER_CACHE_LOCAL_TTL", 5),
+    remote_ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 300),
+)
+# Longer than a request takes from reading the user row to caching it
+INVALIDATION_HOLD = getattr(settings, "AUTH_USER_CACHE_INVALIDATION_HOLD", 10)
+
+
+def _attnames(model, exclude=()):
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in exclude]
+
+
+def _dump(instance, attnames):
+    values = []
+    for attname in attnames:
+        value = getattr(instance, attname)
+        if isinstance(value, models.fields.files.FieldFile):
+            value = value.name
+        values.append(value)
+    return tuple(values)
+
+
+def _load(model, attnames, values):
+    return model.from_db(None, attnames, list(values))
+
+
+def _models():
+    from accounts.models import UserProfile
+    from store.models import Restaurant
+
+    return get_user_model(), UserProfile, Restaurant
+
+
+@functools.cache
+def _schema():
+    """Fields stored in a snapshot, and a tag that changes whenever they do."""
+    User, UserProfile, Restaurant = _models()
+    fields = {
+        "user": _attnames(User, EXCLUDED_USER_FIELDS),
+        "profile": _attnames(UserProfile),
+        "restaurant": _attnames(Restaurant),
+    }
+    tag = zlib.crc32(repr(sorted(fields.items())).encode())
+    return fields, tag
+
+
+def _cache_key(user_id):
+    return f"{_schema()[1]}:{user_id}"
+
+
+def build_snapshot(user):
+    """Serialize the rows the authentication and permission layer read."""
+    fields, _ = _schema()
+    User, UserProfile, Restaurant = _models()
+    try:
+        profile = _dump(user.profile, fields["profile"])
+    except UserProfile.DoesNotExist:
+        profile = None
+
+    owner_restaurant = None
+    agent_restaurants = None
+    if user.kind == UserKind.RESTAURANT_OWNER:
+        restaurant = user.get_restaurant_owner_restaurant
+        owner_restaurant = _dump(restaurant, fields["restaurant"]) if restaurant else None
+    elif user.kind == UserKind.SALES_AGENT:
+        restaurants = user.get_agent_restaurants or []
+        agent_restaurants = [_dump(restaurant, fields["restaurant"]) for restaurant in restaurants]
+
+    return {
+        "user": _dump(user, fields["user"]),
+        "profile": profile,
+        "owner_restaurant": owner_restaurant,
+        "agent_restaurants": agent_restaurants,
+    }
+
+
+def user_from_snapshot(snapshot):
+    fields, _ = _schema()
+    User, UserProfile, Restaurant = _models()
+    user = _load(User, fields["user"], snapshot["user"])
+
+    profile = None
+    if snapshot["profile"] is not None:
+        profile = _load(UserProfile, fields["profile"], snapshot["profile"])
+        UserProfile._meta.get_field("user").set_cached_value(profile, user)
+    User._meta.get_field("profile").set_cached_value(user, profile)
+
+    if user.kind == UserKind.RESTAURANT_OWNER:
+        restaurant = snapshot["owner_restaurant"]
+        user._owner_restaurant = _load(Restaurant, fields["restaurant"], restaurant) if restaurant else None
+    elif user.kind == UserKind.SALES_AGENT:
+        user._agent_restaurants = [
+            _load(Restaurant, fields["restaurant"], restaurant)
+            for restaurant in snapshot["agent_restaurants"]
+        ] or None
+    return user
+
+
+def get_cached_user(user_id):
+    """Return the user for ``user_id`` from the cache, or load and cache it."""
+    key = _cache_key(user_id)
+    snapshot = user_cache.get(key)
+    if snapshot is not None:
+        return user_from_snapshot(snapshot)
+
+    User = get_user_model()
+    user = User.objects.select_related("profile").filter(pk=user_id).first()
+    if user is not None:
+        user_cache.add(key, build_snapshot(user))
+    return user
+
+
+def invalidate_user(user_id):
+    if user_id is not None:
+        user_cache.invalidate(_cache_key(user_id), INVALIDATION_HOLD)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that reads the user from ``user_cache``."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != "id" or api_settings.CHECK_REVOKE_TOKEN:
+            # Snapshots are keyed by id and do not carry the password hash
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
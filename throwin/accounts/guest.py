@@ -0,0 +1,87 @@
+"""
+Guest (not logged in) state kept in the session: the display name and the
+liked staff.
+
+Sessions live in the cache (see ``SESSION_ENGINE``), so a guest toggling likes
+costs a Redis write instead of a ``django_session`` row, and abandoned guest
+state expires with the session. Liked staff are handled as a set of staff uids;
+they are stored as a list because sessions are JSON serialized.
+
+When a guest logs in or registers as a consumer their likes are moved to
+``Like`` rows by ``merge_guest_likes``. Guest likes are not counted in
+``UserProfile.like_count`` until then (see ``accounts.likes``).
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from accounts.choices import UserKind
+from accounts.likes import adjust_like_count
+from accounts.models import Like
+
+User = get_user_model()
+
+GUEST_NAME_KEY = "guest_name"
+LIKED_STAFF_KEY = "liked_staff_uids"
+DEFAULT_GUEST_NAME = "Anonymous user"
+
+
+def get_guest_name(session):
+    return session.get(GUEST_NAME_KEY, DEFAULT_GUEST_NAME)
+
+
+def set_guest_name(session, name):
+    session[GUEST_NAME_KEY] = name or DEFAULT_GUEST_NAME
+
+
+def get_liked_staff_uids(session):
+    """Return the uids (as strings) of the staff liked by the guest."""
+    return set(session.get(LIKED_STAFF_KEY, ()))
+
+
+def toggle_guest_like(session, staff_uid):
+    """Like or unlike a staff member for the guest, return True if now liked."""
+    liked = get_liked_staff_uids(session)
+    staff_uid = str(staff_uid)
+    if staff_uid in liked:
+        liked.discard(staff_uid)
+    else:
+        liked.add(staff_uid)
+    session[LIKED_STAFF_KEY] = sorted(liked)
+    return staff_uid in liked
+
+
+def merge_guest_likes(request, user):
+    """
+    Move the likes of the guest session in ``request`` to ``user``.
+
+    Staff the consumer already likes are skipped by the unique constraint, so the
+    merge is a single insert. Returns the number of staff considered.
+    """
+    session = getattr(request, "session", None)
+    if session is None or user.kind != UserKind.CONSUMER:
+        return 0
+
+    liked_uids = get_liked_staff_uids(session)
+    if not liked_uids:
+        return 0
+
+    staff_ids = set(User.objects.filter(
+        uid__in=liked_uids,
+        kind=UserKind.RESTAURANT_STAFF,
+    ).values_list("id", flat=True))
+    with transaction.atomic():
+        already_liked = set(
+            Like.objects.filter(consumer=user, staff_id__in=staff_ids).values_list("staff_id", flat=True)
+        )
+        Like.objects.bulk_create(
+            [Like(consumer=user, staff_id=staff_id) for staff_id in staff_ids],
+            ignore_conflicts=True,
+        )
+        # bulk_create() sends no signal, count the likes the account did not have
+        for staff_id in staff_ids - already_liked:
+            adjust_like_count(staff_id, likes=1)
+
+    # The likes belong to the account now
+    del session[LIKED_STAFF_KEY]
+    return len(staff_ids)
@@ -0,0 +1,142 @@
+"""
+Like counters for staff and the per-store "most liked" ranking.
+
+``UserProfile.like_count`` follows the ``Like`` rows: it is raised with an
+``F()`` update in the transaction that creates a like and lowered by the
+``post_delete`` receiver of ``Like``, so concurrent toggles do not lose counts
+and likes deleted with a consumer are subtracted too. Guest likes only live in
+their sessions and are not counted, anyone could inflate them with fresh
+sessions; they count once the guest logs in (``merge_guest_likes``).
+
+Paginated staff lists order by the counters in SQL. Each store also has a
+Redis sorted set of its staff scored by likes, which serves the top staff of a
+store (``ranked_staff_ids``) without counting likes. Scores are written after
+commit from the counters in the database, so a missed update is corrected by
+the next one, and ``reconcile_like_counts`` rebuilds everything. Without Redis
+the ranking is read from the database.
+"""
+
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from accounts.choices import UserKind
+from accounts.models import Like, UserProfile
+from accounts.signals import bump_user_versions
+from common.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+RANKING_KEY = "likes:store:{store_id}"
+
+
+def ranking_key(store_id):
+    return RANKING_KEY.format(store_id=store_id)
+
+
+def toggle_like(consumer, staff):
+    """Like or unlike ``staff`` for ``consumer``, return True if now liked."""
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(consumer=consumer, staff=staff)
+        if created:
+            adjust_like_count(staff.id, likes=1)
+            return True
+        # Lock the row so concurrent unlikes delete it, and lower the count, once
+        like = Like.objects.select_for_update().filter(pk=like.pk).first()
+        if like is not None:
+            like.delete()  # The post_delete receiver lowers the count
+        return False
+
+
+def adjust_like_count(staff_id, likes):
+    """Add to the like count of a staff member and refresh their rankings on commit."""
+    if not likes:
+        return
+    # The counter is unsigned, never take it below zero
+    UserProfile.objects.filter(user_id=staff_id).update(like_count=Greatest(F("like_count") + likes, 0))
+    transaction.on_commit(lambda: refresh_rankings(staff_id))
+    # update() sends no signal
+    bump_user_versions(staff_id)
+
+
+def refresh_rankings(staff_id):
+    """Write the current like count of a staff member to the rankings of their stores."""
+    client = get_redis_client()
+    if client is None:
+        return
+    from store.models import StoreUser
+
+    likes = UserProfile.objects.filter(user_id=staff_id).values_list("like_count", flat=True).first()
+    if likes is None:
+        return
+    store_ids = StoreUser.objects.filter(
+        user_id=staff_id, role=UserKind.RESTAURANT_STAFF
+    ).values_list("store_id", flat=True)
+    try:
+        with client.pipeline() as pipe:
+            for store_id in store_ids:
+                # Only update rankings that exist, missing ones are rebuilt on read
+                pipe.zadd(ranking_key(store_id), {staff_id: likes}, xx=True)
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not update like rankings for staff %s: %s", staff_id, exc)
+
+
+def invalidate_ranking(store_id):
+    """Drop the ranking of a store whose staff changed, the next read rebuilds it."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.delete(ranking_key(store_id))
+    except Exception as exc:
+        logger.warning("Could not drop like ranking of store %s: %s", store_id, exc)
+
+
+def _ranking_from_db(store_id):
+    return list(
+        User.objects.filter(
+            user_stores__store_id=store_id,
+            user_stores__role=UserKind.RESTAURANT_STAFF,
+        )
+        .order_by("-profile__like_count", "id")
+        .values_list("id", "profile__like_count")
+    )
+
+
+def rebuild_ranking(store_id, client=None):
+    """Replace the ranking of a store with the counters in the database."""
+    client = client or get_redis_client()
+    ranking = _ranking_from_db(store_id)
+    if client is None:
+        return ranking
+    key = ranking_key(store_id)
+    with client.pipeline() as pipe:
+        pipe.delete(key)
+        if ranking:
+            pipe.zadd(key, {staff_id: likes or 0 for staff_id, likes in ranking})
+        pipe.execute()
+    return ranking
+
+
+def ranked_staff_ids(store_id, limit=None):
+    """Return the ids of the staff of a store, most liked first."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            key = ranking_key(store_id)
+            if not client.exists(key):
+                rebuild_ranking(store_id, client)
+            ids = client.zrevrange(key, 0, -1 if limit is None else limit - 1)
+            return [int(staff_id) for staff_id in ids]
+        except Exception as exc:
+            logger.warning("Like ranking of store %s unavailable, using the database: %s", store_id, exc)
+    ranking = _ranking_from_db(store_id)
+    if limit is not None:
+        ranking = ranking[:limit]
+    return [staff_id for staff_id, _ in ranking]
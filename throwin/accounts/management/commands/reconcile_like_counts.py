@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from accounts.choices import UserKind
+from accounts.likes import rebuild_ranking
+from accounts.models import Like, UserProfile
+from accounts.signals import bump_user_versions
+from common.cache import get_redis_client
+from store.models import Store
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute UserProfile.like_count of staff from the Like rows, chunk by "
+        "chunk, then rebuild the per-store like rankings in Redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Staff profiles per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        profiles = UserProfile.objects.filter(user__kind=UserKind.RESTAURANT_STAFF).order_by("id")
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            chunk = list(profiles.filter(id__gt=last_id).only("id", "user_id", "like_count")[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            counts = dict(
+                Like.objects.filter(staff_id__in=[profile.user_id for profile in chunk])
+                .order_by()
+                .values_list("staff_id")
+                .annotate(count=Count("id"))
+            )
+            with transaction.atomic():
+                for profile in chunk:
+                    actual = counts.get(profile.user_id, 0)
+                    if profile.like_count == actual:
+                        continue
+                    fixed += 1
+                    self.stdout.write(f"Staff {profile.user_id}: like_count {profile.like_count} -> {actual}")
+                    if not dry_run:
+                        # Only overwrite the value read above, a concurrent toggle wins
+                        UserProfile.objects.filter(id=profile.id, like_count=profile.like_count).update(
+                            like_count=actual
+                        )
+                        bump_user_versions(profile.user_id)
+            checked += len(chunk)
+
+        if not dry_run and get_redis_client() is not None:
+            for store_id in Store.objects.values_list("id", flat=True).iterator():
+                rebuild_ranking(store_id)
+
+        verb = "would be fixed" if dry_run else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{checked} staff checked, {fixed} like counts {verb}."))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Like = apps.get_model("accounts", "Like")
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    likes = (
+        Like.objects.filter(staff_id=OuterRef("user_id"))
+        .order_by()
+        .values("staff_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    UserProfile.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_userprofile_corporate_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, help_text='Consumers who like this staff, kept in step with Like rows.'),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
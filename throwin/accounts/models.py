@@ -159,6 +159,8 @@ class User(AbstractUser, BaseModel, PermissionsMixin):
     def get_agent_restaurants(self):
         """Retrieve all the restaurants where the user has the role 'SALES_AGENT'"""
         if self.kind == UserKind.SALES_AGENT:
+            if "_agent_restaurants" in self.__dict__:  # Loaded from the authentication cache
+                return self._agent_restaurants
             try:
                 restaurant_users = self.user_restaurants.filter(role=UserKind.SALES_AGENT)
                 restaurants = [restaurant_user.restaurant for restaurant_user in restaurant_users]
@@ -171,6 +173,8 @@ class User(AbstractUser, BaseModel, PermissionsMixin):
     def get_restaurant_owner_restaurant(self):
         """Retrieve the restaurant where the user has the role 'RESTAURANT_OWNER'."""
         if self.kind == UserKind.RESTAURANT_OWNER:
+            if "_owner_restaurant" in self.__dict__:  # Loaded from the authentication cache
+                return self._owner_restaurant
             try:
                 return self.restaurants.first()  # Assuming 'restaurants' is the related_name in Restaurant model
             except Exception:
@@ -208,6 +212,10 @@ class UserProfile(models.Model):
         null=True
     )  # applicable for consumers
     total_score = models.PositiveIntegerField(default=0)  # Only applicable for staff
+    like_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Consumers who like this staff, kept in step with Like rows."
+    )  # Only applicable for staff
     fun_fact = models.CharField(
         max_length=255,
         blank=True,
@@ -35,7 +35,7 @@ class GoogleSignInSerializer(serializers.Serializer):
         name = f"{first_name} {last_name}"
         provider = 'google'
 
-        return register_social_user(provider, email, name)
+        return register_social_user(provider, email, name, request=self.context.get("request"))
 
 
 # class LineSignInSerializer(serializers.Serializer):
@@ -118,4 +118,4 @@ class LineSignInSerializer(serializers.Serializer):
         provider = 'line'
 
         # Call your social user register or authentication function.
-        return register_social_user(provider, email, display_name)
+        return register_social_user(provider, email, display_name, request=self.context.get("request"))
@@ -13,10 +13,11 @@ from rest_framework_simplejwt.tokens import AccessToken
 
 from accounts.choices import UserKind
 from accounts.models import TemporaryUser
-from accounts.tasks import send_mail_task
+from common.mail import queue_mail
 from accounts.utils import generate_verification_token
 from common.serializers import BaseSerializer
 from review.models import Review, Reply
+from store.config import get_store_config
 
 domain = settings.SITE_DOMAIN
 
@@ -92,7 +93,7 @@ class EmailChangeRequestSerializer(serializers.Serializer):
 
         verification_url = f"{settings.FRONTEND_URL}/verify-email/{token}"
 
-        send_mail_task.delay(
+        queue_mail(
             subject="Verify Email",
             message=f"Please click the link below to verify your email. {verification_url}",
             to_email=new_email
@@ -140,6 +141,12 @@ class StaffDetailForConsumerSerializer(BaseSerializer):
         source="profile.total_score",
         default=0
     )
+    likes = serializers.IntegerField(
+        source="profile.like_count",
+        default=0,
+        read_only=True,
+        help_text="Number of consumers who like the staff"
+    )
     image = serializers.SerializerMethodField()
     fun_fact = serializers.CharField(
         source="profile.fun_fact",
@@ -160,6 +167,7 @@ class StaffDetailForConsumerSerializer(BaseSerializer):
             "username",
             "introduction",
             "score",
+            "likes",
             "image",
             "fun_fact",
             "store_code",
@@ -182,29 +190,50 @@ class StaffDetailForConsumerSerializer(BaseSerializer):
                 return {'error': str(e)}  # Handle errors gracefully
         return None
 
+    def _store_config(self, obj):
+        """
+        Config of the store the staff member is shown under: the one in the
+        context, else their first store, looked up once per serializer.
+        """
+        if "store_config" in self.context:
+            return self.context["store_config"]
+        if not hasattr(self, "_store_configs"):
+            self._store_configs = {}
+        configs = self._store_configs
+        if obj.pk not in configs:
+            store_uid = None
+            if obj.kind == UserKind.RESTAURANT_STAFF:
+                store_uid = (
+                    obj.user_stores.filter(role=UserKind.RESTAURANT_STAFF)
+                    .values_list("store__uid", flat=True)
+                    .first()
+                )
+            configs[obj.pk] = get_store_config(store_uid) if store_uid else None
+        return configs[obj.pk]
+
     def get_store_code(self, obj) -> str or None:
         """
         Get the store code associated with the staff member.
         """
-        staff_store = obj.get_staff_store
-        if staff_store:
-            return staff_store.code
+        config = self._store_config(obj)
+        if config:
+            return config.code
         return None
 
     def get_store_uid(self, obj) -> str or None:
         """
         Get the store uid associated with the staff member.
         """
-        staff_store = obj.get_staff_store
-        if staff_store:
-            return staff_store.uid
+        config = self._store_config(obj)
+        if config:
+            return config.uid
         return None
 
     def get_throwin_amounts(self, obj) -> list or None:
         """Get the throwin amounts associated with the staff member's store."""
-        staff_store = obj.get_staff_store
-        if staff_store and staff_store.throwin_amounts:
-            return staff_store.throwin_amounts.split(",")  # Convert string to list
+        config = self._store_config(obj)
+        if config:
+            return [str(amount) for amount in config.throwin_amounts]
         return []
 
     def get_reviews(self, obj) -> list:
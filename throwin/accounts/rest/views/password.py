@@ -13,7 +13,7 @@ from accounts.rest.serializers.password import (
     PasswordResetConfirmSerializer,
     PasswordChangeSerializer,
 )
-from accounts.tasks import send_mail_task
+from common.mail import queue_mail
 from accounts.utils import generate_password_reset_token_url
 
 User = get_user_model()
@@ -48,7 +48,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
         )
         to_email = user.email
         # send_mail_task(subject, message, to_email)
-        send_mail_task.delay(subject, message, to_email)
+        queue_mail(subject, message, to_email)
 
         return Response({
             "detail": "Password reset link sent"
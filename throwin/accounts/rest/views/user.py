@@ -9,6 +9,14 @@ from rest_framework.response import Response
 
 from accounts.choices import UserKind
 from accounts.filters import UserFilter
+from accounts.guest import (
+    get_guest_name,
+    get_liked_staff_uids,
+    merge_guest_likes,
+    set_guest_name,
+    toggle_guest_like,
+)
+from accounts.likes import toggle_like
 from accounts.models import Like
 from accounts.rest.serializers.user import (
     EmailChangeRequestSerializer,
@@ -21,6 +29,7 @@ from accounts.rest.serializers.user import (
     StaffLikeToggleSerializer,
     GetRestaurantOwnerReplySerializer,
 )
+from common.conditional import ConditionalGetMixin, version_token
 from common.permissions import (
     IsConsumerUser,
     CheckAnyPermission,
@@ -32,6 +41,8 @@ from common.permissions import (
     IsRestaurantOwnerUser, IsSalesAgentUser,
 )
 from review.models import Reply
+from store.config import get_store_config_by_code
+from store.membership import get_staff_membership
 from store.models import StoreUser
 from store.rest.serializers.store_stuff import (
     StoreStuffListSerializer,
@@ -64,6 +75,9 @@ class AccountActivation(generics.GenericAPIView):
         user.set_password(temp_user.password)
         user.save()
 
+        # Keep the likes made as a guest in this browser
+        merge_guest_likes(request, user)
+
         # Delete temp user
         temp_user.delete()
 
@@ -116,10 +130,7 @@ class SetGuestName(generics.GenericAPIView):
         name = serializer.validated_data.get("name", "").strip()
 
         # Set "Anonymous user" if name is empty or blank
-        if not name:
-            request.session["guest_name"] = "Anonymous user"
-        else:
-            request.session["guest_name"] = name
+        set_guest_name(request.session, name)
 
         return Response(
             {"detail": "Guest Name Updated Successfully"},
@@ -219,22 +230,33 @@ class StaffDetailForConsumer(generics.RetrieveAPIView):
         # get store code from url
         store_code = self.kwargs.get("store_code", None)
 
-        # Retrieve the staff
+        # Retrieve the staff, who must work at the store
         try:
             staff = self.get_object()
-            store_user = StoreUser.objects.get(
-                store__code=store_code,
-                user_id=staff.id,
-                role=UserKind.RESTAURANT_STAFF
-            )
         except User.DoesNotExist:
             return Response(
                 {"detail": "Staff member not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        store = get_store_config_by_code(store_code)
+        membership = get_staff_membership(staff.uid)
+        if store is None:
+            works_at_store = False
+        elif membership is not None:
+            works_at_store = membership.works_at_store(store.uid)
+        else:
+            # The index only has staff users, others are checked in the database
+            works_at_store = StoreUser.objects.filter(
+                store__uid=store.uid, user_id=staff.id, role=UserKind.RESTAURANT_STAFF
+            ).exists()
+        if not works_at_store:
+            return Response(
+                {"detail": "Staff member not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-        # Serialize the staff
-        serializer = self.serializer_class(staff)
+        # Serialize the staff, with the amounts of this store
+        serializer = self.serializer_class(staff, context={"store_config": store})
         data = serializer.data
 
         # Add Liked field
@@ -247,12 +269,12 @@ class StaffDetailForConsumer(generics.RetrieveAPIView):
             ).exists()
         else:
             # Add a session for guest user
-            liked = request.session.get("liked_staff_uids", []).count(staff.uid) > 0
+            liked = str(staff.uid) in get_liked_staff_uids(request.session)
 
         data["liked"] = liked
-        data["store_uid"] = store_user.store.uid
-        data["store_name"] = store_user.store.name
-        data["restaurant_uid"] = store_user.store.restaurant.uid
+        data["store_uid"] = store.uid
+        data["store_name"] = store.name
+        data["restaurant_uid"] = store.restaurant_uid
 
         return Response(data, status=status.HTTP_200_OK)
 
@@ -270,15 +292,10 @@ class ConsumerLikeStaffToggle(generics.GenericAPIView):
 
         if self.request.user.is_authenticated:
             # For authenticated users
-            like, created = Like.objects.get_or_create(
-                consumer=self.request.user,
-                staff=staff
-            )
-            if created:
+            if toggle_like(self.request.user, staff):
                 message = "Staff member Liked"
                 status_code = status.HTTP_201_CREATED
             else:
-                like.delete()
                 message = "Staff member Unliked"
                 status_code = status.HTTP_200_OK
         else:
@@ -286,19 +303,12 @@ class ConsumerLikeStaffToggle(generics.GenericAPIView):
             if not request.session.session_key:
                 request.session.create()  # Ensure session is initialized
 
-            liked_staff_uids = request.session.get("liked_staff_uids", [])
-            staff_uid = str(staff.uid)
-            if staff_uid in liked_staff_uids:
-                liked_staff_uids.remove(staff_uid)
-                message = "Staff member Unliked"
-                status_code = status.HTTP_200_OK
-            else:
-                liked_staff_uids.append(staff_uid)
+            if toggle_guest_like(request.session, staff.uid):
                 message = "Staff member Liked"
                 status_code = status.HTTP_201_CREATED
-
-            # Update session
-            request.session["liked_staff_uids"] = liked_staff_uids
+            else:
+                message = "Staff member Unliked"
+                status_code = status.HTTP_200_OK
 
         return Response({
             "detail": message
@@ -326,7 +336,7 @@ class FavoriteStaffList(generics.ListAPIView):
             liked_staff_ids = Like.objects.filter(consumer=consumer).values_list("staff", flat=True)
         else:
             # Get liked staff for guest
-            liked_staff_uids = self.request.session.get("liked_staff_uids", [])
+            liked_staff_uids = get_liked_staff_uids(self.request.session)
             liked_staff_ids = User.objects.filter(
                 uid__in=liked_staff_uids,
                 kind=UserKind.RESTAURANT_STAFF
@@ -346,7 +356,7 @@ class FavoriteStaffList(generics.ListAPIView):
     description="Get user details",
     request=MeSerializer
 )
-class Me(generics.GenericAPIView):
+class Me(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = MeSerializer
     available_permission_classes = (
         IsConsumerUser,
@@ -360,6 +370,11 @@ class Me(generics.GenericAPIView):
     )
     permission_classes = (CheckAnyPermission,)
 
+    def get_version(self):
+        if not self.request.user.is_authenticated:
+            return None  # The guest name lives in the session
+        return version_token(f"user:{self.request.user.pk}")
+
     def get_object(self):
         if self.request.user.is_authenticated:
             # Fetch the user with the related UserProfile to avoid additional queries
@@ -372,7 +387,7 @@ class Me(generics.GenericAPIView):
             user = self.get_object()
             return Response(self.serializer_class(user).data)
         else:
-            guest_name = request.session.get("guest_name", "Anonymous user")
+            guest_name = get_guest_name(request.session)
             return Response({
                 "name": guest_name
             }, status=status.HTTP_200_OK)
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from accounts.choices import UserKind
+from accounts.guest import merge_guest_likes
 from accounts.rest.serializers.user_login import UserLoginSerializer
 
 
@@ -23,6 +24,9 @@ class UserLogin(generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data.get("user")
 
+        # Keep the likes made before logging in
+        merge_guest_likes(request, user)
+
         # get token
         refresh = RefreshToken.for_user(user)
         response_data = {
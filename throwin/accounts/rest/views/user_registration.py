@@ -14,7 +14,7 @@ from accounts.rest.serializers.user_registration import (
     CheckEmailAlreadyExistsSerializer,
     ResendActivationEmailSerializer,
 )
-from accounts.tasks import send_mail_task
+from common.mail import queue_mail
 from accounts.utils import generate_email_activation_url
 
 User = get_user_model()
@@ -50,7 +50,7 @@ class UserRegistration(generics.CreateAPIView):
         )
         to_email = temp_user.email
         # send_mail_task(subject, message, to_email)
-        send_mail_task.delay(subject, message, to_email)
+        queue_mail(subject, message, to_email)
 
         return Response({
             "msg": "User Created Successfully, Please check your email to activate your account in 48 hours."
@@ -106,7 +106,7 @@ class ResendActivationEmail(generics.GenericAPIView):
         )
         to_email = temp_user.email
         # send_mail_task(subject, message, to_email)
-        send_mail_task.delay(subject, message, to_email)
+        queue_mail(subject, message, to_email)
 
         return Response({
             "detail": "Email Sent Successfully"
@@ -26,10 +26,12 @@ def post_save_user(sender, instance, created, **kwargs):
 
 
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.apps import apps
 from accounts.choices import UserKind
+from common.conditional import bump_version
 
 @receiver(post_save)
 def create_user_balance(sender, instance, created, **kwargs):
@@ -48,3 +50,59 @@ def create_user_balance(sender, instance, created, **kwargs):
         Balance = apps.get_model('payment_service', 'Balance')
         Balance.objects.get_or_create(user=instance)
 
+
+def invalidate_cached_users(*user_ids):
+    """Drop authentication snapshots now and again once the transaction commits."""
+    from accounts.authentication import invalidate_user
+
+    def invalidate():
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def bump_user_versions(user_id):
+    """New ETags for the responses showing a user: Me and the staff lists of their stores."""
+    from store.models import StoreUser
+
+    store_codes = StoreUser.objects.filter(user_id=user_id).values_list("store__code", flat=True)
+    bump_version(f"user:{user_id}", *(f"store-staff:{code}" for code in store_codes))
+
+
+@receiver([post_save, post_delete], sender="accounts.User")
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    from notification.inbox import drop_unread_count
+    from store.membership import drop_staff_membership
+
+    invalidate_cached_users(instance.pk)
+    bump_user_versions(instance.pk)
+    # Kind and active flag are part of the staff membership index
+    staff_uid = instance.uid
+    transaction.on_commit(lambda: drop_staff_membership(staff_uid))
+    # The kind is part of the audience of the user's notifications
+    user_id = instance.pk
+    transaction.on_commit(lambda: drop_unread_count(user_id))
+
+
+@receiver(post_delete, sender="accounts.User")
+def drop_recent_messages(sender, instance, **kwargs):
+    from payment_service.recent_messages import drop_messages
+
+    staff_uid = instance.uid
+    transaction.on_commit(lambda: drop_messages(staff_uid))
+
+
+@receiver([post_save, post_delete], sender="accounts.UserProfile")
+def invalidate_profile_snapshot(sender, instance, **kwargs):
+    invalidate_cached_users(instance.user_id)
+    bump_user_versions(instance.user_id)
+
+
+@receiver(post_delete, sender="accounts.Like")
+def uncount_like(sender, instance, **kwargs):
+    """Lower the like count of the staff, also when the like goes with its consumer."""
+    from accounts.likes import adjust_like_count
+
+    adjust_like_count(instance.staff_id, likes=-1)
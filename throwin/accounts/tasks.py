@@ -1,36 +1,37 @@
-from datetime import timedelta
-
 from celery import shared_task
 
-from django.conf import settings
-from django.core.mail import send_mail
-from django.utils import timezone
-
-from accounts.models import TemporaryUser
+from common.mail import queue_mail
+from common.retention import apply_rule, get_rule
 
 
 @shared_task()
 def send_mail_task(subject, message, to_email):
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[to_email],
-        fail_silently=False,
-    )
+    """
+        kept for tasks queued before mails went through common.mail.queue_mail
+    """
+    queue_mail(subject, message, to_email)
 
 
 @shared_task()
 def delete_old_temporary_users():
     """
-        task to delete old temporary users records older than 48 hours
+        task to delete old temporary users records older than 48 hours,
+        in batches (see common.retention)
     """
-    threshold_time = timezone.now() - timedelta(hours=48)
+    deleted = apply_rule(get_rule("temporary_users"))
+
+    return f"{deleted} temporary users deleted"
 
-    old_users = TemporaryUser.objects.filter(created_at__lt=threshold_time)
-    deleted_cont, _ = old_users.delete()
 
-    return f"{deleted_cont} temporary users deleted"
+@shared_task()
+def clear_expired_sessions():
+    """
+        task to delete expired sessions stored in the database, in batches
+        (see common.retention). Cache backed sessions expire by themselves.
+    """
+    deleted = apply_rule(get_rule("expired_sessions"))
+
+    return f"{deleted} expired sessions deleted"
 
 
 @shared_task()
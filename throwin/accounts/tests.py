@@ -1,8 +1,27 @@
-from django.test import TestCase
+import io
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from accounts.models import UserProfile, Like, TemporaryUser
 from accounts.choices import UserKind
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import (
+    CachedJWTAuthentication,
+    _cache_key,
+    build_snapshot,
+    get_cached_user,
+    invalidate_user,
+    user_cache,
+)
+from accounts.guest import LIKED_STAFF_KEY
+from django.core.management import call_command
+from store.models import Restaurant, Store, StoreUser
 
 User = get_user_model()
 
@@ -101,3 +120,261 @@ class UserProfileTests(TestCase):
         self.profile.total_score = 10
         self.profile.save()
         self.assertEqual(self.profile.total_score, 10)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear_local()
+        self.owner = User.objects.create_user(
+            email="owner@example.com",
+            password="password123",
+            name="Owner",
+            kind=UserKind.RESTAURANT_OWNER,
+            is_verified=True,
+        )
+        self.restaurant = Restaurant.objects.create(name="Cached", restaurant_owner=self.owner)
+        self.token = AccessToken.for_user(self.owner)
+        cache.clear()  # Creating the rows left invalidation tombstones
+
+    def authenticate(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_cached_user_does_not_query_the_database(self):
+        self.authenticate()
+        user_cache.clear_local()  # Read back from the shared cache
+
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.kind, UserKind.RESTAURANT_OWNER)
+            self.assertTrue(user.is_verified)
+            self.assertEqual(user.profile.introduction, "I'm admin of this restaurant")
+            self.assertEqual(user.get_restaurant_owner_restaurant.pk, self.restaurant.pk)
+
+        self.assertTrue(user.check_password("password123"))
+
+    def test_saving_user_or_profile_invalidates_the_snapshot(self):
+        self.authenticate()
+
+        self.owner.name = "Renamed"
+        self.owner.save()
+        self.owner.profile.introduction = "Updated"
+        self.owner.profile.save()
+
+        user = self.authenticate()
+        self.assertEqual(user.name, "Renamed")
+        self.assertEqual(user.profile.introduction, "Updated")
+
+    def test_saving_restaurant_invalidates_the_owner_snapshot(self):
+        self.authenticate()
+
+        self.restaurant.name = "Renamed"
+        self.restaurant.save()
+
+        self.assertEqual(self.authenticate().get_restaurant_owner_restaurant.name, "Renamed")
+
+    def test_snapshot_read_before_a_change_is_not_cached(self):
+        stale = User.objects.get(pk=self.owner.pk)
+        # Deactivated and invalidated while the request above was running
+        User.objects.filter(pk=self.owner.pk).update(is_active=False)
+        invalidate_user(self.owner.pk)
+
+        self.assertFalse(user_cache.add(_cache_key(self.owner.pk), build_snapshot(stale)))
+        user_cache.clear_local()
+        self.assertFalse(get_cached_user(self.owner.pk).is_active)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class GuestLikesTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.consumer = User.objects.create_user(
+            email="guest@example.com",
+            password="password123",
+            kind=UserKind.CONSUMER,
+            is_verified=True,
+        )
+        self.staff = [
+            User.objects.create_user(
+                email=f"staff{i}@example.com",
+                password="password123",
+                kind=UserKind.RESTAURANT_STAFF,
+            )
+            for i in range(3)
+        ]
+
+    def toggle(self, staff):
+        return self.client.post(f"/auth/users/staff/{staff.uid}/like")
+
+    def test_guest_toggle_is_kept_in_the_session(self):
+        self.assertEqual(self.toggle(self.staff[0]).status_code, 201)
+        self.assertEqual(self.toggle(self.staff[1]).status_code, 201)
+        self.assertEqual(self.toggle(self.staff[1]).status_code, 200)
+
+        response = self.client.get("/auth/users/favorite-staff")
+        self.assertEqual([staff["uid"] for staff in response.data], [str(self.staff[0].uid)])
+        self.assertFalse(Like.objects.exists())
+
+    def test_guest_sessions_live_in_the_cache(self):
+        self.assertEqual(settings.SESSION_ENGINE, "django.contrib.sessions.backends.cache")
+        self.toggle(self.staff[0])
+
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.client.session[LIKED_STAFF_KEY], [str(self.staff[0].uid)])
+
+    def test_login_merges_guest_likes(self):
+        Like.objects.create(consumer=self.consumer, staff=self.staff[0])
+        self.toggle(self.staff[0])
+        self.toggle(self.staff[1])
+
+        response = self.client.post(
+            "/auth/login", {"email": "guest@example.com", "password": "password123"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            Like.objects.filter(consumer=self.consumer).values_list("staff_id", flat=True),
+            [self.staff[0].id, self.staff[1].id],
+        )
+        self.assertNotIn("liked_staff_uids", self.client.session)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class LikeCountTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.consumer = User.objects.create_user(
+            email="fan@example.com",
+            password="password123",
+            kind=UserKind.CONSUMER,
+            is_verified=True,
+        )
+        owner = User.objects.create_user(email="likes-owner@example.com", kind=UserKind.RESTAURANT_OWNER)
+        restaurant = Restaurant.objects.create(name="Likes", restaurant_owner=owner)
+        self.store = Store.objects.create(restaurant=restaurant, name="Likes Store", code="likes1")
+        self.staff = []
+        for i in range(3):
+            staff = User.objects.create_user(
+                email=f"liked{i}@example.com",
+                password="password123",
+                kind=UserKind.RESTAURANT_STAFF,
+            )
+            StoreUser.objects.create(store=self.store, user=staff, role=UserKind.RESTAURANT_STAFF)
+            self.staff.append(staff)
+
+    def toggle(self, staff):
+        return self.client.post(f"/auth/users/staff/{staff.uid}/like")
+
+    def likes(self, staff):
+        staff.profile.refresh_from_db()
+        return staff.profile.like_count
+
+    def test_toggles_keep_the_counter(self):
+        self.toggle(self.staff[0])
+        self.toggle(self.staff[1])
+        self.toggle(self.staff[1])
+        # Guest likes live in the session and are not counted
+        self.assertEqual(self.likes(self.staff[0]), 0)
+
+        self.client.force_authenticate(self.consumer)
+        self.toggle(self.staff[0])
+        self.assertEqual(self.likes(self.staff[0]), 1)
+        self.toggle(self.staff[0])
+        self.assertEqual(self.likes(self.staff[0]), 0)
+
+    def test_login_turns_guest_likes_into_account_likes(self):
+        Like.objects.create(consumer=self.consumer, staff=self.staff[0])
+        call_command("reconcile_like_counts", stdout=io.StringIO())
+        self.toggle(self.staff[0])
+        self.toggle(self.staff[1])
+
+        self.client.post("/auth/login", {"email": "fan@example.com", "password": "password123"}, format="json")
+
+        self.assertEqual(self.likes(self.staff[0]), 1)
+        self.assertEqual(self.likes(self.staff[1]), 1)
+
+    def test_deleting_a_consumer_takes_their_likes(self):
+        self.client.force_authenticate(self.consumer)
+        self.toggle(self.staff[0])
+        self.toggle(self.staff[1])
+
+        self.consumer.delete()
+
+        self.assertEqual(self.likes(self.staff[0]), 0)
+        self.assertEqual(self.likes(self.staff[1]), 0)
+
+    def test_popular_ordering_and_reconcile(self):
+        Like.objects.create(consumer=self.consumer, staff=self.staff[2])
+        UserProfile.objects.filter(user=self.staff[1]).update(like_count=5)  # Drifted
+
+        call_command("reconcile_like_counts", "--chunk-size", "1", stdout=io.StringIO())
+
+        self.assertEqual(self.likes(self.staff[1]), 0)
+        self.assertEqual(self.likes(self.staff[2]), 1)
+        response = self.client.get("/stores/likes1/staff/list?ordering=popular")
+        self.assertEqual(response.data["results"][0]["uid"], str(self.staff[2].uid))
+        self.assertEqual(response.data["results"][0]["likes"], 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.consumer = User.objects.create_user(
+            email="poller@example.com",
+            password="password123",
+            kind=UserKind.CONSUMER,
+            is_verified=True,
+        )
+        owner = User.objects.create_user(email="etag-owner@example.com", kind=UserKind.RESTAURANT_OWNER)
+        restaurant = Restaurant.objects.create(name="ETag", restaurant_owner=owner)
+        self.store = Store.objects.create(restaurant=restaurant, name="ETag Store", code="etag1")
+        self.staff = User.objects.create_user(email="etag-staff@example.com", kind=UserKind.RESTAURANT_STAFF)
+        StoreUser.objects.create(store=self.store, user=self.staff, role=UserKind.RESTAURANT_STAFF)
+
+    def test_me_answers_304_until_the_user_changes(self):
+        self.client.force_authenticate(self.consumer)
+        response = self.client.get("/auth/users/me")
+        etag = response["ETag"]
+        self.assertEqual(response.status_code, 200)
+        # One-second Last-Modified dates would hide a second change in the same second
+        self.assertNotIn("Last-Modified", response)
+
+        response = self.client.get("/auth/users/me", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        self.consumer.name = "Renamed"
+        self.consumer.save()
+        response = self.client.get("/auth/users/me", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["name"], "Renamed")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_likes_change_the_store_staff_etag(self):
+        url = "/stores/etag1/staff/list"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_authenticate(self.consumer)
+        self.client.post(f"/auth/users/staff/{self.staff.uid}/like")
+        self.client.force_authenticate(None)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["likes"], 1)
+
+    def test_staff_changes_bump_the_store_staff_etag(self):
+        url = "/stores/etag1/staff/list"
+        etag = self.client.get(url)["ETag"]
+
+        StoreUser.objects.filter(user=self.staff).get().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # The memberships go with the store, which is already gone
+        StoreUser.objects.create(store=self.store, user=self.staff, role=UserKind.RESTAURANT_STAFF)
+        self.store.delete()
+        self.assertFalse(StoreUser.objects.exists())
@@ -17,6 +17,7 @@ from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from accounts.choices import UserKind
+from accounts.guest import merge_guest_likes
 from accounts.models import TemporaryUser
 
 from common.utils import login_social_user
@@ -61,13 +62,17 @@ class Line:
         return response.json()
 
 
-def register_social_user(provider, email, name, profile_image=""):
+def register_social_user(provider, email, name, profile_image="", request=None):
     """
         Register a user with social login credentials if the user does not exist,
         or return a message to continue login with existing provider.
+        Likes made as a guest in the session of ``request`` are moved to the user.
     """
     user = User.objects.filter(email=email).first()
 
+    if user and request is not None:
+        merge_guest_likes(request, user)
+
     if user:
         if user.auth_provider == provider:
             return login_social_user(email=email, password=settings.SOCIAL_AUTH_PASSWORD)
@@ -110,6 +115,9 @@ def register_social_user(provider, email, name, profile_image=""):
         user.set_password(settings.SOCIAL_AUTH_PASSWORD)
         user.save()
 
+        if request is not None:
+            merge_guest_likes(request, user)
+
         return login_social_user(email=email, password=settings.SOCIAL_AUTH_PASSWORD)
 
 
@@ -1,7 +1,116 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 
 # Register your models here.
 
 # class BaseModelAdmin(admin.ModelAdmin):
 #     list_per_page = 40
+
+
+def estimated_row_count(model, using="default"):
+    """
+    The planner's estimate of the rows of `model`'s table (its partitions
+    included), None when the database does not keep one.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint FROM pg_class c
+            WHERE c.oid = to_regclass(%s)
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+            """,
+            [table, table],
+        )
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts every row of a large table.
+
+    An unfiltered list uses the planner's estimate once it is above
+    `max_count`, a filtered list counts at most `max_count` rows: the pages
+    after those are not linked, narrow the filters to reach them.
+    """
+
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.max_count:
+                return estimate
+        return queryset.order_by()[:self.max_count].count()
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Foreign key list filter picking the object with the admin autocomplete
+    instead of listing every row of the related table. The related model
+    admin needs `search_fields`, like for `autocomplete_fields`.
+
+        list_filter = [("restaurant", AutocompleteFilter)]
+    """
+
+    template = "admin/common/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        value = params.get(self.lookup_kwarg)
+        self.lookup_val = value[-1] if isinstance(value, list) else value
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+        remote_model = field.remote_field.model
+        widget = AutocompleteSelect(field, model_admin.admin_site, attrs={"data-filter-parameter": self.lookup_kwarg})
+        form_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            to_field_name=field.remote_field.field_name,
+            widget=widget,
+            required=False,
+        )
+        self.rendered_widget = form_field.widget.render(self.lookup_kwarg, self.lookup_val)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.lookup_val is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": "All",
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist settings for the admins of the largest tables: estimated
+    counts, no second count of the unfiltered table, no facet counts and the
+    static files of the `AutocompleteFilter`s of `list_filter`.
+    Display columns should come from annotations of `get_queryset`.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, tuple) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter[0])
+                media += AutocompleteSelect(field, self.admin_site).media
+                media += forms.Media(js=["common/js/autocomplete_filter.js"])
+                break
+        return media
@@ -0,0 +1,45 @@
+"""
+Async DRF views for endpoints that mostly wait on payment gateways.
+
+DRF's ``APIView`` is sync only. ``AsyncAPIView`` keeps its request parsing,
+authentication, permissions, throttling, exception handling and rendering, but
+awaits ``async def`` handlers so that, under an ASGI server, gateway I/O does
+not hold a worker. The sync parts (authentication and throttling may touch the
+database or Redis) run through ``sync_to_async``.
+"""
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = await handler(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        # Django requires every handler of an async view to be async
+        return super().options(request, *args, **kwargs)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        return super().http_method_not_allowed(request, *args, **kwargs)
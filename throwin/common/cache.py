@@ -0,0 +1,110 @@
+"""
+Two tier cache: a small in-process TTL cache in front of the shared Django cache.
+
+The local tier saves the Redis round-trip on hot keys; its TTL bounds how long
+another process can keep serving a value after it was invalidated elsewhere.
+Cache failures are logged and treated as misses so Redis is never required to
+serve a request.
+
+Values read from the database can be stored with `add` and dropped with
+`invalidate`, which leaves a short tombstone: a reader that loaded the row
+before a concurrent change committed cannot write its stale copy back.
+"""
+
+import logging
+import threading
+
+from cachetools import TTLCache
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE = "__invalidated__"
+
+
+class TwoTierCache:
+
+    def __init__(self, prefix, local_ttl=5, remote_ttl=300, maxsize=1024):
+        self.prefix = prefix
+        self.remote_ttl = remote_ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key):
+        key = self._key(key)
+        with self._lock:
+            value = self._local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = cache.get(key)
+        except Exception as exc:
+            logger.warning("Cache read failed for %s: %s", key, exc)
+            return None
+        if value == TOMBSTONE:
+            return None
+        if value is not None:
+            with self._lock:
+                self._local[key] = value
+        return value
+
+    def add(self, key, value):
+        """Store `value` unless the key is set or was invalidated recently, returns whether it was stored."""
+        key = self._key(key)
+        try:
+            added = cache.add(key, value, self.remote_ttl)
+        except Exception as exc:
+            logger.warning("Cache write failed for %s: %s", key, exc)
+            return False
+        if added:
+            with self._lock:
+                self._local[key] = value
+        return added
+
+    def set(self, key, value):
+        key = self._key(key)
+        with self._lock:
+            self._local[key] = value
+        try:
+            cache.set(key, value, self.remote_ttl)
+        except Exception as exc:
+            logger.warning("Cache write failed for %s: %s", key, exc)
+
+    def delete(self, key):
+        key = self._key(key)
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            cache.delete(key)
+        except Exception as exc:
+            logger.warning("Cache delete failed for %s: %s", key, exc)
+
+    def invalidate(self, key, hold):
+        """Drop the value and refuse `add` for the next `hold` seconds."""
+        key = self._key(key)
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            cache.set(key, TOMBSTONE, hold)
+        except Exception as exc:
+            logger.warning("Cache delete failed for %s: %s", key, exc)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+def get_redis_client():
+    """
+    Return the redis-py client behind the default cache, for data structures the
+    cache API has no methods for (sorted sets, sets, lists). Returns None when the
+    default cache is not Redis (local development, tests), callers then fall back
+    to the database.
+    """
+    get_client = getattr(getattr(cache, "_cache", None), "get_client", None)
+    if get_client is None:
+        return None
+    return get_client(write=True)
@@ -0,0 +1,198 @@
+"""
+Real-time feed of tip, review and reply events over Redis pub/sub.
+
+Events are published, once their transaction commits, to one Redis channel per
+topic they concern:
+
+    feed:staff:{uid}  feed:store:{uid}  feed:restaurant:{uid}
+
+so every node sees every event. Under ASGI each process keeps one `FeedHub`
+per event loop: a single Redis connection subscribed to the channels its
+clients follow, which hands each message to the in-memory queue of every
+client following that channel. An idle client is a suspended coroutine and a
+queue, and nothing polls the database. A client whose queue is full (it does
+not read) loses the events that do not fit.
+
+Without Redis events are not published and the feed is unavailable.
+
+Browsers follow the feed with EventSource, which cannot send an Authorization
+header: `make_token` signs a short-lived token to pass as `?token=` instead.
+"""
+
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+
+from common.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "feed:{topic}:{uid}"
+TOPICS = ("staff", "store", "restaurant")
+QUEUE_SIZE = 100
+TOKEN_SALT = "common.feed.token"
+TOKEN_MAX_AGE = getattr(settings, "FEED_TOKEN_MAX_AGE", 60)
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def channel_name(topic, uid):
+    return CHANNEL.format(topic=topic, uid=uid)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def event_channels(staff_uid=None, store_uid=None, restaurant_uid=None):
+    """The channels of an event, the restaurant found from the store when not given."""
+    if store_uid and not restaurant_uid:
+        from store.config import get_store_config
+
+        config = get_store_config(store_uid)
+        restaurant_uid = config.restaurant_uid if config else None
+    uids = {"staff": staff_uid, "store": store_uid, "restaurant": restaurant_uid}
+    return [channel_name(topic, uids[topic]) for topic in TOPICS if uids[topic]]
+
+
+def publish(event_type, payload, staff_uid=None, store_uid=None, restaurant_uid=None):
+    """
+    Publish an event to the channels of its staff, store and restaurant.
+    Returns the number of clients it reached, None without Redis.
+    """
+    client = get_redis_client()
+    if client is None:
+        return None
+    channels = event_channels(staff_uid, store_uid, restaurant_uid)
+    data = json.dumps({"type": event_type, **payload}, cls=DjangoJSONEncoder)
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.publish(channel, data)
+            return sum(pipe.execute())
+    except Exception as exc:
+        logger.warning("Could not publish %s event: %s", event_type, exc)
+        return None
+
+
+def make_token(user):
+    """A signed token opening the feed as `user` for `TOKEN_MAX_AGE` seconds."""
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def token_user_id(token):
+    """The user id of a feed token, None when it is invalid or expired."""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:  # Expired tokens included
+        return None
+
+
+def feed_url():
+    """URL of the Redis server behind the default cache, None when it is not Redis."""
+    cache = settings.CACHES.get("default", {})
+    if "redis" not in cache.get("BACKEND", "").lower():
+        return None
+    location = cache.get("LOCATION")
+    return location[0] if isinstance(location, (list, tuple)) else location
+
+
+class FeedHub:
+    """The Redis subscription of one event loop, shared by all its clients."""
+
+    def __init__(self, url):
+        import redis.asyncio
+
+        self._client = redis.asyncio.from_url(url)
+        self._pubsub = self._client.pubsub()
+        self._queues = defaultdict(set)
+        self._lock = asyncio.Lock()
+        self._reader = None
+
+    async def subscribe(self, channels):
+        """A queue receiving the messages of `channels`."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        async with self._lock:
+            new = [channel for channel in channels if channel not in self._queues]
+            for channel in channels:
+                self._queues[channel].add(queue)
+            if new:
+                await self._pubsub.subscribe(*new)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, channels, queue):
+        async with self._lock:
+            unused = []
+            for channel in channels:
+                queues = self._queues.get(channel)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self._queues[channel]
+                        unused.append(channel)
+            if unused:
+                await self._pubsub.unsubscribe(*unused)
+
+    def deliver(self, channel, data):
+        for queue in tuple(self._queues.get(channel, ())):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                logger.info("Feed client of %s is not reading, event dropped", channel)
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # The connection subscribes again when it reconnects
+                logger.warning("Feed subscription failed: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            if message and message["type"] == "message":
+                self.deliver(_text(message["channel"]), _text(message["data"]))
+
+
+def get_hub():
+    """Return the `FeedHub` of the running event loop, None without Redis."""
+    url = feed_url()
+    if url is None:
+        return None
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = FeedHub(url)
+    return hub
+
+
+def sse_message(data):
+    """A server-sent event of a published event."""
+    event = json.loads(data)
+    return f"id: {event.get('uid', '')}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(hub, channels, heartbeat=None):
+    """Server-sent events of `channels`, with a comment line every `heartbeat` seconds of silence."""
+    heartbeat = heartbeat or getattr(settings, "FEED_HEARTBEAT", 15)
+    queue = await hub.subscribe(channels)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_message(data)
+    finally:
+        await hub.unsubscribe(channels, queue)
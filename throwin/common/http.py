@@ -0,0 +1,31 @@
+"""
+Pooled ``httpx.AsyncClient`` for calls to payment gateways from async views.
+
+A client is bound to the event loop it was created in, so one client is kept
+per running loop: under an ASGI server that is one per process, and views run
+through ``async_to_sync`` (WSGI, tests) get a short lived one.
+"""
+
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the shared ``httpx.AsyncClient`` of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(getattr(settings, "GATEWAY_HTTP_TIMEOUT", 30), connect=5),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "GATEWAY_HTTP_MAX_CONNECTIONS", 200),
+                max_keepalive_connections=getattr(settings, "GATEWAY_HTTP_MAX_KEEPALIVE", 50),
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,202 @@
+"""
+``Idempotency-Key`` support for payment creation endpoints.
+
+Mobile clients retry on timeout. When a request carries an ``Idempotency-Key``
+header the first request takes a lock in the cache (Redis) and its response is
+stored under the key; retries get the stored response back without reaching the
+gateway or the database. A retry that arrives while the first request is still
+running gets ``409 Conflict`` with ``Retry-After``, and reusing a key for a
+different payload gets ``422``.
+
+Keys belong to the user, or for anonymous requests to their session: one
+guest cannot replay the response of another. Anonymous requests without a
+session cookie have nothing to own a key, they are processed without
+deduplication like requests without the header.
+
+Server errors and exceptions are not stored, so the client may retry them with
+the same key. If the cache is unreachable requests are processed normally.
+"""
+
+import hashlib
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    # How long completed responses are replayed
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+
+
+def _lock_timeout():
+    # Longest a request may hold the key, must exceed the gateway timeouts
+    return getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 120)
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _owner(request):
+    """Whom the keys of `request` belong to, None for an anonymous request without a session."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    session = getattr(request, "session", None)
+    if session is None:
+        return None
+    session.keys()  # Loading drops the key of a cookie that names no session
+    session_key = session.session_key
+    return f"session:{hashlib.sha256(session_key.encode()).hexdigest()}" if session_key else None
+
+
+def _cache_key(scope, owner, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{scope}:{owner}:{digest}"
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Run ``handler()`` at most once per ``Idempotency-Key`` and return its response,
+    or the stored response of the request that already used the key.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+
+    attempt = _Attempt(request, scope, key)
+    early_response = attempt.claim()
+    if early_response is not None:
+        return early_response
+    if not attempt.acquired:
+        return handler()
+
+    try:
+        response = handler()
+        attempt.store(response)
+        return response
+    finally:
+        attempt.release()
+
+
+async def aidempotent_response(request, scope, handler):
+    """``idempotent_response`` for async views, ``handler`` returns an awaitable."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return await handler()
+
+    attempt = await sync_to_async(_Attempt)(request, scope, key)
+    early_response = await sync_to_async(attempt.claim)()
+    if early_response is not None:
+        return early_response
+    if not attempt.acquired:
+        return await handler()
+
+    try:
+        response = await handler()
+        await sync_to_async(attempt.store)(response)
+        return response
+    finally:
+        await sync_to_async(attempt.release)()
+
+
+class _Attempt:
+    """The cache side of one request carrying an ``Idempotency-Key``."""
+
+    def __init__(self, request, scope, key):
+        self.scope = scope
+        self.key = key
+        self.owner = _owner(request)
+        self.record_key = _cache_key(scope, self.owner, key)
+        self.lock_key = f"{self.record_key}:lock"
+        self.fingerprint = _fingerprint(request)
+        self.acquired = False
+
+    def claim(self):
+        """
+        Take the lock for this key, or return the response to send instead of
+        processing the request. ``acquired`` stays False if the cache is down.
+        """
+        if len(self.key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if self.owner is None:
+            logger.warning(
+                "%s sent without a user or a session, processing %s normally", IDEMPOTENCY_HEADER, self.scope
+            )
+            return None
+
+        try:
+            record = cache.get(self.record_key)
+            if record is None:
+                self.acquired = cache.add(self.lock_key, self.fingerprint, _lock_timeout())
+        except Exception as exc:
+            logger.warning("Idempotency cache unavailable, processing request normally: %s", exc)
+            return None
+
+        if record is not None:
+            if record["fingerprint"] != self.fingerprint:
+                return Response(
+                    {"error": f"{IDEMPOTENCY_HEADER} was already used with a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            response = Response(record["data"], status=record["status"])
+            response[REPLAYED_HEADER] = "true"
+            return response
+
+        if not self.acquired:
+            # Another request with this key is still talking to the gateway
+            response = Response(
+                {"error": "A request with this Idempotency-Key is already being processed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+            response["Retry-After"] = "1"
+            return response
+        return None
+
+    def store(self, response):
+        if response.status_code >= 500:
+            return
+        try:
+            cache.set(
+                self.record_key,
+                {"fingerprint": self.fingerprint, "status": response.status_code, "data": response.data},
+                _ttl(),
+            )
+        except Exception as exc:
+            logger.error("Could not store idempotent response for %s: %s", self.scope, exc)
+
+    def release(self):
+        try:
+            cache.delete(self.lock_key)
+        except Exception as exc:
+            logger.warning("Could not release idempotency lock for %s: %s", self.scope, exc)
+
+
+class IdempotentCreateMixin:
+    """
+    Make ``POST`` on a DRF create view honour the ``Idempotency-Key`` header.
+
+    Wraps ``post`` rather than ``create`` so views can keep overriding ``create``.
+    """
+
+    idempotency_scope = None
+
+    def post(self, request, *args, **kwargs):
+        handler = super().post
+        scope = self.idempotency_scope or type(self).__name__
+        return idempotent_response(request, scope, lambda: handler(request, *args, **kwargs))
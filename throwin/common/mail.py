@@ -0,0 +1,196 @@
+"""
+Batched mail dispatch.
+
+``queue_mail`` appends a message to an outbox list in Redis and makes sure a
+``drain_mail_outbox`` task is scheduled on the ``mail`` queue. The task waits
+``MAIL_BATCH_DELAY`` seconds so that bursts (a restaurant with its stores and
+staff, a batch of activations) are sent together, then sends the outbox in
+batches, each over a single SMTP connection.
+
+A drain moves each batch from the outbox to a processing list of its own
+(``LMOVE``) and deletes that list once the batch is sent or scheduled for a
+retry. The lists of drains that stopped before that (a crashed or killed
+worker) are put back in the outbox after ``MAIL_PROCESSING_TIMEOUT`` seconds by
+the next drain, so messages are sent at least once.
+
+Sending is paced per mail provider (``EMAIL_HOST``) to ``MAIL_RATE_LIMIT``
+messages per second across all workers. A message that fails is retried with
+exponential backoff, ``MAIL_MAX_ATTEMPTS`` times at most; the others of the
+batch are not affected.
+
+Without Redis (local development, tests) each message is handed to the
+``send_mail_batch`` task directly.
+"""
+
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+
+from common.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = "mail:outbox"
+DRAIN_SCHEDULED_KEY = "mail:drain-scheduled"
+# Sorted set of the processing lists, scored by the time they last took a batch
+PROCESSING_KEY = "mail:processing"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def queue_mail(subject, message, to_email, from_email=None):
+    """Queue a plain text email to ``to_email`` (an address or a list of them)."""
+    recipients = [to_email] if isinstance(to_email, str) else list(to_email)
+    enqueue([{
+        "subject": subject,
+        "message": message,
+        "to": recipients,
+        "from_email": from_email or settings.EMAIL_HOST_USER,
+        "attempts": 0,
+    }])
+
+
+def enqueue(payloads):
+    from common.tasks import drain_mail_outbox, send_mail_batch
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.rpush(OUTBOX_KEY, *(json.dumps(payload) for payload in payloads))
+        except Exception as exc:
+            logger.warning("Mail outbox unavailable, sending directly: %s", exc)
+        else:
+            delay = _setting("MAIL_BATCH_DELAY", 2)
+            # One pending drain is enough, it sends everything queued until it runs
+            if cache.add(DRAIN_SCHEDULED_KEY, 1, delay + 60):
+                drain_mail_outbox.apply_async(countdown=delay)
+            return
+    send_mail_batch.delay(payloads)
+
+
+def processing_key(run):
+    return f"{PROCESSING_KEY}:{run}"
+
+
+def claim_batch(client, key, size):
+    """
+    Move up to ``size`` messages from the outbox to the processing list
+    ``key``, where they stay until ``ack_batch``.
+    """
+    with client.pipeline(transaction=False) as pipe:
+        pipe.zadd(PROCESSING_KEY, {key: time.time()})
+        for _ in range(size):
+            pipe.lmove(OUTBOX_KEY, key, "LEFT", "RIGHT")
+        _, *raw = pipe.execute()
+    return [json.loads(item) for item in raw if item is not None]
+
+
+def ack_batch(client, key):
+    """The messages of the processing list ``key`` were sent or scheduled for a retry."""
+    client.delete(key)
+
+
+def release_processing(client, key):
+    with client.pipeline() as pipe:
+        pipe.delete(key)
+        pipe.zrem(PROCESSING_KEY, key)
+        pipe.execute()
+
+
+def requeue_stale(client):
+    """Put the messages of drains that stopped before acknowledging them back in the outbox."""
+    cutoff = time.time() - _setting("MAIL_PROCESSING_TIMEOUT", 600)
+    requeued = 0
+    for key in client.zrangebyscore(PROCESSING_KEY, "-inf", cutoff):
+        while client.lmove(key, OUTBOX_KEY, "LEFT", "RIGHT") is not None:
+            requeued += 1
+        client.zrem(PROCESSING_KEY, key)
+    if requeued:
+        logger.warning("Requeued %s mails of interrupted drains", requeued)
+    return requeued
+
+
+class ProviderRateLimiter:
+    """
+    Fixed one second windows counted in the cache, shared by every worker that
+    sends through the same provider.
+    """
+
+    def __init__(self, provider, per_second):
+        self.provider = provider
+        self.per_second = per_second
+
+    def wait(self):
+        if not self.per_second:
+            return
+        while True:
+            now = time.time()
+            key = f"mail:rate:{self.provider}:{int(now)}"
+            try:
+                cache.add(key, 0, 5)
+                sent = cache.incr(key)
+            except Exception as exc:
+                logger.warning("Mail rate limit unavailable: %s", exc)
+                return
+            if sent <= self.per_second:
+                return
+            time.sleep(1 - now % 1)
+
+
+def send_batch(payloads):
+    """
+    Send ``payloads`` over one connection. Returns the payloads that failed.
+    """
+    limiter = ProviderRateLimiter(settings.EMAIL_HOST, _setting("MAIL_RATE_LIMIT", 10))
+    connection = get_connection(fail_silently=False)
+    failed = []
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not connect to the mail server: %s", exc)
+        return list(payloads)
+    try:
+        for payload in payloads:
+            limiter.wait()
+            email = EmailMessage(
+                subject=payload["subject"],
+                body=payload["message"],
+                from_email=payload["from_email"],
+                to=payload["to"],
+                connection=connection,
+            )
+            try:
+                connection.send_messages([email])
+            except Exception as exc:
+                logger.warning("Could not send mail to %s: %s", payload["to"], exc)
+                failed.append(payload)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return failed
+
+
+def retry_later(failed):
+    """Schedule failed messages again, dropping the ones out of attempts."""
+    from common.tasks import send_mail_batch
+
+    max_attempts = _setting("MAIL_MAX_ATTEMPTS", 5)
+    base = _setting("MAIL_RETRY_BACKOFF", 30)
+    by_attempt = {}
+    for payload in failed:
+        payload = {**payload, "attempts": payload.get("attempts", 0) + 1}
+        if payload["attempts"] >= max_attempts:
+            logger.error("Giving up on mail %r to %s", payload["subject"], payload["to"])
+            continue
+        by_attempt.setdefault(payload["attempts"], []).append(payload)
+    for attempts, payloads in by_attempt.items():
+        countdown = min(base * 2 ** (attempts - 1), 3600)
+        send_mail_batch.apply_async(args=[payloads], countdown=countdown)
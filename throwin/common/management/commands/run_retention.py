@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from common.retention import RULES, run_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the rows older than their retention rule (see common/retention.py), "
+        "in short transactions over primary key ranges. Runs every night through "
+        "Celery beat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rule",
+            action="append",
+            dest="rules",
+            choices=[rule.name for rule in RULES],
+            help="Apply this rule only, can be repeated. All rules by default.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Count the rows without deleting them.")
+        parser.add_argument("--sleep", type=float, help="Seconds to wait between batches.")
+
+    def handle(self, *args, **options):
+        results = run_retention(options["rules"], dry_run=options["dry_run"], sleep=options["sleep"])
+
+        verb = "would be deleted" if options["dry_run"] else "deleted"
+        for name, count in results.items():
+            if count is None:
+                self.stderr.write(self.style.WARNING(f"{name}: failed, see the logs"))
+            else:
+                self.stdout.write(f"{name}: {count} rows {verb}")
+        if None in results.values():
+            raise CommandError("Some retention rules failed.")
+        self.stdout.write(self.style.SUCCESS("Retention done."))
@@ -0,0 +1,206 @@
+"""
+Prometheus metrics shared by the web and Celery processes.
+
+Labels are kept low-cardinality on purpose: routes are URL patterns
+(``/payment_service/gmo-pg/credit-card/``), never raw paths, and no user
+or payment identifiers are ever used as label values.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# ---------------------
+# HTTP requests
+# ---------------------
+REQUEST_LATENCY = Histogram(
+    "throwin_http_request_duration_seconds",
+    "Time spent handling a request.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "throwin_http_request_db_queries",
+    "Database queries executed per request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_TIME = Histogram(
+    "throwin_http_request_db_duration_seconds",
+    "Time spent in the database per request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# ---------------------
+# Celery tasks
+# ---------------------
+TASK_DURATION = Histogram(
+    "throwin_celery_task_duration_seconds",
+    "Time spent running a Celery task.",
+    ["task", "state"],
+    buckets=LATENCY_BUCKETS + (60, 300, 900),
+)
+
+# ---------------------
+# Payment gateways (GMO PG, PayPal)
+# ---------------------
+GATEWAY_LATENCY = Histogram(
+    "throwin_gateway_request_duration_seconds",
+    "Latency of calls to external payment gateways.",
+    ["gateway", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+GATEWAY_ERRORS = Counter(
+    "throwin_gateway_request_errors_total",
+    "Failed calls to external payment gateways.",
+    ["gateway", "operation"],
+)
+
+
+@contextmanager
+def observe_gateway(gateway, operation):
+    """
+    Time a call to a payment gateway and count it as an error if it raises.
+
+    Use ``record_gateway_error`` for failures reported in a successful
+    HTTP response (GMO ``ErrCode``, non 2xx status...).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        GATEWAY_ERRORS.labels(gateway, operation).inc()
+        raise
+    finally:
+        GATEWAY_LATENCY.labels(gateway, operation).observe(time.perf_counter() - started)
+
+
+def record_gateway_error(gateway, operation):
+    GATEWAY_ERRORS.labels(gateway, operation).inc()
+
+
+# ---------------------
+# Retention (common/retention.py)
+# ---------------------
+RETENTION_DELETED = Counter(
+    "throwin_retention_deleted_rows_total",
+    "Rows removed by a retention rule.",
+    ["rule"],
+)
+RETENTION_DURATION = Histogram(
+    "throwin_retention_run_duration_seconds",
+    "Time spent applying a retention rule, sleeps between batches included.",
+    ["rule"],
+    buckets=LATENCY_BUCKETS + (60, 300, 900),
+)
+
+
+# ---------------------
+# Celery integration
+# ---------------------
+_task_started = {}
+
+
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(getattr(task, "name", "unknown"), state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+def _start_worker_exporter(**kwargs):
+    """Celery workers do not serve HTTP, expose their metrics on CELERY_METRICS_PORT."""
+    port = os.environ.get("CELERY_METRICS_PORT")
+    if port:
+        from prometheus_client import start_http_server
+
+        registry = REGISTRY
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            # Tasks run in prefork children, aggregate their metrics from disk
+            from prometheus_client import multiprocess
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        start_http_server(int(port), registry=registry)
+        logger.info("Celery metrics exported on port %s", port)
+
+
+def connect_celery_signals():
+    from celery.signals import task_postrun, task_prerun, worker_ready
+
+    task_prerun.connect(_task_prerun, weak=False)
+    task_postrun.connect(_task_postrun, weak=False)
+    worker_ready.connect(_start_worker_exporter, weak=False)
+
+
+class CeleryQueueCollector:
+    """
+    Report the length of the Celery queues at scrape time.
+
+    Reads the Redis broker lists directly so that scraping never depends on
+    a worker being alive. Errors are logged and the metric is skipped.
+    """
+
+    def __init__(self, queues=("celery", "mail")):
+        self.queues = queues
+
+    def describe(self):
+        # Nothing to check for duplicates, and registering must not hit Redis
+        return []
+
+    def collect(self):
+        from throwin.celery import app
+
+        gauge = GaugeMetricFamily(
+            "throwin_celery_queue_length", "Messages waiting in a Celery queue.", labels=["queue"]
+        )
+        try:
+            import redis
+
+            client = redis.Redis.from_url(
+                app.conf.broker_url, socket_connect_timeout=0.5, socket_timeout=0.5
+            )
+            for queue in self.queues:
+                gauge.add_metric([queue], client.llen(queue))
+        except Exception as exc:
+            logger.warning("Could not read Celery queue lengths: %s", exc)
+            return
+        yield gauge
+
+
+REGISTRY.register(CeleryQueueCollector())
+
+
+def render_metrics():
+    """Return ``(payload, content_type)`` for the /metrics endpoint."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # gunicorn workers each hold their own metrics, aggregate them from disk
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(CeleryQueueCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
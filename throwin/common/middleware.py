@@ -0,0 +1,96 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from common.metrics import REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_QUERY_TIME
+
+
+class MetricsMiddleware:
+    """
+    Record request latency and database usage per route for Prometheus.
+
+    Routes are labelled by their URL pattern so that ids in the path do not
+    create new time series. Requests that do not resolve are grouped under
+    ``unmatched``. Under ASGI the queries run in other threads and only the
+    latency is recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = [0, 0.0]
+
+        def count_queries(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        route = self._route(request)
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(duration)
+        REQUEST_QUERIES.labels(route).observe(queries[0])
+        REQUEST_QUERY_TIME.labels(route).observe(queries[1])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        duration = time.perf_counter() - started
+
+        REQUEST_LATENCY.labels(request.method, self._route(request), response.status_code).observe(duration)
+        return response
+
+    @staticmethod
+    def _route(request):
+        match = getattr(request, "resolver_match", None)
+        if match is None or match.route is None:
+            return "unmatched"
+        return "/" + match.route.lstrip("/")
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that also runs natively under ASGI.
+
+    WhiteNoise is sync only, which would make Django run every request of the
+    async stack in a thread. Static files are looked up in memory and served
+    through ``sync_to_async``, everything else is awaited directly.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,31 @@
+"""
+orjson based JSON parser, a drop-in for ``rest_framework.parsers.JSONParser``.
+
+Both parse floats to the same nearest double. orjson refuses NaN, Infinity
+and integers wider than 64 bits; those bodies go through the stock parser,
+which rejects the first two (STRICT_JSON) and accepts the last.
+"""
+
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from common.renderers import ORJSONRenderer, orjson
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let json accept what orjson refuses (big integers) or report the usual ParseError
+            return super().parse(io.BytesIO(data), media_type, parser_context)
@@ -0,0 +1,76 @@
+"""
+orjson based JSON renderer.
+
+Produces the same bytes as ``rest_framework.renderers.JSONRenderer`` with the
+project's settings (compact, UTF-8, U+2028/U+2029 escaped): Decimals and
+datetimes go through DRF's ``JSONEncoder`` so their representation does not
+change, everything orjson cannot handle falls back to the stock renderer.
+
+Floats only match while they are written without an exponent: orjson writes
+``1e16`` and ``1e-5`` where json writes ``1e+16`` and ``1e-05``, and it writes
+NaN and Infinity as ``null`` where json refuses them (STRICT_JSON). Payloads
+holding such floats are rendered by the stock renderer.
+"""
+
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, keep the stock renderer
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+class _StockRendering(Exception):
+    """Raised while encoding a value orjson would write differently."""
+
+
+def _plain_float(value):
+    # repr() switches to an exponent below 1e-4 and from 1e16 on
+    return value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def _needs_stock_rendering(data):
+    """Whether `data` holds a non-finite float or one written with an exponent."""
+    if isinstance(data, float):
+        return not (math.isfinite(data) and _plain_float(data))
+    if isinstance(data, dict):
+        return any(_needs_stock_rendering(key) or _needs_stock_rendering(value) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return any(_needs_stock_rendering(value) for value in data)
+    return False
+
+
+def _default(obj):
+    value = _encoder.default(obj)
+    if _needs_stock_rendering(value):  # Decimals become floats
+        raise _StockRendering
+    return value
+
+# Let DRF's encoder format datetimes ("Z" suffix for UTC) instead of orjson
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            or _needs_stock_rendering(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers wider than 64 bits, floats of Decimals and other edge cases, let json raise or render them
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -0,0 +1,159 @@
+"""
+Retention rules and the chunked cleanup that applies them.
+
+Each ``RetentionRule`` names a model, the date field that ages its rows and how
+old a row has to be before it is removed, plus optional extra filters. The
+rules are listed in ``RULES`` and applied every night by the ``run_retention``
+task (or the ``run_retention`` command).
+
+Rows are never removed with one large ``DELETE``: a rule walks the primary key
+in order, takes the next ``batch_size`` matching keys and deletes that key
+range (still filtered by the rule) in its own short transaction, then sleeps
+``RETENTION_SLEEP_SECONDS`` so that the hot tables (payments, sessions) are
+only ever locked for one small batch at a time.
+
+Ages can be changed per rule with ``RETENTION_OVERRIDES``, e.g.
+``{"pending_gmo_payments": {"age": timedelta(days=30)}}``; an age of ``None``
+disables a rule.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from common.metrics import RETENTION_DELETED, RETENTION_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionRule:
+
+    def __init__(self, name, model, age, date_field="created_at", filters=None, batch_size=1000):
+        self.name = name
+        self.model_label = model
+        self.age = age
+        self.date_field = date_field
+        self.filters = filters or Q()
+        self.batch_size = batch_size
+
+    def __repr__(self):
+        return f"<RetentionRule {self.name}: {self.model_label} older than {self.age}>"
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def configured(self):
+        """The rule with the overrides of ``RETENTION_OVERRIDES`` applied."""
+        overrides = getattr(settings, "RETENTION_OVERRIDES", {}).get(self.name)
+        if not overrides:
+            return self
+        options = {
+            "age": self.age,
+            "date_field": self.date_field,
+            "filters": self.filters,
+            "batch_size": self.batch_size,
+            **overrides,
+        }
+        return RetentionRule(self.name, self.model_label, **options)
+
+    def expired(self, now=None):
+        """The rows this rule removes."""
+        cutoff = (now or timezone.now()) - self.age
+        return self.model._default_manager.filter(self.filters, **{f"{self.date_field}__lt": cutoff})
+
+
+RULES = [
+    # Sign ups that were never activated
+    RetentionRule("temporary_users", "accounts.TemporaryUser", timedelta(hours=48)),
+    # Sessions only reach the database with the db or cached_db session engines
+    RetentionRule("expired_sessions", "sessions.Session", timedelta(0), date_field="expire_date"),
+    # Card payments abandoned before the 3-D Secure step completed
+    RetentionRule(
+        "pending_gmo_payments",
+        "payment_service.GMOCreditPayment",
+        timedelta(days=7),
+        filters=Q(status="PENDING"),
+        batch_size=500,
+    ),
+    RetentionRule(
+        "consumed_gacha_history",
+        "gacha.GachaHistory",
+        timedelta(days=180),
+        date_field="consumed_at",
+        filters=Q(is_consumed=True),
+    ),
+]
+
+
+def get_rule(name):
+    for rule in RULES:
+        if rule.name == name:
+            return rule
+    raise KeyError(name)
+
+
+def apply_rule(rule, dry_run=False, now=None, sleep=None):
+    """
+    Delete the expired rows of ``rule`` batch by batch, returns the number of
+    rows deleted (or that would be deleted on a dry run).
+    """
+    rule = rule.configured()
+    if rule.age is None:
+        return 0
+    if sleep is None:
+        sleep = getattr(settings, "RETENTION_SLEEP_SECONDS", 0.5)
+
+    expired = rule.expired(now)
+    if dry_run:
+        count = expired.count()
+        logger.info("Retention %s: %s rows would be deleted", rule.name, count)
+        return count
+
+    started = time.perf_counter()
+    deleted = 0
+    last_pk = None
+    try:
+        while True:
+            batch = expired.order_by("pk")
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list("pk", flat=True)[:rule.batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                _, per_model = expired.filter(pk__gte=pks[0], pk__lte=pks[-1]).delete()
+            # Count the rows of the model only, not the cascades
+            count = per_model.get(rule.model._meta.label, 0)
+            RETENTION_DELETED.labels(rule.name).inc(count)
+            deleted += count
+            last_pk = pks[-1]
+            if len(pks) < rule.batch_size:
+                break
+            if sleep:
+                time.sleep(sleep)
+    finally:
+        RETENTION_DURATION.labels(rule.name).observe(time.perf_counter() - started)
+
+    logger.info("Retention %s: %s rows deleted", rule.name, deleted)
+    return deleted
+
+
+def run_retention(names=None, dry_run=False, now=None, sleep=None):
+    """Apply the rules named in ``names`` (all of them by default), returns ``{name: rows}``."""
+    rules = [get_rule(name) for name in names] if names else RULES
+    results = {}
+    for rule in rules:
+        try:
+            results[rule.name] = apply_rule(rule, dry_run=dry_run, now=now, sleep=sleep)
+        except Exception as exc:
+            # One failing rule must not keep the others from running
+            logger.error("Retention %s failed: %s", rule.name, exc)
+            results[rule.name] = None
+    return results
@@ -0,0 +1,14 @@
+'use strict';
+{
+    // Reload the changelist filtered on the object picked in an AutocompleteFilter
+    django.jQuery(document).on('change', 'select[data-filter-parameter]', function() {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('p');
+        if (this.value) {
+            params.set(this.dataset.filterParameter, this.value);
+        } else {
+            params.delete(this.dataset.filterParameter);
+        }
+        window.location.search = params.toString();
+    });
+}
@@ -0,0 +1,71 @@
+import uuid
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from common.cache import get_redis_client
+from common.mail import (
+    DRAIN_SCHEDULED_KEY,
+    ack_batch,
+    claim_batch,
+    processing_key,
+    release_processing,
+    requeue_stale,
+    retry_later,
+    send_batch,
+)
+from common import retention
+
+
+@shared_task()
+def drain_mail_outbox():
+    """
+        task to send the queued mails in batches, one SMTP connection per batch
+    """
+    client = get_redis_client()
+    if client is None:
+        return "no mail outbox"
+
+    # Mails queued from now on schedule another drain
+    cache.delete(DRAIN_SCHEDULED_KEY)
+    requeue_stale(client)
+
+    batch_size = getattr(settings, "MAIL_BATCH_SIZE", 50)
+    key = processing_key(uuid.uuid4().hex)
+    sent = failed = 0
+    # A batch stays in the processing list until it is sent or scheduled for a retry
+    while batch := claim_batch(client, key, batch_size):
+        failures = send_batch(batch)
+        retry_later(failures)
+        ack_batch(client, key)
+        sent += len(batch) - len(failures)
+        failed += len(failures)
+    release_processing(client, key)
+
+    return f"{sent} mails sent, {failed} failed"
+
+
+@shared_task()
+def send_mail_batch(payloads):
+    """
+        task to send the given mails over one SMTP connection, used for retries
+        and when there is no Redis outbox
+    """
+    failures = send_batch(payloads)
+    retry_later(failures)
+
+    return f"{len(payloads) - len(failures)} mails sent, {len(failures)} failed"
+
+
+@shared_task()
+def run_retention(names=None, dry_run=False):
+    """
+        task to delete the rows older than their retention rule, in short
+        batches (see common.retention)
+    """
+    results = retention.run_retention(names, dry_run=dry_run)
+
+    return ", ".join(
+        f"{name}: {'failed' if count is None else count}" for name, count in results.items()
+    )
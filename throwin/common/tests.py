@@ -1,3 +1,262 @@
-from django.test import TestCase
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from common.mail import OUTBOX_KEY, claim_batch, processing_key, queue_mail, requeue_stale, send_batch
+from common.metrics import GATEWAY_ERRORS, RETENTION_DELETED, observe_gateway
+from common.parsers import ORJSONParser
+from common.renderers import ORJSONRenderer
+from common.retention import apply_rule, get_rule
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class FlakyEmailBackend(LocmemEmailBackend):
+    """Locmem backend that counts connections and rejects one recipient."""
+
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+
+    def send_messages(self, messages):
+        if any("bounce@" in address for message in messages for address in message.to):
+            raise ConnectionError("Recipient refused")
+        return super().send_messages(messages)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, METRICS_TOKEN="")
+class MetricsEndpointTests(TestCase):
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_requests_are_labelled_by_route(self):
+        self.client.get("/")
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-me")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('throwin_http_request_duration_seconds_count{method="GET",route="/",status="200"}', body)
+        self.assertIn('throwin_http_request_db_queries_count{route="/"}', body)
+
+    def test_nothing_is_served_without_token_unless_debug(self):
+        # Behind the proxy every request comes from a private address
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.2").status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.2").status_code, 200)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="8.8.8.8").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-me", REMOTE_ADDR="8.8.8.8")
+        self.assertEqual(response.status_code, 200)
+
+
+class GatewayMetricsTests(TestCase):
+
+    def test_gateway_exceptions_are_counted(self):
+        errors = GATEWAY_ERRORS.labels("gmo", "ExecTran")
+        before = errors._value.get()
+
+        with self.assertRaises(ConnectionError), observe_gateway("gmo", "ExecTran"):
+            raise ConnectionError
+
+        self.assertEqual(errors._value.get(), before + 1)
+
+
+class ORJSONTests(SimpleTestCase):
+    payload = {
+        "amount": Decimal("1500.50"),
+        "uid": uuid.UUID("5e0f9a7a-8e24-4f55-b6b6-1a6b2f7b2bb1"),
+        "created_at": datetime.datetime(2025, 7, 1, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        "tokyo": timezone.localtime(timezone.now(), datetime.timezone(datetime.timedelta(hours=9))),
+        "naive": datetime.datetime(2025, 7, 1, 9, 30),
+        "date": datetime.date(2025, 7, 1),
+        "time": datetime.time(9, 30, 15, 500),
+        "lazy": gettext_lazy("Payment"),
+        "message": "ありがとう\u2028\u2029",
+        "nested": [{"count": 3, "rate": 0.036, "none": None}, (1, 2)],
+    }
+
+    def test_output_matches_drf_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_values_orjson_cannot_encode_fall_back_to_json(self):
+        payload = {"huge": 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_floats_match_drf_json_renderer(self):
+        payload = {
+            "plain": [0.1, 1.5, -0.0, 3.0, 0.0001, 123456789012345.6],
+            "exponent": [1e16, 1e-05, 1e-07, 1e22, 5e-324],
+            "decimal": Decimal("1E+20"),
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(ORJSONRenderer().render({"rates": [0.036, 0.75]}), b'{"rates":[0.036,0.75]}')
+
+    def test_non_finite_floats_are_refused_like_drf_json_renderer(self):
+        for value in (float("nan"), float("inf"), float("-inf")):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({"value": value})
+            with self.assertRaises(ValueError):
+                ORJSONRenderer().render({"value": [value]})
+
+    def test_indented_output_matches_drf_json_renderer(self):
+        media_type = "application/json; indent=4"
+        self.assertEqual(
+            ORJSONRenderer().render(self.payload, media_type),
+            JSONRenderer().render(self.payload, media_type),
+        )
+
+    def test_parser_round_trips(self):
+        body = b'{"amount": 1000, "nickname": "\u82b1\u5b50", "huge": 1180591620717411303424}'
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            {"amount": 1000, "nickname": "花子", "huge": 2 ** 70},
+        )
+
+    def test_invalid_json_is_a_parse_error(self):
+        for body in (b'{"amount": ', b'{"amount": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    EMAIL_BACKEND="common.tests.FlakyEmailBackend",
+    MAIL_RATE_LIMIT=0,
+    MAIL_RETRY_BACKOFF=30,
+)
+class MailTests(SimpleTestCase):
+
+    def setUp(self):
+        FlakyEmailBackend.opened = 0
+
+    def payload(self, to, attempts=0):
+        return {"subject": "Hi", "message": "Body", "to": [to], "from_email": "noreply@example.com", "attempts": attempts}
+
+    def test_batch_is_sent_over_one_connection(self):
+        failed = send_batch([self.payload(f"user{i}@example.com") for i in range(5)])
+
+        self.assertEqual(failed, [])
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual([message.to for message in mail.outbox], [[f"user{i}@example.com"] for i in range(5)])
+
+    def test_failed_message_is_retried_with_backoff(self):
+        with mock.patch("common.tasks.send_mail_batch.apply_async") as apply_async:
+            from common.tasks import send_mail_batch
+
+            send_mail_batch([self.payload("ok@example.com"), self.payload("bounce@example.com", attempts=1)])
+
+        self.assertEqual(len(mail.outbox), 1)
+        apply_async.assert_called_once_with(args=[[self.payload("bounce@example.com", attempts=2)]], countdown=60)
+
+    def test_without_redis_queued_mail_goes_to_the_batch_task(self):
+        with mock.patch("common.tasks.send_mail_batch.delay") as delay:
+            queue_mail("Hi", "Body", "user@example.com", from_email="noreply@example.com")
+
+        delay.assert_called_once_with([self.payload("user@example.com")])
+
+
+class ListRedis:
+    """The list and sorted set commands the mail outbox uses, kept in memory."""
+
+    def __init__(self):
+        self.lists, self.scores = {}, {}
+
+    def lmove(self, source, destination, src, dest):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        item = items.pop(0)
+        self.lists.setdefault(destination, []).append(item)
+        return item
+
+    def zadd(self, key, mapping):
+        self.scores.update(mapping)
+
+    def zrangebyscore(self, key, low, high):
+        return [member for member, score in self.scores.items() if score <= high]
+
+    def zrem(self, key, member):
+        self.scores.pop(member, None)
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __enter__(self):
+                self.calls = []
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            def execute(self):
+                return [getattr(client, name)(*args) for name, args in self.calls]
+
+        return Pipeline()
+
+
+class MailOutboxTests(SimpleTestCase):
+
+    def test_claimed_mails_of_an_interrupted_drain_are_requeued(self):
+        client = ListRedis()
+        client.lists[OUTBOX_KEY] = ['{"to": ["a@example.com"]}', '{"to": ["b@example.com"]}', '{"to": ["c@example.com"]}']
+        key = processing_key("crashed")
+
+        # The worker dies after claiming the batch, before sending it
+        self.assertEqual(claim_batch(client, key, 2), [{"to": ["a@example.com"]}, {"to": ["b@example.com"]}])
+        self.assertEqual(client.lists[OUTBOX_KEY], ['{"to": ["c@example.com"]}'])
+
+        with override_settings(MAIL_PROCESSING_TIMEOUT=600):
+            self.assertEqual(requeue_stale(client), 0)
+        with override_settings(MAIL_PROCESSING_TIMEOUT=-1):
+            self.assertEqual(requeue_stale(client), 2)
+
+        self.assertEqual(len(client.lists[OUTBOX_KEY]), 3)
+        self.assertEqual(client.lists[key], [])
+        self.assertEqual(client.scores, {})
+
+
+@override_settings(RETENTION_OVERRIDES={"temporary_users": {"batch_size": 2}})
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        from accounts.models import TemporaryUser
+
+        self.model = TemporaryUser
+        for i in range(5):
+            TemporaryUser.objects.create(email=f"user{i}@example.com", password="secret")
+        old = list(TemporaryUser.objects.order_by("id").values_list("id", flat=True)[:3])
+        TemporaryUser.objects.filter(id__in=old).update(created_at=timezone.now() - datetime.timedelta(days=3))
+
+    def test_dry_run_only_counts(self):
+        self.assertEqual(apply_rule(get_rule("temporary_users"), dry_run=True), 3)
+        self.assertEqual(self.model.objects.count(), 5)
+
+    def test_expired_rows_are_deleted_in_batches(self):
+        before = RETENTION_DELETED.labels("temporary_users")._value.get()
+
+        with mock.patch("common.retention.time.sleep") as sleep:
+            deleted = apply_rule(get_rule("temporary_users"), sleep=0.1)
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(self.model.objects.count(), 2)
+        # Two batches (2 + 1 rows), one pause between them
+        sleep.assert_called_once_with(0.1)
+        self.assertEqual(RETENTION_DELETED.labels("temporary_users")._value.get() - before, 3)
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -26,3 +28,24 @@ def login_social_user(email, password):
     else:
         data["data"]["email"] = user.email
     return data
+
+
+NOT_PRODUCTION_FLAG = "--i-know-this-is-not-production"
+
+
+def add_not_production_argument(parser):
+    parser.add_argument(
+        NOT_PRODUCTION_FLAG,
+        action="store_true",
+        dest="not_production",
+        help="Run even though DEBUG is off. Never use it against a production database.",
+    )
+
+
+def ensure_not_production(what, confirmed=False, error=ImproperlyConfigured):
+    """
+    Refuse to run `what` (fake data, a fake gateway) unless DEBUG is on or the
+    caller `confirmed` it does not run against production.
+    """
+    if not (settings.DEBUG or confirmed):
+        raise error(f"{what} only runs with DEBUG on. Pass {NOT_PRODUCTION_FLAG} if this is not production.")
@@ -0,0 +1,137 @@
+import datetime
+import io
+import random
+import timeit
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from common.parsers import ORJSONParser
+from common.renderers import ORJSONRenderer, orjson
+from payment_service.gmo_pg.models import GMOCreditPayment
+from payment_service.gmo_pg.serializers import GMOCreditPaymentSerializer
+from store.models import Restaurant, Store
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stock DRF JSON renderer/parser with the orjson ones on a "
+        "payment history page and the payment stats timeseries. Runs in memory, "
+        "nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100, help="Payments on the history page.")
+        parser.add_argument("--days", type=int, default=365, help="Days in the stats timeseries.")
+        parser.add_argument("--iterations", type=int, default=200, help="Renders per timing run.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timing runs, the best one is reported.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write(self.style.WARNING("orjson is not installed, ORJSONRenderer falls back to json."))
+
+        rng = random.Random(options["seed"])
+        payloads = {
+            "history page": self._history_page(rng, options["rows"]),
+            "stats timeseries": self._stats(rng, options["days"]),
+        }
+
+        for name, data in payloads.items():
+            stock = JSONRenderer().render(data)
+            fast = ORJSONRenderer().render(data)
+            if stock != fast:
+                self.stderr.write(self.style.ERROR(f"{name}: rendered output differs from JSONRenderer"))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({len(stock)} bytes)"))
+            self._compare(
+                "render",
+                lambda: JSONRenderer().render(data),
+                lambda: ORJSONRenderer().render(data),
+                options,
+            )
+            self._compare(
+                "parse",
+                lambda: JSONParser().parse(io.BytesIO(stock)),
+                lambda: ORJSONParser().parse(io.BytesIO(stock)),
+                options,
+            )
+
+    def _compare(self, label, stock, fast, options):
+        stock_time = self._best(stock, options)
+        fast_time = self._best(fast, options)
+        self.stdout.write(
+            f"  {label:<7} json {stock_time * 1e6:9.1f} us   orjson {fast_time * 1e6:9.1f} us   "
+            f"x{stock_time / fast_time:.1f}"
+        )
+
+    @staticmethod
+    def _best(func, options):
+        runs = timeit.repeat(func, number=options["iterations"], repeat=options["repeat"])
+        return min(runs) / options["iterations"]
+
+    @staticmethod
+    def _history_page(rng, rows):
+        """The body of RoleBasedPaymentHistoryView for one page of ``rows`` payments."""
+        agent = User(name="Sales Agent")
+        store = Store(name="Bench Store", restaurant=Restaurant(name="Bench Restaurant", sales_agent=agent))
+        customer = User(name="Bench Consumer")
+        now = timezone.now()
+
+        payments = []
+        for index in range(rows):
+            created_at = now - datetime.timedelta(minutes=index * 17, microseconds=rng.randrange(10 ** 6))
+            payment = GMOCreditPayment(
+                order_id=f"ORDER{index:08d}",
+                customer=customer,
+                nickname=rng.choice(["Taro", "花子", None]),
+                staff_uid=uuid.UUID(int=rng.getrandbits(128), version=4),
+                store_uid=uuid.UUID(int=rng.getrandbits(128), version=4),
+                amount=Decimal(rng.choice([1000, 3000, 5000, 10000])),
+                status="CAPTURE",
+                transaction_id=uuid.UUID(int=rng.getrandbits(128)).hex,
+                approval_code=f"{rng.randrange(10 ** 7):07d}",
+                process_date=created_at,
+                card_last4=f"{rng.randrange(10 ** 4):04d}",
+                expire_date="1228",
+                forward="2a99662",
+                pay_method="1",
+                created_at=created_at,
+            )
+            payment._store = store
+            payments.append(payment)
+
+        return {
+            "count": rows * 10,
+            "next": "https://api.throwin-glow.com/payment_service/gmo-pg/payment-history/?page=2",
+            "previous": None,
+            "results": GMOCreditPaymentSerializer(payments, many=True).data,
+        }
+
+    @staticmethod
+    def _stats(rng, days):
+        """The body of PaymentStatsView, whose timeseries holds raw dates and Decimals."""
+        start = timezone.localdate() - datetime.timedelta(days=days)
+        return {
+            "filters_applied": {
+                "year": None, "month": None, "store_uid": None,
+                "staff_uid": None, "date_from": None, "date_to": None,
+            },
+            "total_amount_jpy": Decimal("123456789.00"),
+            "total_throwins": days * 40,
+            "latest_balance_jpy": Decimal("98765.43"),
+            "total_stores": 12,
+            "timeseries": [
+                {
+                    "date": start + datetime.timedelta(days=day),
+                    "throwin_count": rng.randrange(100),
+                    "total_amount": Decimal(rng.randrange(10 ** 6)) + Decimal("0.50"),
+                }
+                for day in range(days)
+            ],
+        }
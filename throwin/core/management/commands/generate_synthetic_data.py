@@ -0,0 +1,84 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from common.utils import add_not_production_argument, ensure_not_production
+from core import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with deterministic synthetic restaurants, stores, staff, consumers, "
+        "payments, reviews and gacha plays for benchmarks. The same seed and end date always "
+        "give the same data. Use --flush to replace a previous synthetic data set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--end", help="Last day of payments (YYYY-MM-DD), yesterday by default.")
+        parser.add_argument("--days", type=int, default=365, help="Days of payments, ending on --end.")
+        parser.add_argument("--restaurants", type=int, default=10)
+        parser.add_argument("--stores-per-restaurant", type=int, default=3)
+        parser.add_argument("--staff-per-store", type=int, default=5)
+        parser.add_argument("--consumers", type=int, default=1000)
+        parser.add_argument("--agents", type=int, default=2, help="Sales agents, shared by the restaurants.")
+        parser.add_argument("--payments", type=int, default=100000)
+        parser.add_argument("--anonymous-ratio", type=float, default=0.3, help="Fraction of payments without a consumer.")
+        parser.add_argument("--review-ratio", type=float, default=0.1, help="Fraction of captured payments with a review.")
+        parser.add_argument("--play-ratio", type=float, default=0.6, help="Fraction of the earned spins played.")
+        parser.add_argument("--chunk-size", type=int, default=synthetic.DEFAULT_CHUNK_SIZE, help="Rows per insert.")
+        parser.add_argument("--workers", type=int, default=1, help="Processes writing payments (PostgreSQL only).")
+        parser.add_argument("--copy", action="store_true", help="Write payments and reviews with COPY (PostgreSQL).")
+        parser.add_argument("--flush", action="store_true", help="Remove the previous synthetic data first.")
+        parser.add_argument("--password", help="Password of every synthetic user, unusable by default.")
+        add_not_production_argument(parser)
+
+    def handle(self, *args, **options):
+        ensure_not_production("Synthetic data", options["not_production"], error=CommandError)
+        end = None
+        if options["end"]:
+            try:
+                end = datetime.date.fromisoformat(options["end"])
+            except ValueError:
+                raise CommandError("--end must look like 2024-01-31.")
+        if options["workers"] > 1 and connection.vendor != "postgresql":
+            raise CommandError("Parallel workers need PostgreSQL.")
+        if min(options["days"], options["restaurants"], options["stores_per_restaurant"],
+               options["staff_per_store"], options["chunk_size"]) <= 0:
+            raise CommandError("--days, --restaurants, --stores-per-restaurant, --staff-per-store and "
+                               "--chunk-size must be positive.")
+
+        if synthetic.exists():
+            if not options["flush"]:
+                raise CommandError("Synthetic data is already loaded, add --flush to replace it.")
+            removed = synthetic.flush(options["chunk_size"])
+            self.stdout.write(f"Removed the previous synthetic data ({removed} payments).")
+
+        started = time.perf_counter()
+        counts = synthetic.generate(
+            seed=options["seed"],
+            end=end,
+            days=options["days"],
+            restaurants=options["restaurants"],
+            stores_per_restaurant=options["stores_per_restaurant"],
+            staff_per_store=options["staff_per_store"],
+            consumers=options["consumers"],
+            agents=options["agents"],
+            payments=options["payments"],
+            anonymous_ratio=options["anonymous_ratio"],
+            review_ratio=options["review_ratio"],
+            play_ratio=options["play_ratio"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            use_copy=options["copy"],
+            password=options["password"],
+            confirm_not_production=True,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['payments']} payments and {counts['gacha_plays']} gacha plays written in {elapsed:.1f}s "
+            f"({counts['payments'] / elapsed:.0f} payments/s)."
+        ))
+        self.stdout.write("Run reconcile_balances --repair and rebuild_staff_earnings to fill the balances and earnings.")
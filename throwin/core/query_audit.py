@@ -0,0 +1,94 @@
+"""Capture the SQL issued by a block of code and inspect its query plans.
+
+Used by the hot endpoint regression suite in ``core/tests.py`` to keep the
+query counts and plans of the busiest endpoints from silently regressing.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+# Tables that grow with traffic. A full scan on any of them is a regression.
+LARGE_TABLES = (
+    "payment_service_gmocreditpayment",
+    "payment_service_paymenthistory",
+    "review_review",
+    "gacha_gachahistory",
+    "gacha_spinbalance",
+    "accounts_like",
+)
+
+_SQLITE_FULL_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+_POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class QueryAudit(CaptureQueriesContext):
+    """
+    Context manager recording every query executed inside it.
+
+    On top of Django's ``CaptureQueriesContext`` it exposes the total SQL
+    time and the EXPLAIN output of each captured SELECT.
+    """
+
+    def __init__(self, using=connection):
+        super().__init__(using)
+
+    @property
+    def count(self):
+        return len(self)
+
+    @property
+    def sql_time(self):
+        """Total time spent in the database, in seconds."""
+        return sum(float(query["time"]) for query in self.captured_queries)
+
+    def selects(self):
+        return [
+            query["sql"] for query in self.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+
+    def explain(self):
+        """Return ``[(sql, plan_text), ...]`` for every captured SELECT."""
+        return [(sql, explain_sql(sql, self.connection)) for sql in self.selects()]
+
+    def full_scans(self, tables=LARGE_TABLES):
+        """Return ``[(table, sql), ...]`` for captured queries that scan a large table."""
+        scans = []
+        for sql, plan in self.explain():
+            for table in full_scan_tables(plan, self.connection.vendor):
+                if table in tables:
+                    scans.append((table, sql))
+        return scans
+
+
+def explain_sql(sql, using=connection):
+    """
+    Return the query plan of ``sql`` as text.
+
+    On PostgreSQL sequential scans are disabled for the EXPLAIN so that the
+    planner only picks one when no usable index exists, which keeps the check
+    independent of the (small) size of test tables.
+    """
+    if using.vendor == "postgresql":
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+    with using.cursor() as cursor:
+        if using.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(row[-1] for row in cursor.fetchall())
+        cursor.execute(f"EXPLAIN {sql}")
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def full_scan_tables(plan, vendor=None):
+    """Return the tables a query plan reads with a full table scan."""
+    vendor = vendor or connection.vendor
+    if vendor == "postgresql":
+        return set(_POSTGRES_FULL_SCAN.findall(plan))
+    if vendor == "sqlite":
+        return set(_SQLITE_FULL_SCAN.findall(plan))
+    return set()
@@ -0,0 +1,470 @@
+"""
+Synthetic data for benchmarks.
+
+`generate` fills the database with sales agents, restaurants and their owners,
+stores, staff, consumers, GMO payments spread over a span of days, reviews of
+the payments with a message, and the spin balances and gacha plays the
+payments earn. Volumes are configurable, payments are meant to go to the
+millions.
+
+Everything is deterministic for a given seed and end date: each payment draws
+from its own random generator seeded with `(seed, index)`, so the same rows
+come out whatever the chunk size, the chunk order or the number of worker
+processes.
+Rows are written with `bulk_create` (or `COPY` on Postgres) chunk by chunk,
+and every user shares one password hash computed upfront, unusable unless a
+password is given. `generate` refuses to run with DEBUG off unless the caller
+confirms the database is not production.
+
+Times follow the shape of real tips: more payments on Friday and Saturday, at
+lunch and dinner (Japan time), and a traffic that grows over the span. Staff
+and stores get Zipf-like popularity, small amounts are picked more often.
+
+Balances, staff earnings and agent commissions are not written: run
+`reconcile_balances --repair` and `rebuild_staff_earnings` afterwards when a
+benchmark needs them. All synthetic users have an email at `DOMAIN` and all
+payments an order id starting with `ORDER_PREFIX`, `flush` removes them.
+"""
+
+import csv
+import datetime
+import io
+import logging
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import accumulate
+from multiprocessing import get_context
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+
+from accounts.choices import AuthProvider, UserKind
+from accounts.management.commands.base_users import japanese_names
+from accounts.models import User, UserProfile
+from common.utils import ensure_not_production
+from gacha.choices import GachaKind
+from gacha.models import GachaHistory, SpinBalance
+from payment_service.gmo_pg import partitions
+from payment_service.gmo_pg.models import Balance, GMOCreditPayment, GMOOrderId
+from review.models import Review
+from store.management.commands.base_store import japanese_stores
+from store.models import Restaurant, RestaurantUser, Store, StoreUser
+
+logger = logging.getLogger(__name__)
+
+DOMAIN = "synthetic.throwin.invalid"
+ORDER_PREFIX = "SYN"
+DEFAULT_CHUNK_SIZE = 5000
+TZ = ZoneInfo("Asia/Tokyo")
+
+# Relative traffic per hour of the day (Japan time) and per weekday (Monday first)
+HOUR_WEIGHTS = (
+    1, 0.5, 0.2, 0.1, 0.1, 0.1, 0.3, 1, 2, 2, 3, 6,
+    10, 9, 4, 3, 3, 5, 9, 12, 12, 10, 6, 3,
+)
+WEEKDAY_WEIGHTS = (0.8, 0.8, 0.9, 1.0, 1.3, 1.5, 1.2)
+STATUSES, STATUS_WEIGHTS = ("CAPTURE", "FAILED", "PENDING"), (96, 3, 1)
+GACHA_KINDS, GACHA_WEIGHTS = (GachaKind.GOLD, GachaKind.SILVER, GachaKind.BRONZE), (5, 25, 70)
+THROWIN_AMOUNTS = "1000,2000,5000,10000"
+MESSAGES = (
+    "いつもありがとうございます!",
+    "素敵な接客でした。",
+    "また来ます!",
+    "料理がとても美味しかったです。",
+    "笑顔に元気をもらいました。",
+    "Thank you for the great service!",
+)
+
+PROFILE_INTRODUCTIONS = {
+    UserKind.RESTAURANT_STAFF: "I'm restaurant staff.",
+    UserKind.RESTAURANT_OWNER: "I'm admin of this restaurant",
+    UserKind.SALES_AGENT: "I'm sales agent",
+    UserKind.CONSUMER: "",
+}
+
+# Reference data of the payment workers, set before the pool forks
+_plan = None
+
+
+def _rng(seed, *parts):
+    return random.Random(":".join(str(part) for part in (seed, *parts)))
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _zipf(count, exponent=1.1):
+    """Cumulative weights of `count` items whose popularity decreases with their rank."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _chunks(total, chunk_size):
+    for index, start in enumerate(range(0, total, chunk_size)):
+        yield index, start, min(start + chunk_size, total)
+
+
+class Timeline:
+    """Random payment times over the `days` days ending on `end`."""
+
+    def __init__(self, end, days):
+        self.days = [end - datetime.timedelta(days=days - 1 - offset) for offset in range(days)]
+        # Traffic grows from half to one and a half times the average over the span
+        self.day_weights = list(accumulate(
+            (0.5 + offset / days) * WEEKDAY_WEIGHTS[day.weekday()] for offset, day in enumerate(self.days)
+        ))
+        self.hour_weights = list(accumulate(HOUR_WEIGHTS))
+
+    def sample(self, rng):
+        day = rng.choices(self.days, cum_weights=self.day_weights)[0]
+        hour = rng.choices(range(24), cum_weights=self.hour_weights)[0]
+        moment = datetime.time(hour, rng.randrange(60), rng.randrange(60), rng.randrange(1000000))
+        return datetime.datetime.combine(day, moment, tzinfo=TZ)
+
+    def months(self):
+        return sorted({partitions.month_start(day) for day in self.days})
+
+
+def _insert(model, objects, use_copy=False):
+    """Write `objects` in one statement, `COPY` on Postgres when asked (no pks are set then)."""
+    if not objects:
+        return
+    if not use_copy or connection.vendor != "postgresql":
+        model.objects.bulk_create(objects)
+        return
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key and not field.generated]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        values = (field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields)
+        writer.writerow(r"\N" if value is None else value for value in values)
+    buffer.seek(0)
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
+
+def _user(seed, kind, index, password):
+    _, japanese = japanese_names[index % len(japanese_names)]
+    return User(
+        email=f"{kind}{index:08d}@{DOMAIN}",
+        username=f"syn_{kind}_{index:08d}",
+        name=f"{japanese} {index}",
+        password=password,
+        kind=kind,
+        is_active=True,
+        is_verified=True,
+        auth_provider=AuthProvider.EMAIL,
+        uid=_uuid(_rng(seed, "user", kind, index)),
+    )
+
+
+def _create_users(seed, kind, count, password, chunk_size):
+    """Create `count` users of `kind` with their profile (and balance). Returns their ids in order."""
+    ids = []
+    for _, start, end in _chunks(count, chunk_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([_user(seed, kind, index, password) for index in range(start, end)])
+            UserProfile.objects.bulk_create(
+                UserProfile(user_id=user.id, introduction=PROFILE_INTRODUCTIONS[kind], address="") for user in users
+            )
+            if kind != UserKind.CONSUMER:
+                Balance.objects.bulk_create(Balance(user_id=user.id) for user in users)
+        ids.extend(user.id for user in users)
+    return ids
+
+
+def create_accounts(seed, restaurants, stores_per_restaurant, staff_per_store, consumers, agents,
+                    chunk_size=DEFAULT_CHUNK_SIZE, password=None):
+    """Create the users, restaurants, stores and staff memberships, with an unusable password by default."""
+    password = make_password(password)
+    rng = _rng(seed, "accounts")
+
+    agent_ids = _create_users(seed, UserKind.SALES_AGENT, agents, password, chunk_size)
+    owner_ids = _create_users(seed, UserKind.RESTAURANT_OWNER, restaurants, password, chunk_size)
+    restaurant_rows = Restaurant.objects.bulk_create(
+        Restaurant(
+            name=f"{japanese_stores[index % len(japanese_stores)][1]} {index}",
+            slug=f"synthetic-{index}",
+            restaurant_owner_id=owner_id,
+            sales_agent_id=agent_ids[rng.randrange(len(agent_ids))] if agent_ids else None,
+            uid=_uuid(_rng(seed, "restaurant", index)),
+        )
+        for index, owner_id in enumerate(owner_ids)
+    )
+    RestaurantUser.objects.bulk_create(
+        RestaurantUser(restaurant_id=restaurant.id, user_id=restaurant.restaurant_owner_id, role=UserKind.RESTAURANT_OWNER)
+        for restaurant in restaurant_rows
+    )
+
+    store_rows = Store.objects.bulk_create(
+        Store(
+            restaurant_id=restaurant.id,
+            name=f"{restaurant.name} {number + 1}号店",
+            code=f"syn{index:08d}",
+            throwin_amounts=THROWIN_AMOUNTS,
+            uid=_uuid(_rng(seed, "store", index)),
+        )
+        for index, (restaurant, number) in enumerate(
+            (restaurant, number) for restaurant in restaurant_rows for number in range(stores_per_restaurant)
+        )
+    )
+    staff_ids = _create_users(seed, UserKind.RESTAURANT_STAFF, len(store_rows) * staff_per_store, password, chunk_size)
+    for _, start, end in _chunks(len(staff_ids), chunk_size):
+        memberships = [(store_rows[index // staff_per_store], staff_ids[index]) for index in range(start, end)]
+        with transaction.atomic():
+            StoreUser.objects.bulk_create(
+                StoreUser(store_id=store.id, user_id=user_id, role=UserKind.RESTAURANT_STAFF)
+                for store, user_id in memberships
+            )
+            RestaurantUser.objects.bulk_create(
+                RestaurantUser(restaurant_id=store.restaurant_id, user_id=user_id, role=UserKind.RESTAURANT_STAFF)
+                for store, user_id in memberships
+            )
+    _create_users(seed, UserKind.CONSUMER, consumers, password, chunk_size)
+
+
+def load_plan(seed, end, days):
+    """The stores, staff and consumers the payments are drawn from."""
+    stores = list(
+        Store.objects.filter(code__startswith="syn").order_by("code").values_list("uid", "throwin_amounts")
+    )
+    staff = {}
+    rows = StoreUser.objects.filter(store__code__startswith="syn", user__email__endswith=DOMAIN)
+    for store_uid, staff_uid in rows.order_by("store__code", "user__email").values_list("store__uid", "user__uid"):
+        staff.setdefault(store_uid, []).append(staff_uid)
+    # Popular stores get more tips, and so do the first staff and the small amounts of each store
+    stores = [
+        (uid, amounts, _zipf(len(amounts)), staff[uid], _zipf(len(staff[uid])))
+        for uid, amounts in (
+            (uid, [int(amount) for amount in throwin_amounts.split(",")]) for uid, throwin_amounts in stores
+        )
+        if uid in staff
+    ]
+    consumers = list(
+        User.objects.filter(kind=UserKind.CONSUMER, email__endswith=DOMAIN).order_by("email").values_list("id", flat=True)
+    )
+    return {
+        "seed": seed,
+        "timeline": Timeline(end, days),
+        "stores": stores,
+        "store_weights": _zipf(len(stores), 0.8),
+        # A few regulars tip much more often than the others
+        "consumers": consumers,
+        "consumer_weights": _zipf(len(consumers), 0.7),
+    }
+
+
+def _payment(plan, index, anonymous_ratio, review_ratio):
+    rng = _rng(plan["seed"], "payment", index)
+    store_uid, amounts, amount_weights, members, staff_weights = rng.choices(
+        plan["stores"], cum_weights=plan["store_weights"]
+    )[0]
+    staff_uid = rng.choices(members, cum_weights=staff_weights)[0]
+    amount = rng.choices(amounts, cum_weights=amount_weights)[0]
+    status = rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0]
+    created_at = plan["timeline"].sample(rng)
+    customer_id = None
+    if plan["consumers"] and rng.random() >= anonymous_ratio:
+        customer_id = rng.choices(plan["consumers"], cum_weights=plan["consumer_weights"])[0]
+    message = rng.choice(MESSAGES) if status == "CAPTURE" and rng.random() < review_ratio else None
+    return GMOCreditPayment(
+        order_id=f"{ORDER_PREFIX}{plan['seed']}-{index:010d}",
+        customer_id=customer_id,
+        nickname=None if customer_id else f"ゲスト{rng.randrange(10000)}",
+        staff_uid=staff_uid,
+        store_uid=store_uid,
+        amount=amount,
+        status=status,
+        transaction_id=f"TRN{rng.getrandbits(48):012x}" if status == "CAPTURE" else None,
+        approval_code=f"{rng.randrange(1000000):06d}" if status == "CAPTURE" else None,
+        process_date=created_at,
+        card_last4=f"{rng.randrange(10000):04d}",
+        pay_method="1",
+        is_processed=status != "PENDING",
+        message=message,
+        created_at=created_at,
+        updated_at=created_at,
+        is_distributed=status == "CAPTURE",
+    )
+
+
+def write_payment_chunk(start, end, anonymous_ratio=0.3, review_ratio=0.1, use_copy=False):
+    """Write the payments `start` to `end` and their reviews. Returns the number of payments."""
+    plan = _plan
+    payments = [_payment(plan, index, anonymous_ratio, review_ratio) for index in range(start, end)]
+    with transaction.atomic():
+        _insert(GMOCreditPayment, payments, use_copy)
+        reviewed = [payment for payment in payments if payment.message]
+        if reviewed and use_copy and connection.vendor == "postgresql":
+            ids = dict(GMOCreditPayment.objects.filter(
+                order_id__in=[payment.order_id for payment in reviewed]
+            ).values_list("order_id", "id"))
+            for payment in reviewed:
+                payment.id = ids[payment.order_id]
+        _insert(Review, [
+            Review(
+                payment_id=payment.id,
+                payment_type="GMOCreditPayment",
+                transaction_id=payment.order_id,
+                consumer_id=payment.customer_id,
+                consumer_name=payment.nickname or "Consumer",
+                message=payment.message,
+                store_uid=payment.store_uid,
+                staff_uid=payment.staff_uid,
+                uid=uuid.uuid5(uuid.NAMESPACE_OID, payment.order_id),
+                created_at=payment.created_at,
+                updated_at=payment.created_at,
+            )
+            for payment in reviewed
+        ], use_copy)
+    return len(payments)
+
+
+def create_payments(plan, total, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, **options):
+    """Write `total` payments in chunks, over `workers` processes. Returns the number written."""
+    global _plan
+    _plan = plan
+    if partitions.is_partitioned():
+        for month in plan["timeline"].months():
+            partitions.create_partition(month)
+
+    chunks = [(start, end) for _, start, end in _chunks(total, chunk_size)]
+    if workers <= 1:
+        return sum(write_payment_chunk(*chunk, **options) for chunk in chunks)
+
+    # Forked workers must open their own connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork")) as pool:
+        futures = [pool.submit(write_payment_chunk, *chunk, **options) for chunk in chunks]
+        return sum(future.result() for future in futures)
+
+
+def create_spins(seed, end, days, play_ratio=0.6, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create the spin balances the synthetic payments earn and gacha plays for a
+    `play_ratio` of the spins. Returns the number of plays.
+    """
+    rng = _rng(seed, "spins")
+    timeline = Timeline(end, days)
+    per_spin = settings.GACHA_SPEND_PER_SPIN
+    stores = dict(
+        (uid, (store_id, restaurant_id))
+        for uid, store_id, restaurant_id in Store.objects.filter(code__startswith="syn").values_list(
+            "uid", "id", "restaurant_id"
+        )
+    )
+    spend = (
+        GMOCreditPayment.objects.filter(order_id__startswith=ORDER_PREFIX, status="CAPTURE", customer__isnull=False)
+        .values("customer_id", "store_uid")
+        .annotate(total=Sum("amount"))
+        .order_by("customer_id", "store_uid")
+    )
+    balances, plays, played = [], [], 0
+
+    def flush():
+        with transaction.atomic():
+            SpinBalance.objects.bulk_create(balances)
+            GachaHistory.objects.bulk_create(plays)
+        balances.clear()
+        plays.clear()
+
+    for row in spend.iterator(chunk_size=chunk_size):
+        store_id, restaurant_id = stores[row["store_uid"]]
+        total_spin = int(row["total"] // per_spin)
+        used_spin = sum(1 for _ in range(total_spin) if rng.random() < play_ratio)
+        balances.append(SpinBalance(
+            consumer_id=row["customer_id"],
+            store_id=store_id,
+            restaurant_id=restaurant_id,
+            total_spend=row["total"],
+            used_spend=used_spin * per_spin,
+            total_spin=total_spin,
+            used_spin=used_spin,
+            uid=_uuid(rng),
+        ))
+        for _ in range(used_spin):
+            played_at = timeline.sample(rng)
+            consumed = rng.random() < 0.5
+            plays.append(GachaHistory(
+                consumer_id=row["customer_id"],
+                store_id=store_id,
+                gacha_kind=rng.choices(GACHA_KINDS, weights=GACHA_WEIGHTS)[0],
+                is_consumed=consumed,
+                consumed_at=played_at + datetime.timedelta(days=rng.randrange(1, 30)) if consumed else None,
+                uid=_uuid(rng),
+                created_at=played_at,
+                updated_at=played_at,
+            ))
+        played += used_spin
+        if len(balances) + len(plays) >= chunk_size:
+            flush()
+    flush()
+    return played
+
+
+@contextmanager
+def keep_timestamps(models=(GMOCreditPayment, Review, GachaHistory)):
+    """Let rows of `models` keep their own `created_at`/`updated_at` inside the block."""
+    saved = []
+    for model in models:
+        for name in ("created_at", "updated_at"):
+            field = model._meta.get_field(name)
+            saved.append((field, field.auto_now, field.auto_now_add))
+            field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def generate(seed=0, end=None, days=365, restaurants=10, stores_per_restaurant=3, staff_per_store=5,
+             consumers=1000, agents=2, payments=100000, anonymous_ratio=0.3, review_ratio=0.1, play_ratio=0.6,
+             chunk_size=DEFAULT_CHUNK_SIZE, workers=1, use_copy=False, password=None, confirm_not_production=False):
+    """
+    Write a complete synthetic data set, the payments ending on `end`
+    (yesterday by default). Returns the number of payments and gacha plays.
+    """
+    ensure_not_production("Synthetic data", confirm_not_production)
+    end = end or datetime.date.today() - datetime.timedelta(days=1)
+    with keep_timestamps():
+        create_accounts(
+            seed, restaurants, stores_per_restaurant, staff_per_store, consumers, agents, chunk_size, password
+        )
+        plan = load_plan(seed, end, days)
+        written = create_payments(
+            plan, payments, chunk_size, workers,
+            anonymous_ratio=anonymous_ratio, review_ratio=review_ratio, use_copy=use_copy,
+        )
+        plays = create_spins(seed, end, days, play_ratio, chunk_size)
+    logger.info("Synthetic data written: %s payments, %s gacha plays", written, plays)
+    return {"payments": written, "gacha_plays": plays}
+
+
+def exists():
+    return User.objects.filter(email__endswith=DOMAIN).exists()
+
+
+def flush(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Remove every synthetic row. Returns the number of payments removed."""
+    Review.objects.filter(transaction_id__startswith=ORDER_PREFIX).delete()
+    payments = GMOCreditPayment.objects.filter(order_id__startswith=ORDER_PREFIX).order_by("id")
+    removed = 0
+    while ids := list(payments.values_list("id", flat=True)[:chunk_size]):
+        removed += GMOCreditPayment.objects.filter(id__in=ids).delete()[0]
+    # The same seed gives the same order ids again
+    GMOOrderId.objects.filter(order_id__startswith=ORDER_PREFIX).delete()
+    # Restaurants, stores, memberships, spins and plays go with their users
+    Restaurant.objects.filter(slug__startswith="synthetic-").delete()
+    User.objects.filter(email__endswith=DOMAIN).delete()
+    return removed
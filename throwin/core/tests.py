@@ -1,3 +1,219 @@
-from django.test import TestCase
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from accounts.choices import UserKind
+from core import synthetic
+from core.query_audit import QueryAudit
+from gacha.choices import GachaKind
+from gacha.models import GachaHistory, SpinBalance
+from payment_service.gmo_pg.models import GMOCreditPayment
+from review.models import Review
+from store.choices import GachaTicketEnabled
+from store.models import Restaurant, RestaurantUser, Store, StoreUser
+
+User = get_user_model()
+
+# Upper bound of queries per hot endpoint. Lower them when an endpoint gets
+# cheaper; never raise them without understanding where the queries came from.
+QUERY_BUDGETS = {
+    "stats_admin": 7,
+    "stats_owner": 12,
+    "history_admin": 3,
+    "history_owner": 5,
+    "history_staff": 3,
+    "staff_landing": 13,
+    "store_staff_list": 2,
+    "available_spins": 2,
+    "gacha_tickets": 1,
+    "owner_gacha_history": 2,
+    "owner_reviews": 3,
+}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class HotEndpointQueryPlanTests(TestCase):
+    """Query count and query plan regression suite for the hot endpoints."""
+
+    PAYMENTS = 600
+    REVIEWS = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(26)
+
+        def make_user(email, kind):
+            return User.objects.create(
+                email=email, name=email.split("@")[0], kind=kind,
+                is_verified=True, password="!",
+            )
+
+        cls.admin = make_user("admin@example.com", UserKind.SUPER_ADMIN)
+        cls.owner = make_user("owner@example.com", UserKind.RESTAURANT_OWNER)
+        cls.restaurant = Restaurant.objects.create(name="Hot Path", restaurant_owner=cls.owner)
+        cls.stores = [
+            Store.objects.create(
+                restaurant=cls.restaurant, name=f"Store {i}", code=f"hot{i}",
+                gacha_enabled=GachaTicketEnabled.YES,
+            )
+            for i in range(3)
+        ]
+        cls.staff = []
+        for i in range(6):
+            staff = make_user(f"staff{i}@example.com", UserKind.RESTAURANT_STAFF)
+            store = cls.stores[i % len(cls.stores)]
+            RestaurantUser.objects.create(restaurant=cls.restaurant, user=staff, role=UserKind.RESTAURANT_STAFF)
+            StoreUser.objects.create(store=store, user=staff, role=UserKind.RESTAURANT_STAFF)
+            cls.staff.append((staff, store))
+        cls.consumers = [make_user(f"consumer{i}@example.com", UserKind.CONSUMER) for i in range(5)]
+
+        now = timezone.now()
+        payments = []
+        for i in range(cls.PAYMENTS):
+            staff, store = rng.choice(cls.staff)
+            payments.append(GMOCreditPayment(
+                order_id=f"hot-{i}",
+                customer=rng.choice(cls.consumers),
+                staff_uid=staff.uid,
+                store_uid=store.uid,
+                amount=Decimal(rng.choice([1000, 3000, 5000])),
+                status=rng.choice(["CAPTURE", "CAPTURE", "CAPTURE", "FAILED"]),
+            ))
+        GMOCreditPayment.objects.bulk_create(payments)
+        # auto_now_add ignores explicit values, spread the rows over 90 days afterwards
+        for payment in payments:
+            payment.created_at = now - timedelta(days=rng.randrange(90))
+        GMOCreditPayment.objects.bulk_update(payments, ["created_at"])
+
+        Review.objects.bulk_create([
+            Review(
+                payment=payment, message="Thanks!", consumer=payment.customer,
+                store_uid=payment.store_uid, staff_uid=payment.staff_uid,
+            )
+            for payment in payments[:cls.REVIEWS]
+        ])
+        for consumer in cls.consumers:
+            for store in cls.stores:
+                SpinBalance.objects.create(
+                    consumer=consumer, store=store, restaurant=cls.restaurant, total_spend=Decimal("9000"),
+                )
+        GachaHistory.objects.bulk_create([
+            GachaHistory(
+                store=rng.choice(cls.stores), consumer=rng.choice(cls.consumers),
+                gacha_kind=rng.choice(GachaKind.values), is_consumed=rng.random() < 0.5,
+            )
+            for _ in range(100)
+        ])
+
+    def audit(self, name, url, user=None):
+        """Request ``url`` and assert its query budget and plans."""
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with QueryAudit() as audit:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, f"{name}: {response.content[:200]}")
+        self.assertLessEqual(
+            audit.count, QUERY_BUDGETS[name],
+            f"{name} ran {audit.count} queries ({audit.sql_time * 1000:.1f} ms of SQL):\n"
+            + "\n".join(audit.selects()),
+        )
+        scans = audit.full_scans()
+        self.assertFalse(
+            scans,
+            f"{name} scans large tables:\n" + "\n".join(f"{table}: {sql}" for table, sql in scans),
+        )
+        return response
+
+    def test_stats_admin(self):
+        self.audit("stats_admin", "/payment_service/analytics/stats/?year=2025", self.admin)
+
+    def test_stats_owner(self):
+        self.audit("stats_owner", "/payment_service/analytics/stats/", self.owner)
+
+    def test_history_admin(self):
+        self.audit("history_admin", "/payment_service/gmo-pg/credit-card/payment-history/", self.admin)
+
+    def test_history_owner(self):
+        store = self.stores[0]
+        self.audit(
+            "history_owner",
+            f"/payment_service/gmo-pg/credit-card/payment-history/?store_uid={store.uid}",
+            self.owner,
+        )
+
+    def test_history_staff(self):
+        staff, _ = self.staff[0]
+        self.audit("history_staff", "/payment_service/gmo-pg/credit-card/payment-history/", staff)
+
+    def test_staff_landing(self):
+        staff, store = self.staff[0]
+        self.audit(
+            "staff_landing", f"/auth/users/store/{store.code}/staff/{staff.username}", self.consumers[0],
+        )
+
+    def test_store_staff_list(self):
+        self.audit("store_staff_list", f"/stores/{self.stores[0].code}/staff/list", self.consumers[0])
+
+    def test_available_spins(self):
+        self.audit("available_spins", "/gacha/available-spins", self.consumers[0])
+
+    def test_gacha_tickets(self):
+        self.audit("gacha_tickets", "/gacha/tickets", self.consumers[0])
+
+    def test_owner_gacha_history(self):
+        self.audit("owner_gacha_history", "/restaurant-owner/gacha-history", self.owner)
+
+    def test_owner_reviews(self):
+        self.audit("owner_reviews", "/restaurant-owner/reviews", self.owner)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SyntheticDataTests(TestCase):
+
+    def generate(self, **options):
+        call_command(
+            "generate_synthetic_data", "--payments", "300", "--consumers", "20", "--restaurants", "2",
+            "--end", "2025-06-30", "--days", "30", "--i-know-this-is-not-production", *options.get("args", ()),
+            stdout=io.StringIO(),
+        )
+        return list(
+            GMOCreditPayment.objects.order_by("order_id").values_list(
+                "order_id", "amount", "status", "created_at", "staff_uid", "store_uid", "customer__email"
+            )
+        )
+
+    def test_same_seed_gives_the_same_data_whatever_the_chunk_size(self):
+        first = self.generate()
+
+        self.assertEqual(len(first), 300)
+        self.assertEqual(Store.objects.filter(code__startswith="syn").count(), 6)
+        self.assertEqual(User.objects.filter(kind=UserKind.RESTAURANT_STAFF).count(), 30)
+        self.assertTrue(Review.objects.exists())
+        self.assertEqual(
+            SpinBalance.objects.filter(consumer__email__endswith=synthetic.DOMAIN).count(),
+            GMOCreditPayment.objects.filter(status="CAPTURE", customer__isnull=False)
+            .values("customer_id", "store_uid").distinct().count(),
+        )
+        with self.assertRaises(CommandError):
+            self.generate()
+
+        self.assertEqual(self.generate(args=["--flush", "--chunk-size", "70"]), first)
+
+    def test_refuses_to_run_without_debug_and_has_no_usable_password(self):
+        with self.assertRaises(CommandError):
+            call_command("generate_synthetic_data", "--payments", "10", stdout=io.StringIO())
+        self.assertFalse(synthetic.exists())
+
+        self.generate()
+        user = User.objects.filter(email__endswith=synthetic.DOMAIN).first()
+        self.assertFalse(user.has_usable_password())
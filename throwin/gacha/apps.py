@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GachaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gacha'
+
+    def ready(self):
+        from gacha import signals  # noqa: F401
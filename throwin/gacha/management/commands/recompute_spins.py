@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gacha.spins import RECOMPUTE_BATCH_SIZE, recompute_spins
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the total spins of every spin balance from its spend, after "
+        "GACHA_SPEND_PER_SPIN changed. Spins already played are never taken back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=RECOMPUTE_BATCH_SIZE, help="Rows updated per transaction.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        updated = recompute_spins(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} spin balances recomputed at {settings.GACHA_SPEND_PER_SPIN} JPY per spin."
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_balances(apps, schema_editor):
+    """Fold the rows of a consumer and store created by concurrent tips into the oldest one."""
+    SpinBalance = apps.get_model("gacha", "SpinBalance")
+    per_spin = getattr(settings, "GACHA_SPEND_PER_SPIN", 3000)
+    duplicated = (
+        SpinBalance.objects.values("consumer_id", "store_id")
+        .order_by()
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+    for key in duplicated:
+        kept, *others = SpinBalance.objects.filter(
+            consumer_id=key["consumer_id"], store_id=key["store_id"]
+        ).order_by("created_at", "id")
+        for other in others:
+            kept.total_spend += other.total_spend
+            kept.used_spend += other.used_spend
+            kept.used_spin += other.used_spin
+        kept.total_spin = max(int(kept.total_spend // per_spin), kept.used_spin)
+        kept.save(update_fields=["total_spend", "used_spend", "used_spin", "total_spin"])
+        SpinBalance.objects.filter(pk__in=[other.pk for other in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gacha', '0002_alter_gachahistory_options_alter_spinbalance_options'),
+        ('store', '0007_alter_restaurant_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='spinbalance',
+            constraint=models.UniqueConstraint(fields=('consumer', 'store'), name='unique_spin_balance_per_consumer_store'),
+        ),
+    ]
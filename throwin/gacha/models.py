@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.db.models import F
 
@@ -70,7 +71,7 @@ class SpinBalance(BaseModel):
     )
 
     def save(self, *args, **kwargs):
-        self.total_spin = int(self.total_spend // 3000)
+        self.total_spin = int(self.total_spend // settings.GACHA_SPEND_PER_SPIN)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -78,6 +79,10 @@ class SpinBalance(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            # Payments credit one row per consumer and store, see gacha.spins.credit_spend
+            models.UniqueConstraint(fields=["consumer", "store"], name="unique_spin_balance_per_consumer_store"),
+        ]
 
 
 class GachaHistory(BaseModel):
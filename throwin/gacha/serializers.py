@@ -3,13 +3,10 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from common.choices import Status
-
 from gacha.models import SpinBalance, GachaHistory
 from gacha.utils import Gacha
 
-from store.choices import GachaTicketEnabled
-from store.models import Store
+from store.config import get_store_config
 
 User = get_user_model()
 
@@ -26,15 +23,10 @@ class PlayGachaSerializer(serializers.Serializer):
         """
         Validate that the store_uid corresponds to an active store with gacha enabled.
         """
-        try:
-            store = Store.objects.get(
-                uid=value,
-                status=Status.ACTIVE,
-                gacha_enabled=GachaTicketEnabled.YES
-            )
-        except Store.DoesNotExist as e:
-            raise ValidationError("Invalid store_uid.") from e
-        return store
+        config = get_store_config(value)
+        if config is None or not config.is_active or not config.gacha_enabled:
+            raise ValidationError("Invalid store_uid.")
+        return config
 
     def validate(self, attrs):
         """
@@ -69,7 +61,7 @@ class PlayGachaSerializer(serializers.Serializer):
         # Create a GachaHistory record
         GachaHistory.objects.create(
             consumer=user,
-            store=spin_balance.store,
+            store_id=spin_balance.store_id,
             gacha_kind=result
         )
 
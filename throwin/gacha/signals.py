@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.conditional import bump_version
+
+
+@receiver([post_save, post_delete], sender="gacha.SpinBalance")
+def bump_spins_version(sender, instance, **kwargs):
+    bump_version(f"spins:{instance.consumer_id}")
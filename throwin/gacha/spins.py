@@ -0,0 +1,97 @@
+"""
+Spin credits of captured payments.
+
+Every throwin amount spent at a store adds to the consumer's `SpinBalance`
+of that store, one spin per `GACHA_SPEND_PER_SPIN` JPY. `credit_spend` does
+it in a single `INSERT ... ON CONFLICT DO UPDATE`, so concurrent tips of the
+same consumer neither lose an amount nor create a second row.
+
+`recompute_spins` sets `total_spin` again from `total_spend` for every row,
+after `GACHA_SPEND_PER_SPIN` changed.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Floor, Greatest
+from django.utils import timezone
+
+from common.choices import Status
+from common.conditional import bump_version
+from gacha.models import SpinBalance
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_BATCH_SIZE = 2000
+
+
+def _spins_sql(spend):
+    per_spin = int(settings.GACHA_SPEND_PER_SPIN)
+    if connection.vendor == "postgresql":
+        return f"FLOOR(({spend}) / {per_spin})::integer"
+    # SQLite truncates towards zero, spends are never negative
+    return f"CAST(({spend}) / {per_spin} AS INTEGER)"
+
+
+def credit_spend(consumer_id, store, amount):
+    """Add `amount` to the spend of the consumer at `store` and update their spins."""
+    meta = SpinBalance._meta
+    table = connection.ops.quote_name(meta.db_table)
+    now = timezone.now()
+    values = [
+        meta.get_field("uid").get_db_prep_save(uuid.uuid4(), connection),
+        Status.ACTIVE,
+        meta.get_field("created_at").get_db_prep_save(now, connection),
+        meta.get_field("updated_at").get_db_prep_save(now, connection),
+        consumer_id,
+        store.id,
+        store.restaurant_id,
+        meta.get_field("total_spend").get_db_prep_save(amount, connection),
+        int(amount // settings.GACHA_SPEND_PER_SPIN),
+    ]
+    sql = f"""
+        INSERT INTO {table} (
+            uid, status, created_at, updated_at, consumer_id, store_id, restaurant_id,
+            total_spend, total_spin, used_spend, used_spin
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 0, 0)
+        ON CONFLICT (consumer_id, store_id) DO UPDATE SET
+            total_spend = {table}.total_spend + EXCLUDED.total_spend,
+            total_spin = {_spins_sql(f"{table}.total_spend + EXCLUDED.total_spend")},
+            updated_at = EXCLUDED.updated_at
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, values)
+    # No signal is sent for this write
+    bump_version(f"spins:{consumer_id}")
+
+
+def recompute_spins(batch_size=RECOMPUTE_BATCH_SIZE):
+    """
+    Recompute `total_spin` of every spin balance from its spend, in primary key
+    batches. Spins already played are kept. Returns the number of rows updated.
+    """
+    per_spin = settings.GACHA_SPEND_PER_SPIN
+    updated = 0
+    last_pk = 0
+    rows = SpinBalance.objects.order_by("pk")
+    while True:
+        pks = list(rows.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            changed = SpinBalance.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            consumers = set(changed.values_list("consumer_id", flat=True))
+            updated += changed.update(
+                total_spin=Greatest(Floor(F("total_spend") / Value(per_spin)), F("used_spin")),
+                updated_at=timezone.now(),
+            )
+        bump_version(*(f"spins:{consumer_id}" for consumer_id in consumers))
+        last_pk = pks[-1]
+        if len(pks) < batch_size:
+            break
+    logger.info("Recomputed the spins of %s balances at %s JPY per spin", updated, per_spin)
+    return updated
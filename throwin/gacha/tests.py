@@ -1,3 +1,46 @@
-from django.test import TestCase
+import io
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from accounts.choices import UserKind
+from accounts.models import User
+from gacha.models import SpinBalance
+from gacha.spins import credit_spend
+from store.models import Restaurant, Store
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SpinCreditTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(email="owner@example.com", kind=UserKind.RESTAURANT_OWNER)
+        cls.consumer = User.objects.create(email="consumer@example.com", kind=UserKind.CONSUMER)
+        cls.restaurant = Restaurant.objects.create(name="Spins", restaurant_owner=owner)
+        cls.store = Store.objects.create(restaurant=cls.restaurant, name="Spins Store", code="spin1")
+
+    def test_credits_are_upserted_into_one_row(self):
+        credit_spend(self.consumer.id, self.store, Decimal("2000"))
+        credit_spend(self.consumer.id, self.store, Decimal("5000"))
+
+        balance = SpinBalance.objects.get(consumer=self.consumer, store=self.store)
+        self.assertEqual(balance.total_spend, Decimal("7000"))
+        self.assertEqual(balance.total_spin, 2)
+        self.assertEqual(balance.remaining_spin, 2)
+        self.assertEqual(balance.restaurant_id, self.restaurant.id)
+
+    def test_recompute_follows_the_spend_per_spin_and_keeps_played_spins(self):
+        credit_spend(self.consumer.id, self.store, Decimal("7000"))
+        SpinBalance.objects.update(used_spin=2)
+
+        with override_settings(GACHA_SPEND_PER_SPIN=5000):
+            call_command("recompute_spins", "--batch-size", "1", stdout=io.StringIO())
+        self.assertEqual(SpinBalance.objects.get().total_spin, 2)
+
+        with override_settings(GACHA_SPEND_PER_SPIN=1000):
+            call_command("recompute_spins", stdout=io.StringIO())
+        self.assertEqual(SpinBalance.objects.get().remaining_spin, 5)
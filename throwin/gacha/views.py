@@ -3,6 +3,7 @@ from rest_framework.response import Response
 
 from drf_spectacular.utils import extend_schema
 
+from common.conditional import ConditionalGetMixin, version_token
 from common.permissions import (
     IsConsumerUser,
 )
@@ -19,13 +20,20 @@ from gacha.serializers import (
 @extend_schema(
     summary="1. Check available spins per store for the authenticated user.",
 )
-class AvailableSpinsView(generics.ListAPIView):
+class AvailableSpinsView(ConditionalGetMixin, generics.ListAPIView):
     """
     API to get available spins per store for the authenticated user.
     """
     permission_classes = [IsConsumerUser]
     serializer_class = AvailableSpinsSerializer
 
+    def get_version(self):
+        # Bumped by the consumer's spin balances and by any store change (names)
+        spins, stores = version_token(f"spins:{self.request.user.pk}"), version_token("stores")
+        if spins is None or stores is None:
+            return None
+        return spins, stores
+
     def get_queryset(self):
         try:
             return SpinBalance.objects.filter(
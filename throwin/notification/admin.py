@@ -1,16 +1,20 @@
-# from django.contrib import admin
-# from notification.models import Notification
-#
-#
-# # Register your models here.
-# class NotificationAdmin(admin.ModelAdmin):
-#     list_display = (
-#         "uid",
-#         "id",
-#         "title",
-#         "body",
-#         "created_at",
-#     )
-#
-#
-# admin.site.register(Notification, NotificationAdmin)
+from django.contrib import admin
+from notification.models import Notification
+
+
+# Register your models here.
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "uid",
+        "id",
+        "title",
+        "restaurant",
+        "kind",
+        "status",
+        "created_at",
+    )
+    list_filter = ("kind", "status")
+    raw_id_fields = ("restaurant", "created_by", "updated_by")
+
+
+admin.site.register(Notification, NotificationAdmin)
@@ -0,0 +1,261 @@
+"""
+Notification inboxes, resolved when they are read.
+
+A notification is one row with an audience: a restaurant (or none for a
+global notification) and a user kind (or none for every kind). A user's inbox
+is the active notifications of the audiences they belong to, so a broadcast
+to every consumer is a single insert, whatever the number of consumers.
+
+Read state is kept per user: `NotificationWatermark.last_read_id` marks every
+notification up to it as read ("mark all as read"), `NotificationRead` rows
+the ones read one by one above it. Marking all as read drops the rows below
+the new watermark.
+
+Unread counts are served from a Redis hash per user:
+
+    notifications:unread:{user_id}   count, upto (the last notification id
+                                     counted) and generation
+
+`notifications:head` holds the last notification id. While the head is not
+past `upto` the cached count is returned as is; when it is, only the
+notifications after `upto` are counted and added. Editing or deleting a
+notification bumps `notifications:generation`, which invalidates every cached
+count, and membership changes drop the count of the user. Without Redis the
+count is read from the database.
+
+Ids are taken at insert but notifications may commit out of order, so a count
+cached up to an id can miss a lower id that commits afterwards. Such a late
+notification does not move the head, it bumps the generation instead, and the
+counts are taken again.
+
+A count is only cached if the hash did not change while it was taken. Reads
+the cached count does not include, and dropped counts, leave a short-lived
+marker in the hash, so a count taken before they committed is not cached.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, Max, OuterRef, Q, Value, When
+
+from accounts.choices import UserKind
+from common.cache import get_redis_client
+from common.choices import Status
+from notification.models import Notification, NotificationRead, NotificationWatermark
+
+logger = logging.getLogger(__name__)
+
+HEAD_KEY = "notifications:head"
+GENERATION_KEY = "notifications:generation"
+UNREAD_KEY = "notifications:unread:{user_id}"
+UNREAD_TTL = 24 * 3600
+# Longer than taking a count, from reading the hash to caching the count
+MARKER_TTL = 60
+
+# Move the head forward only. A notification committed after a later one (or
+# with the head lost) may be missing from cached counts, invalidate them all
+_ADVANCE_HEAD = """
+local head = redis.call('get', KEYS[1])
+if head and tonumber(ARGV[1]) > tonumber(head) then
+    redis.call('set', KEYS[1], ARGV[1])
+else
+    redis.call('incr', KEYS[2])
+end
+"""
+
+# One less unread notification, if the cached count includes it. Otherwise a
+# count being taken may include it, mark the hash so that count is not cached
+_DECREMENT_UNREAD = """
+local upto = tonumber(redis.call('hget', KEYS[1], 'upto') or '-1')
+local count = tonumber(redis.call('hget', KEYS[1], 'count') or '0')
+if upto >= tonumber(ARGV[1]) then
+    if count > 0 then redis.call('hincrby', KEYS[1], 'count', -1) end
+else
+    redis.call('hset', KEYS[1], 'read', ARGV[1])
+    if upto < 0 then redis.call('expire', KEYS[1], ARGV[2]) end
+end
+"""
+
+
+def unread_key(user_id):
+    return UNREAD_KEY.format(user_id=user_id)
+
+
+def _int(value, default=0):
+    return default if value is None else int(value)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def user_restaurant_ids(user):
+    from store.models import Restaurant, RestaurantUser
+
+    if not user.is_authenticated:
+        return set()
+    return {
+        *RestaurantUser.objects.filter(user_id=user.id).values_list("restaurant_id", flat=True),
+        *Restaurant.objects.filter(restaurant_owner_id=user.id).values_list("id", flat=True),
+    }
+
+
+def visible_notifications(user):
+    """The active notifications of the audiences of `user`, guests get the consumer ones."""
+    kind = user.kind if user.is_authenticated else UserKind.CONSUMER
+    scope = Q(restaurant__isnull=True)
+    restaurant_ids = user_restaurant_ids(user)
+    if restaurant_ids:
+        scope |= Q(restaurant_id__in=restaurant_ids)
+    return Notification.objects.filter(scope, Q(kind="") | Q(kind=kind), status=Status.ACTIVE)
+
+
+def watermark(user):
+    return NotificationWatermark.objects.filter(user_id=user.id).values_list("last_read_id", flat=True).first() or 0
+
+
+def with_read_state(queryset, user):
+    """Annotate `is_read` on notifications for `user`."""
+    if not user.is_authenticated:
+        return queryset.annotate(is_read=Value(False))
+    read = NotificationRead.objects.filter(user_id=user.id, notification_id=OuterRef("pk"))
+    return queryset.annotate(
+        is_read=Case(
+            When(Q(id__lte=watermark(user)) | Exists(read), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    )
+
+
+def unread_notifications(user):
+    read = NotificationRead.objects.filter(user_id=user.id, notification_id=OuterRef("pk"))
+    return visible_notifications(user).filter(id__gt=watermark(user)).exclude(Exists(read))
+
+
+def last_notification_id():
+    return Notification.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def unread_count(user):
+    """Number of unread notifications of `user`."""
+    client = get_redis_client()
+    if client is None:
+        return unread_notifications(user).count()
+    key = unread_key(user.id)
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            pipe.get(HEAD_KEY)
+            pipe.get(GENERATION_KEY)
+            pipe.hgetall(key)
+            head, generation, cached = pipe.execute()
+    except Exception as exc:
+        logger.warning("Unread count of user %s unavailable, using the database: %s", user.id, exc)
+        return unread_notifications(user).count()
+
+    generation = _int(generation)
+    cached = {_text(field): int(value) for field, value in cached.items()}
+    if head is None:
+        head = last_notification_id()
+        try:
+            client.set(HEAD_KEY, head, nx=True)
+        except Exception as exc:
+            logger.warning("Could not set the notification head: %s", exc)
+    head = int(head)
+
+    if cached.get("generation") == generation:
+        if head <= cached["upto"]:
+            return cached["count"]
+        # Only the notifications published since the count was cached
+        count = cached["count"] + unread_notifications(user).filter(
+            id__gt=cached["upto"], id__lte=head
+        ).count()
+    else:
+        count = unread_notifications(user).filter(id__lte=head).count()
+
+    try:
+        with client.pipeline() as pipe:
+            # A read or another count since the hash was read wins
+            pipe.watch(key)
+            if {_text(field): int(value) for field, value in pipe.hgetall(key).items()} != cached:
+                return count
+            pipe.multi()
+            pipe.delete(key)  # Along with the markers
+            pipe.hset(key, mapping={"count": count, "upto": head, "generation": generation})
+            pipe.expire(key, UNREAD_TTL)
+            pipe.execute()
+    except Exception as exc:
+        logger.info("Unread count of user %s not cached: %s", user.id, exc)
+    return count
+
+
+def mark_read(user, notification):
+    """Mark one notification as read by `user`."""
+    if notification.id <= watermark(user):
+        return
+    _, created = NotificationRead.objects.get_or_create(user_id=user.id, notification=notification)
+    if created:
+        user_id, notification_id = user.id, notification.id
+        transaction.on_commit(lambda: _decrement_unread(user_id, notification_id))
+
+
+def mark_all_read(user):
+    """Mark every notification published so far as read by `user`."""
+    last_id = last_notification_id()
+    with transaction.atomic():
+        NotificationWatermark.objects.update_or_create(user_id=user.id, defaults={"last_read_id": last_id})
+        NotificationRead.objects.filter(user_id=user.id, notification_id__lte=last_id).delete()
+    user_id = user.id
+    transaction.on_commit(lambda: drop_unread_count(user_id))
+    return last_id
+
+
+def _decrement_unread(user_id, notification_id):
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.eval(_DECREMENT_UNREAD, 1, unread_key(user_id), notification_id, MARKER_TTL)
+    except Exception as exc:
+        logger.warning("Could not update the unread count of user %s: %s", user_id, exc)
+        drop_unread_count(user_id)
+
+
+def drop_unread_count(*user_ids):
+    """Drop cached counts, the next read counts again."""
+    client = get_redis_client()
+    if client is None or not user_ids:
+        return
+    try:
+        with client.pipeline() as pipe:
+            for user_id in user_ids:
+                key = unread_key(user_id)
+                # A marker rather than nothing, a count being taken is not cached
+                pipe.delete(key)
+                pipe.hset(key, "dropped", 1)
+                pipe.expire(key, MARKER_TTL)
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not drop the unread counts of users %s: %s", user_ids, exc)
+
+
+def notification_published(notification_id):
+    """Let the cached counts see a new notification."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.eval(_ADVANCE_HEAD, 2, HEAD_KEY, GENERATION_KEY, notification_id)
+    except Exception as exc:
+        logger.warning("Could not advance the notification head to %s: %s", notification_id, exc)
+
+
+def notifications_changed():
+    """Invalidate every cached count, after a notification was edited or deleted."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.incr(GENERATION_KEY)
+    except Exception as exc:
+        logger.warning("Could not invalidate the unread counts: %s", exc)
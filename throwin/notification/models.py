@@ -1,50 +1,81 @@
-# from django.db import models
-# from django.db.models import JSONField
-# from django.shortcuts import get_object_or_404
-#
-# from common.models import BaseModel
-#
-#
-# # Create your models here.
-# class Notification(BaseModel):
-#     restaurant = models.ForeignKey(
-#         "store.Restaurant",
-#         on_delete=models.CASCADE,
-#         related_name="notifications",
-#         blank=True,
-#         null=True
-#     )
-#     title = models.CharField(max_length=255)
-#     body = models.TextField()
-#     read_by = JSONField(
-#         default=dict,
-#         blank=True,
-#         null=True,
-#         help_text="Tracks read status by user ID or session ID"
-#     )
-#
-#     def __str__(self):
-#         return self.title
-#
-#     class Meta:
-#         ordering = ['-created_at']
-#
-#     def mark_as_read(self, user_key):
-#         """
-#             Marks the notification as read for a given user or session.
-#         """
-#         self.read_by[user_key] = True
-#         self.save()
-#
-#     def is_read(self, user_key):
-#         """
-#             Checks if the notification has been read by a given user or session.
-#         """
-#         return self.read_by.get(user_key, False)
-#
-#     @classmethod
-#     def get_notification(cls, notification_uid):
-#         """
-#         Fetches a notification object by UID or raises a 404 error.
-#         """
-#         return get_object_or_404(cls, uid=notification_uid)
+from django.db import models
+from django.shortcuts import get_object_or_404
+
+from accounts.choices import UserKind
+from common.models import BaseModel
+
+
+# Create your models here.
+class Notification(BaseModel):
+    """
+    A notification shown to every user of its audience.
+
+    Notifications are never copied per recipient: a broadcast is one row and
+    the users it reaches are resolved when they read their notifications (see
+    notification.inbox).
+    """
+    restaurant = models.ForeignKey(
+        "store.Restaurant",
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        blank=True,
+        null=True,
+        help_text="Restaurant whose users receive the notification, empty for a global notification",
+    )
+    kind = models.CharField(
+        max_length=50,
+        choices=UserKind.choices,
+        blank=True,
+        default="",
+        help_text="Only users of this kind receive the notification, empty for every kind",
+    )
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        # Ids grow with time, read watermarks compare them
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["restaurant", "kind", "id"], name="notification_audience_id"),
+        ]
+
+    @classmethod
+    def get_notification(cls, notification_uid):
+        """
+        Fetches a notification object by UID or raises a 404 error.
+        """
+        return get_object_or_404(cls, uid=notification_uid)
+
+
+class NotificationRead(models.Model):
+    """A notification read by a user, above the user's read watermark."""
+    user = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.CASCADE,
+        related_name="notification_reads",
+    )
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name="reads",
+    )
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "notification"], name="unique_notification_read"),
+        ]
+
+
+class NotificationWatermark(models.Model):
+    """Every notification up to `last_read_id` counts as read by the user."""
+    user = models.OneToOneField(
+        "accounts.User",
+        on_delete=models.CASCADE,
+        related_name="notification_watermark",
+    )
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -1,46 +1,59 @@
-# """Serializer for notification"""
-# from rest_framework import serializers
-#
-# from common.serializers import BaseSerializer
-#
-# from notification.models import Notification
-#
-#
-# class NotificationListSerializer(BaseSerializer):
-#     is_read = serializers.BooleanField(read_only=True)
-#
-#     class Meta(BaseSerializer.Meta):
-#         model = Notification
-#         fields = ["uid", "title", "is_read", "created_at"]
-#
-#
-# class NotificationDetailSerializer(BaseSerializer):
-#
-#     class Meta(BaseSerializer.Meta):
-#         model = Notification
-#         fields = ["uid", "title", "body"]
-#
-#
-# class NotificationDetailAdminSerializer(NotificationDetailSerializer):
-#     created_by = serializers.CharField(read_only=True)
-#     updated_by = serializers.CharField(read_only=True)
-#
-#     class Meta(NotificationDetailSerializer.Meta):
-#         fields = NotificationDetailSerializer.Meta.fields + ["created_by", "updated_by"]
-#
-#     def create(self, validated_data):
-#         instance = super().create(validated_data=validated_data)
-#         print("I am here")
-#         instance.created_by = self.context["request"].user
-#         print("Instance created by", instance.created_by)
-#         instance.save(update_fields=["created_by"])
-#         print("Instance created by", instance.created_by)
-#
-#         return instance
-#
-#     def update(self, instance, validated_data):
-#         instance = super().update(instance, validated_data=validated_data)
-#         instance.updated_by = self.context["request"].user
-#         instance.save(update_fields=["updated_by"])
-#
-#         return instance
+"""Serializer for notification"""
+from rest_framework import serializers
+
+from accounts.choices import UserKind
+from common.serializers import BaseSerializer
+
+from notification.models import Notification
+from store.models import Restaurant
+
+
+class NotificationListSerializer(BaseSerializer):
+    is_read = serializers.BooleanField(read_only=True)
+
+    class Meta(BaseSerializer.Meta):
+        model = Notification
+        fields = ["uid", "title", "is_read", "created_at"]
+
+
+class NotificationDetailSerializer(BaseSerializer):
+
+    class Meta(BaseSerializer.Meta):
+        model = Notification
+        fields = ["uid", "title", "body", "created_at"]
+
+
+class NotificationDetailAdminSerializer(NotificationDetailSerializer):
+    restaurant_uid = serializers.SlugRelatedField(
+        source="restaurant",
+        slug_field="uid",
+        queryset=Restaurant.objects.all(),
+        required=False,
+        allow_null=True,
+        help_text="Restaurant whose users receive the notification, empty for a global notification",
+    )
+    created_by = serializers.CharField(read_only=True)
+    updated_by = serializers.CharField(read_only=True)
+
+    class Meta(NotificationDetailSerializer.Meta):
+        fields = NotificationDetailSerializer.Meta.fields + [
+            "restaurant_uid", "kind", "status", "created_by", "updated_by",
+        ]
+
+    def validate(self, attrs):
+        user = self.context["request"].user
+        if user.kind == UserKind.RESTAURANT_OWNER:
+            # Owners only notify the users of their restaurant
+            restaurant = user.get_restaurant_owner_restaurant
+            if restaurant is None:
+                raise serializers.ValidationError("You have no restaurant to notify.")
+            attrs["restaurant"] = restaurant
+        return attrs
+
+    def create(self, validated_data):
+        validated_data["created_by"] = self.context["request"].user
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data["updated_by"] = self.context["request"].user
+        return super().update(instance, validated_data)
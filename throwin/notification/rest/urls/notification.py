@@ -1,18 +1,30 @@
-# from django.urls import path
-#
-# from notification.rest.views.notifications import (
-#     NotificationList,
-#     NotificationDetail
-# )
-#
-# urlpatterns = [
-#     path(
-#         "",
-#         NotificationList.as_view(),
-#         name="notification-list"
-#     ),
-#     path(
-#         "/<str:uid>",
-#         NotificationDetail.as_view(),
-#         name="notification-detail")
-# ]
+from django.urls import path
+
+from notification.rest.views.notifications import (
+    NotificationList,
+    NotificationDetail,
+    NotificationReadAll,
+    NotificationUnreadCount,
+)
+
+urlpatterns = [
+    path(
+        "",
+        NotificationList.as_view(),
+        name="notification-list"
+    ),
+    path(
+        "/unread-count",
+        NotificationUnreadCount.as_view(),
+        name="notification-unread-count"
+    ),
+    path(
+        "/read-all",
+        NotificationReadAll.as_view(),
+        name="notification-read-all"
+    ),
+    path(
+        "/<uuid:uid>",
+        NotificationDetail.as_view(),
+        name="notification-detail")
+]
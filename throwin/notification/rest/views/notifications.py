@@ -1,103 +1,97 @@
-# """Views for notifications."""
-# from rest_framework import generics, status
-# from rest_framework.generics import get_object_or_404
-# from rest_framework.response import Response
-# from rest_framework.permissions import IsAuthenticated
-#
-# from notification.models import Notification
-# from notification.rest.serializers.notifications import (
-#     NotificationListSerializer,
-#     NotificationDetailSerializer,
-#     NotificationDetailAdminSerializer,
-# )
-# from common.permissions import (
-#     IsAdminUser,
-#     IsSuperAdminUser,
-#     IsConsumerUser,
-#     CheckAnyPermission,
-#     IsConsumerOrGuestUser
-# )
-# from common.choices import Status
-#
-# from django.db.models import Q, Case, When, Value, BooleanField
-#
-#
-# class NotificationList(generics.ListCreateAPIView):
-#     """List all notifications."""
-#
-#     def get_permissions(self):
-#         # Set different permission classes based on the HTTP method
-#         if self.request.method == 'GET':
-#             self.available_permission_classes = (
-#                 IsAdminUser,
-#                 IsSuperAdminUser,
-#                 IsConsumerUser,
-#                 IsConsumerOrGuestUser,
-#             )
-#         else:
-#             self.available_permission_classes = (
-#                 IsAdminUser,
-#                 IsSuperAdminUser,
-#             )
-#         self.permission_classes = (CheckAnyPermission,)
-#         return super().get_permissions()
-#
-#     def get_serializer_class(self):
-#         # Set different serializer classes based on the HTTP method
-#         if self.request.method == 'POST':
-#             return NotificationDetailAdminSerializer
-#         else:
-#             return NotificationListSerializer
-#
-#     def get_queryset(self):
-#         # Get all active notifications and annotate is_read
-#         if self.request.user.is_authenticated:
-#             user_id_str = str(self.request.user.id)  # Cast user ID to string
-#             return Notification.objects.filter(status=Status.ACTIVE).annotate(
-#                 is_read=Case(
-#                     When(Q(read_by__has_key=user_id_str), then=Value(True)),
-#                     default=Value(False),
-#                     output_field=BooleanField(),
-#                 )
-#             )
-#         else:
-#             # If user is not authenticated, return all active notifications with is_read set to False
-#             return Notification().get_all_actives().annotate(
-#                 is_read=Value(False)
-#             )
-#
-#
-# class NotificationDetail(generics.RetrieveUpdateDestroyAPIView):
-#     """Retrieve, update or delete a notification."""
-#
-#     def get_permissions(self):
-#         # Set different permission classes based on the HTTP method
-#         if self.request.method == 'GET':
-#             self.available_permission_classes = (
-#                 IsAdminUser,
-#                 IsSuperAdminUser,
-#                 IsConsumerUser,
-#                 IsConsumerOrGuestUser,
-#             )
-#         else:
-#             self.available_permission_classes = (
-#                 IsAdminUser,
-#                 IsSuperAdminUser,
-#             )
-#         self.permission_classes = (CheckAnyPermission,)
-#         return super().get_permissions()
-#
-#     def get_serializer_class(self):
-#         # Set different serializer classes based on the HTTP method
-#         if self.request.method == 'GET':
-#             return NotificationDetailSerializer
-#         else:
-#             return NotificationDetailAdminSerializer
-#
-#     def get_object(self, *args, **kwargs):
-#         # Retrieve the notification by UID
-#         uid = self.kwargs.get('uid')
-#         return get_object_or_404(
-#             Notification,
-#             uid=uid
-#         )
+"""Views for notifications."""
+from drf_spectacular.utils import extend_schema, inline_serializer
+from rest_framework import generics, serializers, status
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.choices import UserKind
+from common.permissions import (
+    CheckAnyPermission,
+    IsFCAdminUser,
+    IsGlowAdminUser,
+    IsRestaurantOwnerUser,
+    IsSuperAdminUser,
+)
+from notification import inbox
+from notification.models import Notification
+from notification.rest.serializers.notifications import (
+    NotificationListSerializer,
+    NotificationDetailSerializer,
+    NotificationDetailAdminSerializer,
+)
+
+ADMIN_KINDS = (UserKind.SUPER_ADMIN, UserKind.FC_ADMIN, UserKind.GLOW_ADMIN)
+
+
+class NotificationPermissionMixin:
+    """Everybody reads their notifications, admins and restaurant owners write them."""
+
+    def get_permissions(self):
+        if self.request.method == "GET":
+            return [AllowAny()]
+        self.available_permission_classes = (
+            IsSuperAdminUser,
+            IsFCAdminUser,
+            IsGlowAdminUser,
+            IsRestaurantOwnerUser,
+        )
+        return [CheckAnyPermission()]
+
+    def get_serializer_class(self):
+        if self.request.method == "GET":
+            return self.read_serializer_class
+        return NotificationDetailAdminSerializer
+
+
+class NotificationList(NotificationPermissionMixin, generics.ListCreateAPIView):
+    """List the notifications of the user, newest first, or publish one."""
+    read_serializer_class = NotificationListSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        return inbox.with_read_state(inbox.visible_notifications(user), user)
+
+
+class NotificationDetail(NotificationPermissionMixin, generics.RetrieveUpdateDestroyAPIView):
+    """Read a notification, which marks it as read, or change it."""
+    read_serializer_class = NotificationDetailSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        if self.request.method == "GET":
+            return inbox.visible_notifications(user)
+        if user.kind in ADMIN_KINDS:
+            return Notification.objects.all()
+        return Notification.objects.filter(restaurant__restaurant_owner=user)
+
+    def get_object(self):
+        return get_object_or_404(self.get_queryset(), uid=self.kwargs["uid"])
+
+    def retrieve(self, request, *args, **kwargs):
+        notification = self.get_object()
+        if request.user.is_authenticated:
+            inbox.mark_read(request.user, notification)
+        return Response(self.get_serializer(notification).data)
+
+
+@extend_schema(
+    responses=inline_serializer("NotificationUnreadCount", {"unread": serializers.IntegerField()}),
+)
+class NotificationUnreadCount(APIView):
+    """Number of unread notifications of the user."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": inbox.unread_count(request.user)}, status=status.HTTP_200_OK)
+
+
+@extend_schema(request=None, responses={204: None})
+class NotificationReadAll(APIView):
+    """Mark every notification of the user as read."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        inbox.mark_all_read(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
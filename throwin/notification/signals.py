@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender="notification.Notification")
+def publish_notification(sender, instance, created, **kwargs):
+    from notification.inbox import notification_published, notifications_changed
+
+    notification_id = instance.id
+    if created:
+        transaction.on_commit(lambda: notification_published(notification_id))
+    else:
+        transaction.on_commit(notifications_changed)
+
+
+@receiver(post_delete, sender="notification.Notification")
+def unpublish_notification(sender, instance, **kwargs):
+    from notification.inbox import notifications_changed
+
+    transaction.on_commit(notifications_changed)
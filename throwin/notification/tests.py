@@ -1,3 +1,92 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.choices import UserKind
+from accounts.models import User
+from notification.models import Notification, NotificationRead
+from store.models import Restaurant, RestaurantUser
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NotificationInboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def make_user(email, kind):
+            return User.objects.create(email=email, name=email.split("@")[0], kind=kind, is_verified=True)
+
+        cls.admin = make_user("admin@example.com", UserKind.SUPER_ADMIN)
+        cls.owner = make_user("owner@example.com", UserKind.RESTAURANT_OWNER)
+        cls.staff = make_user("staff@example.com", UserKind.RESTAURANT_STAFF)
+        cls.consumer = make_user("consumer@example.com", UserKind.CONSUMER)
+        cls.restaurant = Restaurant.objects.create(name="Inbox", restaurant_owner=cls.owner)
+        RestaurantUser.objects.create(restaurant=cls.restaurant, user=cls.staff, role=UserKind.RESTAURANT_STAFF)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def publish(self, user, **data):
+        response = self.client_for(user).post("/notifications", {"body": "Body", **data}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data["uid"]
+
+    def titles(self, user):
+        return [row["title"] for row in self.client_for(user).get("/notifications").data["results"]]
+
+    def unread(self, user):
+        return self.client_for(user).get("/notifications/unread-count").data["unread"]
+
+    def test_notifications_reach_their_audience_only(self):
+        self.publish(self.admin, title="For consumers", kind=UserKind.CONSUMER)
+        self.publish(self.admin, title="For everyone")
+        self.publish(self.owner, title="For the restaurant")
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(self.titles(self.consumer), ["For everyone", "For consumers"])
+        self.assertEqual(self.titles(self.staff), ["For the restaurant", "For everyone"])
+        self.assertEqual(self.titles(self.owner), ["For the restaurant", "For everyone"])
+        self.assertEqual(self.client.get("/notifications").status_code, 200)
+        self.assertEqual(
+            self.client_for(self.consumer).post("/notifications", {"title": "No", "body": "No"}).status_code, 403
+        )
+
+    def test_read_markers_and_unread_count(self):
+        first = self.publish(self.admin, title="First")
+        self.publish(self.admin, title="Second")
+        self.assertEqual(self.unread(self.consumer), 2)
+
+        response = self.client_for(self.consumer).get(f"/notifications/{first}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread(self.consumer), 1)
+        rows = self.client_for(self.consumer).get("/notifications").data["results"]
+        self.assertEqual([row["is_read"] for row in rows], [False, True])
+
+        self.assertEqual(self.client_for(self.consumer).post("/notifications/read-all").status_code, 204)
+        self.assertEqual(self.unread(self.consumer), 0)
+        self.assertFalse(NotificationRead.objects.exists())
+
+        self.publish(self.admin, title="Third")
+        self.assertEqual(self.unread(self.consumer), 1)
+        self.assertEqual(self.unread(self.staff), 3)
+
+    def test_audience_changes_drop_unread_counts(self):
+        new_owner = User.objects.create(email="new@example.com", kind=UserKind.RESTAURANT_OWNER)
+
+        with mock.patch("notification.inbox.drop_unread_count") as drop:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.restaurant.restaurant_owner = new_owner
+                self.restaurant.save()
+            dropped = {user_id for call in drop.call_args_list for user_id in call.args}
+            self.assertTrue({self.owner.id, new_owner.id} <= dropped)
+
+            drop.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.consumer.kind = UserKind.RESTAURANT_STAFF
+                self.consumer.save()
+            drop.assert_any_call(self.consumer.id)
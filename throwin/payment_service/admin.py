@@ -1,9 +1,13 @@
 from django.contrib import admin
-from .models import PaymentHistory
+from django.db.models import F
+from django.utils import timezone
+
+from common.admin import AutocompleteFilter, LargeTableAdminMixin
+from .models import FeePolicy, PaymentHistory
 
 
 @admin.register(PaymentHistory)
-class PaymentHistoryAdmin(admin.ModelAdmin):
+class PaymentHistoryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Enhanced Admin interface for PaymentHistory model.
     """
@@ -12,7 +16,7 @@ class PaymentHistoryAdmin(admin.ModelAdmin):
         "customer_display",
         "nickname",
         "staff_display",
-        "restaurant",
+        "restaurant_display",
         "store_display",
         "amount",
         "currency",
@@ -27,8 +31,8 @@ class PaymentHistoryAdmin(admin.ModelAdmin):
         "status",
         "currency",
         "payment_method",
-        "restaurant",
-        "store",
+        ("restaurant", AutocompleteFilter),
+        ("store", AutocompleteFilter),
         "is_distributed",
         "payment_date",
     )
@@ -85,32 +89,74 @@ class PaymentHistoryAdmin(admin.ModelAdmin):
         """
         Display customer details in a user-friendly format.
         """
-        return obj.customer.username if obj.customer else "Anonymous"
+        return obj.customer_username or "Anonymous"
     customer_display.short_description = "Customer"
+    customer_display.admin_order_field = "customer_username"
 
     def staff_display(self, obj):
         """
         Display staff details in a user-friendly format.
         """
-        return obj.staff.name
+        return obj.staff_name
     staff_display.short_description = "Staff"
+    staff_display.admin_order_field = "staff_name"
+
+    def restaurant_display(self, obj):
+        return obj.restaurant_name
+    restaurant_display.short_description = "Restaurant"
+    restaurant_display.admin_order_field = "restaurant_name"
 
     def store_display(self, obj):
         """
         Display store details in a user-friendly format.
         """
-        return obj.store.name if obj.store else "N/A"
+        return obj.store_name or "N/A"
     store_display.short_description = "Store"
+    store_display.admin_order_field = "store_name"
 
     def get_queryset(self, request):
         """
-        Optimize queryset for admin by prefetching related objects.
+        Only read the names shown in the list from the related tables.
         """
-        return super().get_queryset(request).select_related(
-            "customer", "staff", "restaurant", "store"
+        return super().get_queryset(request).annotate(
+            customer_username=F("customer__username"),
+            staff_name=F("staff__name"),
+            restaurant_name=F("restaurant__name"),
+            store_name=F("store__name"),
         )
 
 
+@admin.register(FeePolicy)
+class FeePolicyAdmin(admin.ModelAdmin):
+    """
+    Fee policies. A policy that is in effect cannot be changed any more, only
+    withdrawn (status) or replaced by a new version.
+    """
+    list_display = (
+        "version",
+        "effective_from",
+        "fee_rate",
+        "fixed_fee",
+        "staff_rate",
+        "glow_admin_rate",
+        "fc_admin_rate",
+        "sales_agent_rate",
+        "rounding",
+        "status",
+    )
+    list_filter = ("status", "rounding")
+    ordering = ("-effective_from", "-version")
+    readonly_fields = ("uid", "created_at", "updated_at", "created_by", "updated_by")
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.effective_from <= timezone.now():
+            return [
+                field.name for field in FeePolicy._meta.fields
+                if field.name not in ("id", "status", "note")
+            ]
+        return self.readonly_fields
+
+
 
 from django.contrib import admin
 from payment_service.bank_details.bank_details_model import BankAccount
@@ -144,18 +190,42 @@ class BankAccountAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import OuterRef, Subquery
 from .gmo_pg.models import GMOCreditPayment, Balance
+from accounts.models import User
+from store.models import Store
+from payment_service import tasks
+
+ACTION_CHUNK_SIZE = 500
+
+
+def queue_in_chunks(task, queryset):
+    """Queue `task` for the ids of `queryset`, `ACTION_CHUNK_SIZE` ids per job. Returns the number of ids."""
+    ids = queryset.order_by().values_list("id", flat=True)
+    chunk, queued = [], 0
+    for payment_id in ids.iterator(chunk_size=ACTION_CHUNK_SIZE):
+        chunk.append(payment_id)
+        if len(chunk) == ACTION_CHUNK_SIZE:
+            task.delay(chunk)
+            queued += len(chunk)
+            chunk = []
+    if chunk:
+        task.delay(chunk)
+        queued += len(chunk)
+    return queued
+
 
 @admin.register(GMOCreditPayment)
-class GMOCreditPaymentAdmin(admin.ModelAdmin):
+class GMOCreditPaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin panel configuration for GMOCreditPayment.
     """
     list_display = (
-        "order_id", "nickname", "amount", "currency", "status", "store_uid",
+        "order_id", "nickname", "amount", "currency", "status", "store_display", "staff_display",
         "transaction_id", "approval_code", "process_date", "is_distributed", "created_at"
     )
+    actions = ["recheck_status", "distribute"]
     list_filter = ("status", "is_distributed", "created_at")
     search_fields = ("order_id", "transaction_id", "nickname", "staff_uid", "store_uid")
     ordering = ("-created_at",)
@@ -196,16 +266,53 @@ class GMOCreditPaymentAdmin(admin.ModelAdmin):
         """Prevent deletion of payments from the Admin Panel."""
         return False
 
+    def get_queryset(self, request):
+        """Store and staff names come from subqueries, payments only keep their uids."""
+        return super().get_queryset(request).annotate(
+            store_name=Subquery(Store.objects.filter(uid=OuterRef("store_uid")).values("name")[:1]),
+            staff_name=Subquery(User.objects.filter(uid=OuterRef("staff_uid")).values("name")[:1]),
+        )
+
+    def store_display(self, obj):
+        return obj.store_name or obj.store_uid
+    store_display.short_description = "Store"
+
+    def staff_display(self, obj):
+        return obj.staff_name or obj.staff_uid
+    staff_display.short_description = "Staff"
+
+    def recheck_status(self, request, queryset):
+        """Ask GMO again for the status of the selected payments, in Celery jobs."""
+        queued = queue_in_chunks(tasks.recheck_payment_statuses, queryset.exclude(status="CAPTURE"))
+        self.message_user(request, f"Status check of {queued} payments queued.", messages.SUCCESS)
+    recheck_status.short_description = "Re-check status with GMO"
+
+    def distribute(self, request, queryset):
+        """Distribute the selected captured payments that are not distributed yet, in Celery jobs."""
+        queued = queue_in_chunks(
+            tasks.distribute_payments, queryset.filter(status="CAPTURE", is_distributed=False)
+        )
+        self.message_user(request, f"Distribution of {queued} payments queued.", messages.SUCCESS)
+    distribute.short_description = "Distribute captured payments"
+
 
 @admin.register(Balance)
-class BalanceAdmin(admin.ModelAdmin):
+class BalanceAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin panel configuration for the Balance model.
     """
-    list_display = ("user", "current_balance", "total_received", "last_updated")
+    list_display = ("user_display", "current_balance", "total_received", "last_updated")
     search_fields = ("user__username", "user__email")
     ordering = ("-last_updated",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(user_email=F("user__email"))
+
+    def user_display(self, obj):
+        return obj.user_email
+    user_display.short_description = "User"
+    user_display.admin_order_field = "user_email"
+
 
 
 from payment_service.gmo_pg.models import PayPalDetail, PayPalDisbursement
@@ -218,8 +325,17 @@ class PayPalDetailAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 @admin.register(PayPalDisbursement)
-class PayPalDisbursementAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'status', 'transaction_id', 'created_at', 'updated_at')
+class PayPalDisbursementAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('user_display', 'amount', 'status', 'transaction_id', 'created_at', 'updated_at')
     search_fields = ('user__email', 'transaction_id')
     list_filter = ('status',)
     ordering = ('-created_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(user_email=F('user__email'))
+
+    def user_display(self, obj):
+        return obj.user_email
+    user_display.short_description = 'User'
+    user_display.admin_order_field = 'user_email'
+
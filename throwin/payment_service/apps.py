@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PaymentServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payment_service'
+
+    def ready(self):
+        from payment_service import signals  # noqa: F401
@@ -0,0 +1,195 @@
+"""
+Async versions of the PayPal callbacks, routed instead of the sync ones when
+ASYNC_PAYMENT_VIEWS is enabled (see `urls.py`). PayPal is called through the
+pooled httpx client instead of the blocking SDK.
+
+`TipFeedView` streams the tip feed and is always async. It only streams under
+an ASGI server, where an idle connection does not hold a worker, and answers
+503 under WSGI, where it would hold a worker for as long as the client stays.
+EventSource clients cannot send the Authorization header: they get a
+short-lived token from `TipFeedTokenView` and open the feed with `?token=`.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
+from rest_framework import status
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from accounts.authentication import get_cached_user
+from accounts.choices import UserKind
+from common import feed
+from common.async_views import AsyncAPIView
+from store.config import get_store_config
+
+from .helpers.paypal_helper import aexecute_paypal_payment
+from .models import PaymentHistory
+from .views import settle_paypal_payment
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("paymentId", str, required=True, description="PayPal payment ID."),
+        OpenApiParameter("PayerID", str, required=True, description="PayPal Payer ID."),
+    ],
+    responses={
+        200: OpenApiResponse(description="Payment completed successfully."),
+        400: OpenApiResponse(description="Missing paymentId or PayerID, or PayPal execution failed."),
+        404: OpenApiResponse(description="Payment not found."),
+    },
+)
+class AsyncPayPalSuccessView(AsyncAPIView):
+    """
+    Handle PayPal success callback.
+    """
+    async def get(self, request):
+        payment_id = request.GET.get("paymentId")
+        payer_id = request.GET.get("PayerID")
+
+        if not payment_id or not payer_id:
+            return Response({"error": "Missing paymentId or PayerID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        paypal_response = await aexecute_paypal_payment(payment_id, payer_id)
+
+        if paypal_response["success"]:
+            try:
+                payment = await PaymentHistory.objects.aget(transaction_id=payment_id)
+                captured = payment.status != "success"
+                payment.status = "success"
+                await payment.asave()
+                if captured:
+                    await sync_to_async(settle_paypal_payment)(payment)
+                return Response({"message": "Payment completed successfully."}, status=status.HTTP_200_OK)
+            except PaymentHistory.DoesNotExist:
+                return Response({"error": "Payment not found in the system."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"error": paypal_response["error"]}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("paymentId", str, required=False, description="PayPal payment ID."),
+    ],
+    responses={200: OpenApiResponse(description="Payment was canceled.")},
+)
+class AsyncPayPalCancelView(AsyncAPIView):
+    """
+    Handle PayPal cancel callback.
+    """
+    async def get(self, request):
+        payment_id = request.GET.get("paymentId")
+        if payment_id:
+            try:
+                payment = await PaymentHistory.objects.aget(transaction_id=payment_id)
+                payment.status = "canceled"
+                await payment.asave()
+            except PaymentHistory.DoesNotExist:
+                pass  # No action needed if payment record is not found
+        return Response({"message": "Payment was canceled."}, status=status.HTTP_200_OK)
+
+
+def tip_feed_channels(user, store_uid=None):
+    """
+    The feed channels `user` may follow: staff their own, owners and sales
+    agents their restaurants, or one store of them with `store_uid`. None
+    when the user has no feed.
+    """
+    if user.kind == UserKind.RESTAURANT_STAFF:
+        return [feed.channel_name("staff", user.uid)]
+    if user.kind == UserKind.RESTAURANT_OWNER:
+        restaurant = user.get_restaurant_owner_restaurant
+        restaurants = [restaurant] if restaurant else []
+    elif user.kind == UserKind.SALES_AGENT:
+        restaurants = user.get_agent_restaurants or []
+    else:
+        return None
+    restaurant_uids = {restaurant.uid for restaurant in restaurants}
+    if store_uid:
+        config = get_store_config(store_uid)
+        if config is None or config.restaurant_uid not in restaurant_uids:
+            return None
+        return [feed.channel_name("store", config.uid)]
+    return [feed.channel_name("restaurant", uid) for uid in restaurant_uids] or None
+
+
+class FeedTokenAuthentication(BaseAuthentication):
+    """The `token` query parameter of the tip feed, a token from `TipFeedTokenView`."""
+
+    def authenticate(self, request):
+        token = request.query_params.get("token")
+        if not token:
+            return None
+        user_id = feed.token_user_id(token)
+        user = get_cached_user(user_id) if user_id is not None else None
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("Invalid or expired feed token.")
+        return user, None
+
+
+@extend_schema(
+    request=None,
+    responses={
+        200: OpenApiResponse(description='{"token": ..., "expires_in": seconds} to open the tip feed with.'),
+        403: OpenApiResponse(description="The user has no feed."),
+    },
+)
+class TipFeedTokenView(APIView):
+    """
+    A token to open the tip feed with `?token=` from EventSource, which cannot
+    send the Authorization header. It expires after `expires_in` seconds: get
+    a new one whenever the feed has to be opened again.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not tip_feed_channels(request.user):
+            return Response({"error": "No tip feed for this user."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"token": feed.make_token(request.user), "expires_in": feed.TOKEN_MAX_AGE})
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("store_uid", str, required=False, description="Only the events of this store."),
+        OpenApiParameter(
+            "token", str, required=False, description="Token from tip-feed/token/, for clients without headers."
+        ),
+    ],
+    responses={
+        200: OpenApiResponse(description="text/event-stream of tip.captured, review.created and reply.created events."),
+        403: OpenApiResponse(description="The user has no feed, or not for this store."),
+        503: OpenApiResponse(description="Not served by an ASGI server, or no Redis server to follow events with."),
+    },
+)
+class TipFeedView(AsyncAPIView):
+    """
+    Server-sent events of the tips, reviews and replies of the staff member,
+    or of the restaurants of an owner or sales agent (see common.feed).
+    Authenticated with the Authorization header or a `?token=` from
+    `TipFeedTokenView`.
+    """
+    authentication_classes = [FeedTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        if not isinstance(request._request, ASGIRequest):
+            # Under WSGI the stream would hold a worker until the client leaves
+            return Response(
+                {"error": "The tip feed needs an ASGI server."}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        channels = await sync_to_async(tip_feed_channels)(request.user, request.GET.get("store_uid"))
+        if not channels:
+            return Response({"error": "No tip feed for this user."}, status=status.HTTP_403_FORBIDDEN)
+        hub = feed.get_hub()
+        if hub is None:
+            return Response({"error": "The tip feed is unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        response = StreamingHttpResponse(feed.stream(hub, channels), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Do not buffer in nginx
+        return response
@@ -0,0 +1,305 @@
+"""
+Fee and split policies of tips.
+
+A tip first pays the processing fee (`fee_rate` of the amount plus
+`fixed_fee`), the net amount is then split between the staff (`staff_rate`)
+and the management share, itself split between the Glow admin, the FC admin
+and the sales agent. The rates are versioned `FeePolicy` rows; a payment is
+always split by the policy in effect when it was created (`policy_at`), and
+`DEFAULT_POLICY` (3.6% + 40 JPY, 75/25, 30/30/40) applies before the first one.
+
+Policies are computed on integers in cents, so a payment splits the same way
+every time and on every machine:
+
+* the fee is rounded half up to the rounding unit of the policy (a cent or a
+  yen),
+* each share is rounded down to the unit and the units left over go to the
+  shares with the largest remainders (the staff first on ties), so the shares
+  always add up to the net amount exactly.
+
+`DEFAULT_POLICY` keeps the "legacy" rounding of the payments made before fee
+policies existed: exact arithmetic, each value rounded half up to the cent as
+the Postgres balance columns stored it. Their shares may be a cent off the
+net amount, but reconciling old balances gives back what was credited. It is
+not offered for new policies.
+
+`split` splits one amount. `split_totals` splits many and only keeps the
+totals, vectorised with NumPy (see requirements.txt) and in pure Python for
+the legacy rounding or without NumPy, with the same results.
+"""
+
+import bisect
+import datetime
+import functools
+import zlib
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from common.cache import TwoTierCache
+
+try:
+    import numpy
+except ImportError:  # The pure Python engine gives the same results
+    numpy = None
+
+CENTS = 100
+RATE_SCALE = 10 ** 4  # Rates have 4 decimal places
+WEIGHT_SCALE = RATE_SCALE ** 2  # Management shares are rates of a rate
+ROUNDING_UNITS = {"cent": 1, "yen": CENTS}
+LEGACY = "legacy"
+
+policy_cache = TwoTierCache(
+    "payment:fee_policies",
+    local_ttl=getattr(settings, "FEE_POLICY_CACHE_LOCAL_TTL", 5),
+    remote_ttl=getattr(settings, "FEE_POLICY_CACHE_TTL", 3600),
+)
+
+
+class Policy(NamedTuple):
+    version: int
+    fee_rate: Decimal
+    fixed_fee: Decimal
+    staff_rate: Decimal
+    glow_admin_rate: Decimal
+    fc_admin_rate: Decimal
+    sales_agent_rate: Decimal
+    rounding: str = "cent"
+    effective_from: Optional[datetime.datetime] = None
+
+
+# Cached policies are dropped whenever the fields of Policy change
+POLICIES_KEY = f"{zlib.crc32(repr(Policy._fields).encode())}:active"
+
+DEFAULT_POLICY = Policy(
+    version=0,
+    fee_rate=Decimal("0.036"),
+    fixed_fee=Decimal("40"),
+    staff_rate=Decimal("0.75"),
+    glow_admin_rate=Decimal("0.30"),
+    fc_admin_rate=Decimal("0.30"),
+    sales_agent_rate=Decimal("0.40"),
+    rounding=LEGACY,
+)
+
+
+class Split(NamedTuple):
+    amount: Decimal
+    fee: Decimal
+    net: Decimal
+    staff: Decimal
+    glow_admin: Decimal
+    fc_admin: Decimal
+    sales_agent: Decimal
+
+
+def _cents(amount):
+    amount = Decimal(str(amount)) if isinstance(amount, float) else Decimal(amount)
+    return int((amount * CENTS).to_integral_value(ROUND_HALF_UP))
+
+
+def _decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _rate(value):
+    return int((Decimal(value) * RATE_SCALE).to_integral_value(ROUND_HALF_UP))
+
+
+@functools.lru_cache(maxsize=32)
+def _terms(policy):
+    """
+    `(fee rate, fixed fee in cents, share weights, rounding unit in cents)` as
+    integers, no rounding unit for the legacy rounding.
+    """
+    management = RATE_SCALE - _rate(policy.staff_rate)
+    weights = (
+        _rate(policy.staff_rate) * RATE_SCALE,
+        management * _rate(policy.glow_admin_rate),
+        management * _rate(policy.fc_admin_rate),
+        management * _rate(policy.sales_agent_rate),
+    )
+    return _rate(policy.fee_rate), _cents(policy.fixed_fee), weights, ROUNDING_UNITS.get(policy.rounding)
+
+
+def _round_half_up(value, scale):
+    """`value / scale` rounded half away from zero, like Postgres numeric."""
+    units = (abs(value) * 2 + scale) // (2 * scale)
+    return units if value >= 0 else -units
+
+
+def _legacy_split_cents(amount, policy):
+    """`(fee, net, *shares)` of an amount in cents, computed like before fee policies."""
+    fee_rate, fixed_fee, weights, _ = _terms(policy)
+    # Exact values in ten-thousandths of a cent
+    fee = amount * fee_rate + fixed_fee * RATE_SCALE
+    net = amount * RATE_SCALE - fee
+    shares = (_round_half_up(net * weight, RATE_SCALE * WEIGHT_SCALE) for weight in weights)
+    return (_round_half_up(fee, RATE_SCALE), _round_half_up(net, RATE_SCALE), *shares)
+
+
+def _split_cents(amount, policy):
+    """`(fee, net, *shares)` of an amount in cents."""
+    if policy.rounding == LEGACY:
+        return _legacy_split_cents(amount, policy)
+    fee_rate, fixed_fee, weights, unit = _terms(policy)
+    fee_scale = unit * RATE_SCALE
+    fee = (amount * fee_rate + fixed_fee * RATE_SCALE + fee_scale // 2) // fee_scale * unit
+    net = amount - fee
+
+    share_scale = unit * WEIGHT_SCALE
+    shares, remainders = [], []
+    for weight in weights:
+        units, remainder = divmod(net * weight, share_scale)
+        shares.append(units * unit)
+        remainders.append(remainder)
+    whole, rest = divmod(net - sum(shares), unit)
+    # Largest remainders first, the earlier share on ties
+    order = sorted(range(len(weights)), key=lambda index: -remainders[index])
+    for index in order[:whole]:
+        shares[index] += unit
+    shares[order[0]] += rest  # Amounts that are not a multiple of the unit
+    return (fee, net, *shares)
+
+
+def split(amount, policy=None):
+    """The `Split` of an amount under `policy`, the current one by default."""
+    policy = policy or policy_at()
+    cents = _cents(amount)
+    return Split(_decimal(cents), *(_decimal(value) for value in _split_cents(cents, policy)))
+
+
+def _numpy_totals(amounts, policy):
+    """`(count, amount, fee, net, *shares)` totals in cents of an int64 array of amounts in cents."""
+    fee_rate, fixed_fee, weights, unit = _terms(policy)
+    fee_scale = unit * RATE_SCALE
+    fee = (amounts * fee_rate + fixed_fee * RATE_SCALE + fee_scale // 2) // fee_scale * unit
+    net = amounts - fee
+
+    share_scale = unit * WEIGHT_SCALE
+    products = net[:, None] * numpy.array(weights, dtype=numpy.int64)
+    shares = products // share_scale * unit
+    remainders = products % share_scale
+    left = net - shares.sum(axis=1)
+    # Rank of each share by remainder, largest first and the earlier share on ties
+    order = numpy.argsort(-remainders, axis=1, kind="stable")
+    ranks = numpy.empty_like(order)
+    numpy.put_along_axis(ranks, order, numpy.arange(len(weights)), axis=1)
+    shares += (ranks < (left // unit)[:, None]) * unit
+    shares += (ranks == 0) * (left % unit)[:, None]
+    totals = (amounts.sum(), fee.sum(), net.sum(), *shares.sum(axis=0))
+    return (len(amounts), *(int(total) for total in totals))
+
+
+def _cents_array(amounts):
+    """Amounts in cents, an int64 array with NumPy and a list otherwise."""
+    cents = (_cents(amount) for amount in amounts)
+    return numpy.fromiter(cents, dtype=numpy.int64) if numpy is not None else list(cents)
+
+
+def _totals(cents, policy):
+    """`(count, amount, fee, net, *shares)` totals in cents of amounts from `_cents_array`."""
+    if numpy is not None and len(cents) and policy.rounding != LEGACY:
+        return _numpy_totals(cents, policy)
+    totals = [0] * 7
+    for amount in cents:
+        amount = int(amount)
+        totals[0] += amount
+        for index, value in enumerate(_split_cents(amount, policy), start=1):
+            totals[index] += value
+    return (len(cents), *totals)
+
+
+def split_totals(amounts, policy=None):
+    """
+    `(count, Split of the totals)` of many amounts under `policy`, the
+    current one by default. Every amount is split and rounded on its own.
+    """
+    count, *totals = _totals(_cents_array(amounts), policy or policy_at())
+    return count, Split(*(_decimal(total) for total in totals))
+
+
+def build_policy(policy):
+    return Policy(
+        version=policy.version,
+        fee_rate=policy.fee_rate,
+        fixed_fee=policy.fixed_fee,
+        staff_rate=policy.staff_rate,
+        glow_admin_rate=policy.glow_admin_rate,
+        fc_admin_rate=policy.fc_admin_rate,
+        sales_agent_rate=policy.sales_agent_rate,
+        rounding=policy.rounding,
+        effective_from=policy.effective_from,
+    )
+
+
+def active_policies():
+    """The active policies, oldest first, from the cache."""
+    from common.choices import Status
+    from payment_service.models import FeePolicy
+
+    policies = policy_cache.get(POLICIES_KEY)
+    if policies is None:
+        rows = FeePolicy.objects.filter(status=Status.ACTIVE).order_by("effective_from", "version")
+        policies = tuple(build_policy(row) for row in rows)
+        policy_cache.set(POLICIES_KEY, policies)
+    return policies
+
+
+def policy_at(when=None):
+    """The policy in effect at `when` (now by default)."""
+    when = when or timezone.now()
+    policies = active_policies()
+    index = bisect.bisect_right([policy.effective_from for policy in policies], when)
+    return policies[index - 1] if index else DEFAULT_POLICY
+
+
+def policy_periods(start, end):
+    """`(policy, start, end)` of the policies in effect between two datetimes."""
+    periods = []
+    for policy in (DEFAULT_POLICY, *active_policies()):
+        if policy.effective_from is not None and policy.effective_from >= end:
+            break
+        begin = max(start, policy.effective_from) if policy.effective_from else start
+        if periods and periods[-1][1] >= begin:
+            periods.pop()  # Replaced before it started
+        elif periods:
+            periods[-1] = (periods[-1][0], periods[-1][1], begin)
+        periods.append((policy, begin, end))
+    return periods
+
+
+def invalidate_fee_policies():
+    policy_cache.delete(POLICIES_KEY)
+
+
+def simulate(date_from, date_to, candidate):
+    """
+    Replay the distributed GMO payments of the local days between `date_from`
+    and `date_to` (inclusive) under the `candidate` policy. Returns the number
+    of payments, their totals under the policies they were split by, under
+    the candidate and the difference. Archived months are not in the database
+    and are not replayed.
+    """
+    from payment_service.gmo_pg.models import GMOCreditPayment
+
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(date_from, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    payments = GMOCreditPayment.objects.filter(status="CAPTURE", is_distributed=True).order_by()
+
+    count, current, replayed = 0, [0] * 7, [0] * 7
+    for policy, begin, until in policy_periods(start, end):
+        amounts = payments.filter(created_at__gte=begin, created_at__lt=until).values_list("amount", flat=True)
+        cents = _cents_array(amounts.iterator(chunk_size=10000))
+        period_count, *period_current = _totals(cents, policy)
+        _, *period_replayed = _totals(cents, candidate)
+        count += period_count
+        current = [total + value for total, value in zip(current, period_current)]
+        replayed = [total + value for total, value in zip(replayed, period_replayed)]
+    current = Split(*(_decimal(total) for total in current))
+    replayed = Split(*(_decimal(total) for total in replayed))
+    difference = Split(*(new - old for new, old in zip(replayed, current)))
+    return {"payments": count, "current": current, "candidate": replayed, "difference": difference}
@@ -0,0 +1,237 @@
+"""
+Archival of closed months of GMO payments.
+
+`archive_month` writes the payments of a month to a compressed file in the
+archive storage (a private S3 location in production, `BASE_DIR/archive`
+otherwise), newest first, records it as an `ArchivedPaymentMonth` and removes
+the rows: the partition is dropped in Postgres and the rows left elsewhere (the
+default partition, SQLite) are deleted in batches. Their order ids stay
+reserved in `GMOOrderId`.
+
+Only months older than the current one whose captured payments are all
+distributed can be archived. The count, total and a digest of the rows are
+taken while the file is written; the rows are only removed if they still match
+once locked in the deleting transaction, otherwise the file is dropped and
+`ArchiveError` raised. Card tokens and GMO access credentials are not
+archived. `read_archived_month` streams the payments back as unsaved
+`GMOCreditPayment` instances, in the order of the history endpoint, so a page
+only reads the file up to that page.
+"""
+
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import logging
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+
+from review.models import Review
+from .models import ArchivedPaymentMonth, GMOCreditPayment
+from . import partitions
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet is optional, CSV is always available
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_FIELDS = {"token", "access_id", "access_pass"}
+FIELDS = [
+    field for field in GMOCreditPayment._meta.concrete_fields
+    if field.attname not in EXCLUDED_FIELDS
+]
+DELETE_BATCH_SIZE = 2000
+AMOUNT_INDEX = [field.attname for field in FIELDS].index("amount")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class _Tally:
+    """Count, total amount and digest of the rows passed through `feed`."""
+
+    def __init__(self):
+        self.count = 0
+        self.amount = Decimal("0")
+        self._digest = hashlib.sha256()
+
+    def feed(self, rows):
+        for row in rows:
+            self.count += 1
+            self.amount += row[AMOUNT_INDEX] or 0
+            self._digest.update(repr(row).encode())
+            yield row
+
+    @property
+    def totals(self):
+        return self.count, self.amount, self._digest.hexdigest()
+
+
+def archive_storage():
+    if "gmo_archive" in settings.STORAGES:
+        return storages["gmo_archive"]
+    return FileSystemStorage(location=settings.BASE_DIR / "archive")
+
+
+def archivable_months(older_than_months, today=None):
+    """Months with payments that ended at least `older_than_months` months ago."""
+    current = partitions.month_start(today or datetime.date.today())
+    cutoff, _ = partitions.month_bounds(partitions.add_months(current, -older_than_months))
+    archived = set(ArchivedPaymentMonth.objects.values_list("month", flat=True))
+    months = GMOCreditPayment.objects.filter(created_at__lt=cutoff).datetimes(
+        "created_at", "month", tzinfo=datetime.timezone.utc
+    )
+    return [month.date() for month in months if month.date() not in archived]
+
+
+def _payments_of(month):
+    start, end = partitions.month_bounds(month)
+    return GMOCreditPayment.objects.filter(created_at__gte=start, created_at__lt=end)
+
+
+def _write_csv(rows, target):
+    with gzip.GzipFile(fileobj=target, mode="wb", mtime=0) as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow([field.attname for field in FIELDS])
+        for row in rows:
+            writer.writerow(["" if value is None else value for value in row])
+        text.flush()
+        text.detach()
+
+
+def _write_parquet(rows, target):
+    columns = list(zip(*rows)) or [[] for _ in FIELDS]
+    table = pyarrow.table({
+        field.attname: pyarrow.array([None if value is None else str(value) for value in column], pyarrow.string())
+        for field, column in zip(FIELDS, columns)
+    })
+    pyarrow.parquet.write_table(table, target, compression="zstd")
+
+
+def archive_month(month, file_format="csv"):
+    """Move the payments of `month` to archive storage. Returns the `ArchivedPaymentMonth`."""
+    month = partitions.month_start(month)
+    if file_format == "parquet" and pyarrow is None:
+        raise ArchiveError("Parquet archives need pyarrow installed.")
+    if month >= partitions.month_start(datetime.date.today()):
+        raise ArchiveError(f"{month:%Y-%m} is not closed yet.")
+    if ArchivedPaymentMonth.objects.filter(month=month).exists():
+        raise ArchiveError(f"{month:%Y-%m} is already archived.")
+
+    payments = _payments_of(month)
+    if payments.filter(status="CAPTURE", is_distributed=False).exists():
+        raise ArchiveError(f"{month:%Y-%m} has captured payments that are not distributed.")
+
+    written = _Tally()
+    rows = written.feed(_rows(payments).iterator(chunk_size=DELETE_BATCH_SIZE))
+    with tempfile.TemporaryFile() as target:
+        if file_format == "parquet":
+            _write_parquet(list(rows), target)
+        else:
+            _write_csv(rows, target)
+
+        target.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: target.read(1 << 20), b""):
+            digest.update(chunk)
+        target.seek(0)
+
+        extension = "parquet" if file_format == "parquet" else "csv.gz"
+        path = archive_storage().save(f"gmo_payments/{month:%Y}/{month:%Y-%m}.{extension}", File(target))
+
+    try:
+        with transaction.atomic():
+            # Lock the rows and check they are still the ones in the file
+            locked = _Tally()
+            for _ in locked.feed(_rows(payments.select_for_update()).iterator(chunk_size=DELETE_BATCH_SIZE)):
+                pass
+            if locked.totals != written.totals:
+                raise ArchiveError(f"{month:%Y-%m} changed while it was archived, try again.")
+            archive = ArchivedPaymentMonth.objects.create(
+                month=month,
+                path=path,
+                format=file_format,
+                row_count=written.count,
+                total_amount=written.amount,
+                sha256=digest.hexdigest(),
+            )
+            _delete_month(month)
+    except Exception:
+        archive_storage().delete(path)
+        raise
+    logger.info("Archived %s payments of %s to %s", archive.row_count, f"{month:%Y-%m}", path)
+    return archive
+
+
+def _rows(payments):
+    # Newest first, the order of the payment history
+    return payments.order_by("-created_at", "-id").values_list(*(field.attname for field in FIELDS))
+
+
+def _delete_month(month):
+    payments = _payments_of(month)
+    # Reviews keep their transaction id, which is the archived order id
+    Review.objects.filter(payment__in=payments.values("id")).update(payment=None)
+
+    if month in partitions.existing_partitions():
+        partitions.drop_partition(month)
+    # Rows outside the partition of the month: the default partition, or SQLite
+    while True:
+        ids = list(payments.values_list("id", flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return
+        GMOCreditPayment.objects.filter(id__in=ids).delete()
+
+
+def _records(archive, stored):
+    """`(header, iterator of the raw records)` of an archive file, read as it goes."""
+    if archive.format == "parquet":
+        if pyarrow is None:
+            raise ArchiveError("Reading Parquet archives needs pyarrow installed.")
+        parquet = pyarrow.parquet.ParquetFile(stored)
+        header = parquet.schema_arrow.names
+        records = (
+            record
+            for batch in parquet.iter_batches(batch_size=DELETE_BATCH_SIZE)
+            for record in zip(*(column.to_pylist() for column in batch.columns))
+        )
+        return header, records
+    reader = csv.reader(io.TextIOWrapper(gzip.GzipFile(fileobj=stored), encoding="utf-8", newline=""))
+    return next(reader), reader
+
+
+def read_archived_month(archive, filters=None):
+    """
+    The payments of an `ArchivedPaymentMonth` as unsaved `GMOCreditPayment`
+    instances, newest first, streamed from the file. `filters` maps field
+    names to the allowed values; they are checked on the raw values, so
+    skipped rows are never built.
+    """
+    filters = {name: {str(value) for value in values} for name, values in (filters or {}).items()}
+    if any(not allowed for allowed in filters.values()):
+        return
+
+    fields = {field.attname: field for field in FIELDS}
+    with archive_storage().open(archive.path, "rb") as stored:
+        header, records = _records(archive, stored)
+        checks = [(header.index(name), allowed) for name, allowed in filters.items()]
+        for record in records:
+            if not all(str(record[index]) in allowed for index, allowed in checks):
+                continue
+            values = {
+                name: fields[name].to_python(value if value not in ("", None) else None)
+                for name, value in zip(header, record)
+                if name in fields
+            }
+            yield GMOCreditPayment(**values)
@@ -0,0 +1,85 @@
+"""
+Async versions of the GMO credit card views, routed instead of the sync ones
+when ASYNC_PAYMENT_VIEWS is enabled (see `payment_service/urls.py`).
+
+They keep the request and response formats of `views.py`. The GMO calls are
+awaited on the pooled httpx client and the database work runs through the
+async ORM or `sync_to_async`, so under an ASGI server a process can hold many
+payments in flight while GMO answers.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from drf_spectacular.utils import extend_schema
+from rest_framework import permissions, status
+from rest_framework.response import Response
+
+from common.async_views import AsyncAPIView
+from common.idempotency import aidempotent_response
+from .serializers import GMOCreditPaymentSerializer
+from .views import payments_visible_to, settle_captured_payment
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGMOCreditCardPaymentView(AsyncAPIView):
+    """
+    API to process GMO PG credit card payment.
+    Endpoint: `/gmo-pg/credit-card/`
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    returns the first response instead of charging the card again.
+    """
+    serializer_class = GMOCreditPaymentSerializer
+    permission_classes = [permissions.AllowAny]  # Supports anonymous payments
+
+    @extend_schema(request=GMOCreditPaymentSerializer, responses={201: GMOCreditPaymentSerializer})
+    async def post(self, request, *args, **kwargs):
+        # Same scope as the sync view so keys survive switching between them
+        return await aidempotent_response(request, "GMOCreditCardPaymentView", lambda: self.create(request))
+
+    async def create(self, request):
+        logger.info(f"Received payment request: {request.data}")
+        serializer = GMOCreditPaymentSerializer(data=request.data, context={"request": request})
+        if not await sync_to_async(serializer.is_valid)():
+            logger.error("Payment processing failed: %s", serializer.errors)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        payment = await serializer.acreate(dict(serializer.validated_data))
+        # Check payment status with GMO API
+        status_response = await payment.acheck_payment_status()
+
+        # Proceed only if payment status is "CAPTURE" (successful)
+        if status_response and payment.status == "CAPTURE":
+            error_response = await sync_to_async(settle_captured_payment)(payment)
+            if error_response is not None:
+                return error_response
+
+        data = await sync_to_async(lambda: GMOCreditPaymentSerializer(payment).data)()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AsyncCheckGMOPaymentStatusView(AsyncAPIView):
+    """
+    API to check the status of a specific payment.
+    Endpoint: `/gmo-pg/credit-card/payment-status/{order_id}/`
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, order_id):
+        payment = await sync_to_async(
+            lambda: payments_visible_to(request.user).filter(order_id=order_id).first()
+        )()
+        if payment is None:
+            return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "order_id": order_id,
+            "status": payment.status,
+            "transaction_id": payment.transaction_id,
+            "approval_code": payment.approval_code,
+            "process_date": payment.process_date,
+            "amount": payment.amount,
+            "currency": payment.currency,
+            "card_last4": payment.card_last4,
+        }, status=status.HTTP_200_OK)
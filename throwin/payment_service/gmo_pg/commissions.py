@@ -0,0 +1,53 @@
+"""
+Sales agent commission statements.
+
+When a payment is distributed, `record_commission` adds its sales agent share
+to the `AgentCommission` row of the agent, the restaurant and the month of
+distribution (local time), in the distribution transaction. Statements read
+these rows directly.
+
+`close_months` (run by Celery beat on the first day of each month) closes the
+rows of the months that are over. Closed rows never change: a payment still
+distributed into a closed month, while the close job runs, is booked in the
+following month instead.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AgentCommission
+from . import partitions
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+
+
+def record_commission(sales_agent, restaurant, amount, commission, month=None):
+    """Add a distributed payment to the commission of its agent and restaurant."""
+    month = month or partitions.month_start(timezone.localdate())
+    while True:
+        row, _ = AgentCommission.objects.get_or_create(sales_agent=sales_agent, restaurant=restaurant, month=month)
+        updated = AgentCommission.objects.filter(pk=row.pk, is_closed=False).update(
+            payment_count=F("payment_count") + 1,
+            gross_amount=F("gross_amount") + amount,
+            commission=F("commission") + commission.quantize(CENT),
+        )
+        if updated:
+            return row.pk
+        logger.warning("Commission month %s of agent %s is closed, booking in the next one", month, sales_agent.pk)
+        month = partitions.add_months(month, 1)
+
+
+def close_months(before=None):
+    """
+    Close the open commission rows of the months before `before` (the current
+    month by default). Returns the number of rows closed.
+    """
+    before = partitions.month_start(before or timezone.localdate())
+    return AgentCommission.objects.filter(month__lt=before, is_closed=False).update(
+        is_closed=True, closed_at=timezone.now()
+    )
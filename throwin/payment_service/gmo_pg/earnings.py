@@ -0,0 +1,130 @@
+"""
+Per-staff daily earnings of distributed GMO payments.
+
+`record_distribution` adds a payment to the `StaffDailyEarning` row of its
+staff, store and local day, in the transaction that distributes it. The staff
+earnings endpoint then sums a handful of rows per staff and day range instead
+of grouping the payments of every store of the restaurant.
+
+`rebuild_earnings` recomputes a range of days from the payments, for the
+`rebuild_staff_earnings` command. Days of archived months are never rebuilt,
+their payments are not in the database any more.
+"""
+
+import datetime
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from payment_service import fees
+from .models import ArchivedPaymentMonth, GMOCreditPayment, StaffDailyEarning, payment_shares
+from . import partitions
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+REBUILD_CHUNK_SIZE = 2000
+
+
+def staff_share_of(amount, created_at=None):
+    """The staff share of a payment, rounded like the balance it is credited to."""
+    return payment_shares(amount, fees.policy_at(created_at))[0].quantize(CENT)
+
+
+def record_distribution(payment, staff_share):
+    """Add a distributed payment to its staff's earnings of the day."""
+    earning, _ = StaffDailyEarning.objects.get_or_create(
+        staff_uid=payment.staff_uid,
+        store_uid=payment.store_uid,
+        day=timezone.localdate(payment.created_at),
+    )
+    StaffDailyEarning.objects.filter(pk=earning.pk).update(
+        tip_count=F("tip_count") + 1,
+        gross_amount=F("gross_amount") + payment.amount,
+        net_share=F("net_share") + staff_share.quantize(CENT),
+        last_tip_at=Greatest(Coalesce(F("last_tip_at"), Value(payment.created_at)), Value(payment.created_at)),
+    )
+
+
+def staff_earnings(earnings, date_from=None, date_to=None):
+    """
+    Totals per staff of the `StaffDailyEarning` rows in `earnings` between
+    two days (inclusive), most earning staff first.
+    """
+    if date_from:
+        earnings = earnings.filter(day__gte=date_from)
+    if date_to:
+        earnings = earnings.filter(day__lte=date_to)
+    rows = (
+        earnings.order_by()
+        .values("staff_uid")
+        .annotate(
+            tips=Sum("tip_count"),
+            gross=Sum("gross_amount"),
+            net_share=Sum("net_share"),
+            last_tip_at=Max("last_tip_at"),
+        )
+        .order_by("-gross", "staff_uid")
+    )
+    return [
+        {**row, "average_tip": (row["gross"] / row["tips"]).quantize(CENT) if row["tips"] else Decimal("0.00")}
+        for row in rows
+    ]
+
+
+def first_rebuildable_day():
+    """The first local day whose payments are all still in the database."""
+    last_archived = ArchivedPaymentMonth.objects.order_by("-month").values_list("month", flat=True).first()
+    if last_archived is None:
+        return None
+    _, end = partitions.month_bounds(last_archived)
+    # Archived months are UTC months, the local day they end in is partly archived
+    return timezone.localdate(end) + datetime.timedelta(days=1)
+
+
+def rebuild_earnings(date_from=None, date_to=None):
+    """
+    Recompute the earnings of the days between `date_from` and `date_to`
+    (inclusive, open ended when None) from the distributed payments.
+    Returns the number of rows written.
+    """
+    first_day = first_rebuildable_day()
+    if first_day and (date_from is None or date_from < first_day):
+        logger.info("Earnings before %s belong to archived months and are kept", first_day)
+        date_from = first_day
+
+    payments = GMOCreditPayment.objects.filter(status="CAPTURE", is_distributed=True)
+    tz = timezone.get_current_timezone()
+    if date_from:
+        payments = payments.filter(created_at__gte=datetime.datetime.combine(date_from, datetime.time.min, tzinfo=tz))
+    if date_to:
+        end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+        payments = payments.filter(created_at__lt=end)
+
+    totals = {}
+    rows = payments.order_by("id").values_list("staff_uid", "store_uid", "created_at", "amount")
+    for staff_uid, store_uid, created_at, amount in rows.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        key = (staff_uid, store_uid, timezone.localdate(created_at))
+        earning = totals.get(key)
+        if earning is None:
+            earning = totals[key] = StaffDailyEarning(
+                staff_uid=staff_uid, store_uid=store_uid, day=key[2], last_tip_at=created_at,
+            )
+        earning.tip_count += 1
+        earning.gross_amount += amount
+        earning.net_share += staff_share_of(amount, created_at)
+        earning.last_tip_at = max(earning.last_tip_at, created_at)
+
+    stale = StaffDailyEarning.objects.all()
+    if date_from:
+        stale = stale.filter(day__gte=date_from)
+    if date_to:
+        stale = stale.filter(day__lte=date_to)
+    with transaction.atomic():
+        stale.delete()
+        StaffDailyEarning.objects.bulk_create(totals.values(), batch_size=1000)
+    return len(totals)
@@ -1,5 +1,6 @@
 import uuid
 import os
+import httpx
 import requests
 import logging
 from urllib.parse import parse_qs
@@ -7,11 +8,15 @@ from decimal import Decimal
 from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
 
 from accounts.choices import UserKind  # Importing role choices
+from common.http import get_async_client
+from common.metrics import observe_gateway, record_gateway_error
 from review.models import Review
 from store.models import Store  # ✅ Corrected Import
+from payment_service import fees
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -52,6 +57,16 @@ class Balance(models.Model):
         self.save()
 
 
+def payment_shares(amount, policy=None):
+    """
+    Split a payment amount, after the processing fee, into the shares of the
+    staff, Glow Admin, FC Admin and Sales Agent, under `policy` (the fee
+    policy in effect now by default).
+    """
+    split = fees.split(amount, policy)
+    return split.staff, split.glow_admin, split.fc_admin, split.sales_agent
+
+
 class GMOCreditPayment(models.Model):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -61,8 +76,8 @@ class GMOCreditPayment(models.Model):
     ]
 
     order_id = models.CharField(
-        max_length=50, unique=True, db_index=True,
-        help_text="Unique identifier for the payment transaction"
+        max_length=50, db_index=True,
+        help_text="Unique identifier for the payment transaction (reserved in GMOOrderId)"
     )
     customer = models.ForeignKey(
         settings.AUTH_USER_MODEL,  # Lazy reference to the custom user model
@@ -142,20 +157,52 @@ class GMOCreditPayment(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Analytics: CAPTURE + JPY payments filtered by date range
+            models.Index(fields=["status", "currency", "created_at"], name="gmo_status_currency_created"),
+            # Store scoped histories ordered by newest first
+            models.Index(fields=["store_uid", "created_at"], name="gmo_store_created"),
+        ]
+        constraints = [
+            # The partitioned table can only enforce uniqueness with the partition
+            # key, order ids are unique across months through GMOOrderId
+            models.UniqueConstraint(
+                fields=["order_id", "created_at"], name="payment_service_gmocreditpayment_order_id_created_uniq"
+            ),
+        ]
 
     # ---------------------
     # Dynamic Relationship Properties
     # ---------------------
+    def _get_store(self):
+        """Fetch the store by uid once and keep it on the instance."""
+        if not hasattr(self, "_store"):
+            self._store = Store.objects.select_related(
+                "restaurant__sales_agent"
+            ).filter(uid=self.store_uid).first()
+        return self._store
+
+    @classmethod
+    def attach_stores(cls, payments):
+        """
+        Resolve the stores of many payments with a single query so that
+        serializing a page of payments does not query per row.
+        """
+        store_uids = {payment.store_uid for payment in payments if payment.store_uid}
+        stores = Store.objects.select_related(
+            "restaurant__sales_agent"
+        ).in_bulk(store_uids, field_name="uid")
+        for payment in payments:
+            payment._store = stores.get(payment.store_uid)
+        return payments
+
     @property
     def restaurant(self):
         """
         Dynamically fetch the restaurant based on the store.
         """
-        try:
-            store = Store.objects.get(uid=self.store_uid)
-            return store.restaurant if store else None
-        except Store.DoesNotExist:
-            return None
+        store = self._get_store()
+        return store.restaurant if store else None
 
     @property
     def sales_agent(self):
@@ -173,6 +220,27 @@ class GMOCreditPayment(models.Model):
         Checks the payment status with the GMO API.
         If the status returned is 'CAPTURE', update the model accordingly.
         """
+        url, payload = self._search_trade_request()
+        try:
+            with observe_gateway("gmo", "SearchTrade"):
+                response = requests.post(url, data=payload)
+        except requests.RequestException as e:
+            logger.error("Request to GMO API failed: %s", str(e))
+            return None
+        return self._apply_search_trade(response.status_code, response.text)
+
+    async def acheck_payment_status(self):
+        """`check_payment_status` for async views, awaiting the pooled async client."""
+        url, payload = self._search_trade_request()
+        try:
+            with observe_gateway("gmo", "SearchTrade"):
+                response = await get_async_client().post(url, data=payload)
+        except httpx.HTTPError as e:
+            logger.error("Request to GMO API failed: %s", str(e))
+            return None
+        return await sync_to_async(self._apply_search_trade)(response.status_code, response.text)
+
+    def _search_trade_request(self):
         shop_id = os.environ.get("GMO_SHOP_ID")
         shop_pass = os.environ.get("GMO_SHOP_PASS")
         base_url = os.environ.get("GMO_API_URL")
@@ -182,14 +250,11 @@ class GMOCreditPayment(models.Model):
             "ShopPass": shop_pass,
             "OrderID": self.order_id
         }
-        try:
-            response = requests.post(url, data=payload)
-        except requests.RequestException as e:
-            logger.error("Request to GMO API failed: %s", str(e))
-            return None
+        return url, payload
 
-        if response.status_code == 200:
-            parsed_response = parse_qs(response.text)
+    def _apply_search_trade(self, status_code, text):
+        if status_code == 200:
+            parsed_response = parse_qs(text)
             status_value = parsed_response.get("Status", [None])[0]
             if status_value == "CAPTURE":
                 self.status = "CAPTURE"
@@ -207,7 +272,8 @@ class GMOCreditPayment(models.Model):
                     )
             return parsed_response
         else:
-            logger.error("GMO API responded with status code %s", response.status_code)
+            record_gateway_error("gmo", "SearchTrade")
+            logger.error("GMO API responded with status code %s", status_code)
             return None
 
     def distribute_payment(self):
@@ -215,6 +281,7 @@ class GMOCreditPayment(models.Model):
         Distribute the payment amount to Staff, Glow Admin, FC Admin, and Sales Agent.
         This method calculates commission, net amount, and updates the balances accordingly.
         Distribution is allowed only if payment status is 'CAPTURE'.
+        Returns whether this call distributed it.
         """
         if self.status != "CAPTURE":
             logger.error("Cannot distribute payment for order_id %s as status is not CAPTURE.", self.order_id)
@@ -225,14 +292,17 @@ class GMOCreditPayment(models.Model):
             return
 
         with transaction.atomic():
-            paypal_commission = (self.amount * Decimal("0.036")) + Decimal("40")
-            net_amount = self.amount - paypal_commission
-
-            staff_share = net_amount * Decimal("0.75")
-            management_share = net_amount * Decimal("0.25")
-            glow_share = management_share * Decimal("0.30")
-            fc_share = management_share * Decimal("0.30")
-            sales_agent_share = management_share * Decimal("0.40")
+            # Claim the row, a concurrent job or status check may have distributed it since it was read
+            claimed = GMOCreditPayment.objects.filter(
+                pk=self.pk, status="CAPTURE", is_distributed=False
+            ).update(is_distributed=True)
+            if not claimed:
+                logger.info("Payment with order_id %s has already been distributed.", self.order_id)
+                self.is_distributed = True
+                return False
+
+            policy = fees.policy_at(self.created_at)
+            staff_share, glow_share, fc_share, sales_agent_share = payment_shares(self.amount, policy)
 
             from django.contrib.auth import get_user_model
             User = get_user_model()
@@ -261,9 +331,15 @@ class GMOCreditPayment(models.Model):
                 sales_agent.balance.update_balance(sales_agent_share)
                 logger.info("Sales Agent balance updated by %s for order_id %s", sales_agent_share, self.order_id)
 
+                from .commissions import record_commission
+                record_commission(sales_agent, self.restaurant, self.amount, sales_agent_share)
+
+            from .earnings import record_distribution
+            record_distribution(self, staff_share)
+
             self.is_distributed = True
-            self.save(update_fields=["is_distributed"])
             logger.info("Payment with order_id %s marked as distributed.", self.order_id)
+        return True
 
 
 ## PayPal For Disbursements ##
@@ -358,3 +434,144 @@ class PayPalDisbursement(models.Model):
     
     def __str__(self):
         return f"Disbursement for {self.user} of {self.amount} JPY - {self.status}"
+
+
+class ArchivedPaymentMonth(models.Model):
+    """
+    A month of GMO payments moved out of the database into archive storage.
+
+    Written by `payment_service.gmo_pg.archive.archive_month`. The payments are
+    read back from `path` when a history for that month is requested.
+    """
+    FORMAT_CHOICES = [
+        ("csv", "Gzipped CSV"),
+        ("parquet", "Parquet"),
+    ]
+
+    month = models.DateField(
+        unique=True,
+        help_text="First day of the archived month (UTC)."
+    )
+    path = models.CharField(
+        max_length=255,
+        help_text="Path of the archive file in the archive storage."
+    )
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="csv")
+    row_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text="Sum of the archived payment amounts, to check the file against."
+    )
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-month"]
+
+    def __str__(self):
+        return f"Archived payments {self.month:%Y-%m} ({self.row_count})"
+
+
+class StaffDailyEarning(models.Model):
+    """
+    Distributed GMO payments of a staff member at a store on a day (local time).
+
+    Kept up to date by `payment_service.gmo_pg.earnings.record_distribution`
+    when payments are distributed, and rebuilt from the payments by the
+    `rebuild_staff_earnings` command. Rows outlive archived payments.
+    """
+    staff_uid = models.UUIDField(db_index=True)
+    store_uid = models.UUIDField(blank=True, null=True)
+    day = models.DateField()
+    tip_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text="Sum of the payment amounts."
+    )
+    net_share = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text="Sum of the staff shares credited to the staff balance."
+    )
+    last_tip_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["staff_uid", "store_uid", "day"], name="staff_earning_per_store_day"),
+        ]
+        indexes = [
+            # Owner breakdowns: the stores of a restaurant over a date range
+            models.Index(fields=["store_uid", "day"], name="staff_earning_store_day"),
+        ]
+
+    def __str__(self):
+        return f"Earnings of {self.staff_uid} on {self.day} ({self.tip_count})"
+
+
+class AgentCommission(models.Model):
+    """
+    Commission of a sales agent on the payments of a restaurant distributed
+    during a month (local time).
+
+    Written by `payment_service.gmo_pg.commissions.record_commission` when
+    payments are distributed. Once the month is over it is closed by the month
+    close job and never changes again; it is what the agent is paid for.
+    """
+    sales_agent = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="agent_commissions",
+    )
+    restaurant = models.ForeignKey(
+        "store.Restaurant",
+        on_delete=models.CASCADE,
+        related_name="agent_commissions",
+    )
+    month = models.DateField(help_text="First day of the month of distribution.")
+    payment_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text="Sum of the payment amounts."
+    )
+    commission = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text="Sum of the sales agent shares credited to the agent balance."
+    )
+    is_closed = models.BooleanField(default=False)
+    closed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-month", "restaurant_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sales_agent", "restaurant", "month"], name="agent_commission_per_restaurant_month"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Commission of {self.sales_agent_id} on {self.restaurant_id} for {self.month:%Y-%m}"
+
+
+class GMOOrderId(models.Model):
+    """
+    Every order id taken by a GMO payment, archived ones included.
+
+    Rows are inserted by a database trigger on the payment table (migration
+    0019) whenever an order id is inserted or changed, so a duplicate order id
+    fails with an IntegrityError like a unique column would, across all
+    partitions and archived months.
+    """
+    order_id = models.CharField(max_length=50, primary_key=True)
+
+    def __str__(self):
+        return self.order_id
@@ -0,0 +1,117 @@
+"""
+Monthly range partitions of the GMO payment table.
+
+In Postgres the table is partitioned on `created_at` (migration 0015), one
+partition per UTC month named `<table>_pYYYYMM` plus a default partition for
+rows outside them. Queries filtering on `created_at` only scan the partitions
+of the months they touch, and archived months are dropped as whole partitions.
+
+Partitions have to exist before the month starts, otherwise new payments go to
+the default partition: `create_payment_partitions` (run monthly by Celery beat)
+creates the coming months. On SQLite the table is a plain table and these
+functions do nothing.
+"""
+
+import datetime
+import logging
+
+from django.db import connection, transaction
+
+from .models import GMOCreditPayment
+
+logger = logging.getLogger(__name__)
+
+TABLE = GMOCreditPayment._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """The `[start, end)` datetimes of a month, in UTC."""
+    start = datetime.datetime.combine(month_start(month), datetime.time.min, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime.combine(add_months(month, 1), datetime.time.min, tzinfo=datetime.timezone.utc)
+    return start, end
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def existing_partitions():
+    """Months that have a partition, oldest first."""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{TABLE}_p"
+    return sorted(
+        datetime.datetime.strptime(name[len(prefix):], "%Y%m").date()
+        for name in names
+        if name.startswith(prefix)
+    )
+
+
+def create_partition(month):
+    start, end = month_bounds(month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{TABLE}" '
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+
+def create_partitions(months_ahead=3, today=None):
+    """
+    Create the partitions of the current month and the next `months_ahead`.
+    Returns the names of the partitions created.
+    """
+    if not is_partitioned():
+        return []
+    existing = set(existing_partitions())
+    current = month_start(today or datetime.date.today())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        try:
+            with transaction.atomic():
+                create_partition(month)
+        except Exception as exc:
+            # Fails when the default partition already holds rows of that month
+            logger.error("Could not create partition %s: %s", partition_name(month), exc)
+            continue
+        created.append(partition_name(month))
+    return created
+
+
+def drop_partition(month):
+    """Detach and drop the partition of an archived month."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
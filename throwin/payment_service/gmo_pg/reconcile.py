@@ -0,0 +1,175 @@
+"""
+Reconciliation of the user balances with the distributed GMO payments.
+
+A `Balance` is only ever credited by `distribute_payment` and debited by
+completed PayPal disbursements, so it can be recomputed: `total_received` is
+the sum of the shares of every distributed payment the user took part in, and
+`current_balance` the same minus what was paid out.
+
+`reconcile_balances` streams the distributed payments in primary key chunks
+(each chunk read through a server-side cursor on Postgres), then the archived
+months, and only keeps running totals: per staff uid, per store (for its sales
+agent) and one for each of the Glow and FC admins. Memory grows with the
+number of users and stores, never with the number of payments. The stored
+balances are then read in chunks and compared with the expected ones.
+
+Shares are credited to the recipients `distribute_payment` would pick today:
+the sales agent of the store's restaurant and the first Glow and FC admins. A
+restaurant that changed agent shows up as drift on both agents and should be
+checked by hand before repairing.
+
+Payments are only read up to the last id of when the run started. Payments
+distributed while it runs still reach the balances, run it (and above all
+repair) while distributions are quiet.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from accounts.choices import UserKind
+from payment_service import fees
+from store.models import Store
+from .archive import read_archived_month
+from .models import ArchivedPaymentMonth, Balance, GMOCreditPayment, PayPalDisbursement, payment_shares
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+DEFAULT_CHUNK_SIZE = 2000
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _distributed_payments(chunk_size):
+    """`(staff_uid, store_uid, amount, created_at)` of every distributed payment, archived months included."""
+    upto = GMOCreditPayment.objects.aggregate(last=Max("id"))["last"] or 0
+    payments = (
+        GMOCreditPayment.objects.filter(status="CAPTURE", is_distributed=True, id__lte=upto)
+        .order_by("id")
+        .values_list("id", "staff_uid", "store_uid", "amount", "created_at")
+    )
+    last_id = 0
+    while True:
+        count = 0
+        for last_id, staff_uid, store_uid, amount, created_at in payments.filter(id__gt=last_id)[:chunk_size].iterator(
+            chunk_size=chunk_size
+        ):
+            count += 1
+            yield staff_uid, store_uid, amount, created_at
+        if count < chunk_size:
+            break
+
+    for archive in ArchivedPaymentMonth.objects.order_by("month"):
+        for payment in read_archived_month(archive, {"status": ["CAPTURE"], "is_distributed": [True]}):
+            yield payment.staff_uid, payment.store_uid, payment.amount, payment.created_at
+
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def expected_credits(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    `({user id: total of the shares credited to them}, number of payments)`,
+    with the shares rounded like each balance update rounds them.
+    """
+    by_staff = defaultdict(Decimal)
+    by_store = defaultdict(Decimal)
+    glow_total = fc_total = Decimal("0")
+    payments = 0
+    for staff_uid, store_uid, amount, created_at in _distributed_payments(chunk_size):
+        staff_share, glow_share, fc_share, sales_agent_share = payment_shares(amount, fees.policy_at(created_at))
+        by_staff[staff_uid] += staff_share.quantize(CENT)
+        by_store[store_uid] += sales_agent_share.quantize(CENT)
+        glow_total += glow_share.quantize(CENT)
+        fc_total += fc_share.quantize(CENT)
+        payments += 1
+
+    User = get_user_model()
+    credits = defaultdict(Decimal)
+    for uids in _chunks(by_staff):
+        for uid, user_id in User.objects.filter(uid__in=uids).values_list("uid", "id"):
+            credits[user_id] += by_staff[uid]
+    for uids in _chunks(by_store):
+        stores = Store.objects.filter(uid__in=uids, restaurant__sales_agent__isnull=False)
+        for uid, agent_id in stores.values_list("uid", "restaurant__sales_agent_id"):
+            credits[agent_id] += by_store[uid]
+    for kind, total in ((UserKind.GLOW_ADMIN, glow_total), (UserKind.FC_ADMIN, fc_total)):
+        admin_id = User.objects.filter(kind=kind).values_list("id", flat=True).first()
+        if admin_id is not None and total:
+            credits[admin_id] += total
+    return credits, payments
+
+
+def reconcile_balances(chunk_size=DEFAULT_CHUNK_SIZE, tolerance=Decimal("0"), repair=False):
+    """
+    Compare every `Balance` with the payments and payouts behind it.
+
+    Returns a report: the number of payments and balances read, the balances
+    that drift by more than `tolerance` (stored and expected values) and, when
+    `repair` is set, how many of them were set to the expected values.
+    """
+    credits, payments = expected_credits(chunk_size)
+    paid_out = dict(
+        PayPalDisbursement.objects.filter(status="COMPLETED")
+        .order_by()
+        .values("user_id")
+        .annotate(total=Sum("amount"))
+        .values_list("user_id", "total")
+    )
+
+    drifts = []
+    balances = 0
+    rows = Balance.objects.order_by("id").values_list("id", "user_id", "current_balance", "total_received")
+    for balance_id, user_id, current_balance, total_received in rows.iterator(chunk_size=chunk_size):
+        balances += 1
+        expected_total = credits.get(user_id, Decimal("0")).quantize(CENT)
+        expected_current = expected_total - paid_out.get(user_id, Decimal("0"))
+        if abs(total_received - expected_total) <= tolerance and abs(current_balance - expected_current) <= tolerance:
+            continue
+        drifts.append({
+            "balance_id": balance_id,
+            "user_id": user_id,
+            "current_balance": current_balance,
+            "expected_current_balance": expected_current,
+            "total_received": total_received,
+            "expected_total_received": expected_total,
+        })
+
+    repaired = repair_balances(drifts) if repair else 0
+    logger.info(
+        "Reconciled %s balances against %s payments: %s drifting, %s repaired",
+        balances, payments, len(drifts), repaired,
+    )
+    return {"payments": payments, "balances": balances, "drifts": drifts, "repaired": repaired}
+
+
+def repair_balances(drifts):
+    """
+    Set the drifting balances to their expected values. A balance that changed
+    since it was read is left alone. Returns the number of balances repaired.
+    """
+    repaired = 0
+    for chunk in _chunks(drifts):
+        with transaction.atomic():
+            for drift in chunk:
+                updated = Balance.objects.filter(
+                    id=drift["balance_id"],
+                    current_balance=drift["current_balance"],
+                    total_received=drift["total_received"],
+                ).update(
+                    current_balance=drift["expected_current_balance"],
+                    total_received=drift["expected_total_received"],
+                    last_updated=timezone.now(),
+                )
+                if not updated:
+                    logger.warning("Balance %s changed while reconciling, not repaired", drift["balance_id"])
+                repaired += updated
+    return repaired
@@ -2,13 +2,20 @@ import os
 import logging
 import uuid
 
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
-from accounts.models import User
-from store.models import Store
-from .models import GMOCreditPayment
+from common.http import get_async_client
+from common.metrics import observe_gateway, record_gateway_error
+from payment_service import fees
+from payment_service.models import FeePolicy
+from store.config import get_store_config
+from store.membership import get_staff_membership
+from .models import AgentCommission, GMOCreditPayment
 from review.models import Review
 
 logger = logging.getLogger(__name__)
@@ -75,19 +82,17 @@ class GMOCreditPaymentSerializer(serializers.ModelSerializer):
         store_uid = data["store_uid"]
 
         # Validate Store existence
-        try:
-            store = Store.objects.get(uid=store_uid)
-        except Store.DoesNotExist:
+        store = get_store_config(store_uid)
+        if store is None:
             raise serializers.ValidationError("Invalid store_uid: Store does not exist.")
 
-        # Validate Staff existence
-        try:
-            staff = User.objects.get(uid=staff_uid, kind="restaurant_staff")
-        except User.DoesNotExist:
+        # Validate Staff existence, one lookup in the membership index
+        membership = get_staff_membership(staff_uid)
+        if membership is None:
             raise serializers.ValidationError("Invalid staff_uid: Staff does not exist.")
 
         # Ensure staff belongs to the detected restaurant
-        if not store.restaurant.restaurant_users.filter(user=staff, role="restaurant_staff").exists():
+        if not membership.works_at_restaurant(store.restaurant_id):
             raise serializers.ValidationError("The staff does not belong to the detected restaurant.")
 
         return data
@@ -97,35 +102,49 @@ class GMOCreditPaymentSerializer(serializers.ModelSerializer):
         Step 1: Register Payment (`EntryTran`)
         Step 2: Execute Payment using Token (`ExecTran`)
         """
-        staff_uid = validated_data["staff_uid"]
-        store_uid = validated_data["store_uid"]
-        amount = validated_data["amount"]
-        token = validated_data["token"]
-        message = validated_data.pop("message", None)
+        order = self._prepare_order(validated_data)
+        entry_response = self._send_gmo_request(f"{GMO_API_URL}/payment/EntryTran.idPass", order["entry_payload"])
+        exec_payload = self._exec_payload(order, entry_response)
+        exec_response = self._send_gmo_request(f"{GMO_API_URL}/payment/ExecTran.idPass", exec_payload)
+        return self._record_payment(order, entry_response, exec_response)
 
-        customer = self.context["request"].user if self.context["request"].user.is_authenticated else None
-        nickname = customer.username if customer else validated_data.get("nickname", "Anonymous")
+    async def acreate(self, validated_data):
+        """`create` for async views, the GMO calls go through the pooled async client."""
+        order = self._prepare_order(validated_data)
+        entry_response = await self._asend_gmo_request(f"{GMO_API_URL}/payment/EntryTran.idPass", order["entry_payload"])
+        exec_payload = self._exec_payload(order, entry_response)
+        exec_response = await self._asend_gmo_request(f"{GMO_API_URL}/payment/ExecTran.idPass", exec_payload)
+        return await sync_to_async(self._record_payment)(order, entry_response, exec_response)
 
-        # Detect restaurant and sales agent dynamically
-        store = Store.objects.get(uid=store_uid)
-        restaurant = store.restaurant
-        sales_agent = restaurant.sales_agent if restaurant else None
+    def _prepare_order(self, validated_data):
+        amount = validated_data["amount"]
+        customer = self.context["request"].user if self.context["request"].user.is_authenticated else None
 
         # Generate a unique Order ID
         order_id = f"ORDER{uuid.uuid4().hex[:12]}"
 
-        # Step 1: Register the Payment (`EntryTran`)
-        entry_payload = {
-            "ShopID": GMO_SHOP_ID,
-            "ShopPass": GMO_SHOP_PASS,
-            "OrderID": order_id,
-            "JobCd": "CAPTURE",
-            "Amount": int(amount),
-            "TdFlag": "1",
+        return {
+            "order_id": order_id,
+            "customer": customer,
+            "nickname": customer.username if customer else validated_data.get("nickname", "Anonymous"),
+            "staff_uid": validated_data["staff_uid"],
+            "store_uid": validated_data["store_uid"],
+            "amount": amount,
+            "token": validated_data["token"],
+            "message": validated_data.pop("message", None),
+            # Step 1: Register the Payment (`EntryTran`)
+            "entry_payload": {
+                "ShopID": GMO_SHOP_ID,
+                "ShopPass": GMO_SHOP_PASS,
+                "OrderID": order_id,
+                "JobCd": "CAPTURE",
+                "Amount": int(amount),
+                "TdFlag": "1",
+            },
         }
 
-        entry_response = self._send_gmo_request(f"{GMO_API_URL}/payment/EntryTran.idPass", entry_payload)
-
+    @staticmethod
+    def _exec_payload(order, entry_response):
         # Extract access details from the response
         access_id = entry_response.get("AccessID")
         access_pass = entry_response.get("AccessPass")
@@ -135,28 +154,29 @@ class GMOCreditPaymentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"error": "Invalid EntryTran response", "details": entry_response})
 
         # Step 2: Execute Payment using Token (`ExecTran`)
-        exec_payload = {
+        return {
             "AccessID": access_id,
             "AccessPass": access_pass,
-            "OrderID": order_id,
+            "OrderID": order["order_id"],
             "Method": "1",
-            "Token": token,
+            "Token": order["token"],
         }
 
-        exec_response = self._send_gmo_request(f"{GMO_API_URL}/payment/ExecTran.idPass", exec_payload)
-
+    @staticmethod
+    def _record_payment(order, entry_response, exec_response):
         # Create and store payment record in DB
+        message = order["message"]
         payment = GMOCreditPayment.objects.create(
-            order_id=order_id,
-            customer=customer,
-            nickname=nickname,
-            staff_uid=staff_uid,
-            store_uid=store_uid,
-            amount=amount,
+            order_id=order["order_id"],
+            customer=order["customer"],
+            nickname=order["nickname"],
+            staff_uid=order["staff_uid"],
+            store_uid=order["store_uid"],
+            amount=order["amount"],
             currency="JPY",
-            access_id=access_id,
-            access_pass=access_pass,
-            token=token,
+            access_id=entry_response["AccessID"],
+            access_pass=entry_response["AccessPass"],
+            token=order["token"],
             status=exec_response.get("ACS", "PENDING"),
             transaction_id=exec_response.get("TranID"),
             approval_code=exec_response.get("Approve"),
@@ -174,10 +194,12 @@ class GMOCreditPaymentSerializer(serializers.ModelSerializer):
 
     def _send_gmo_request(self, url, payload):
         """Send a request to the GMO API and handle response."""
+        operation = url.rsplit("/", 1)[-1].split(".")[0]
         try:
-            response = requests.post(url, data=payload)
-            response.raise_for_status()
-            return dict(item.split("=") for item in response.text.split("&"))
+            with observe_gateway("gmo", operation):
+                response = requests.post(url, data=payload)
+                response.raise_for_status()
+            return self._parse_gmo_response(operation, response.text)
         except requests.exceptions.RequestException as e:
             logger.error("GMO API request failed: %s", str(e))
             raise serializers.ValidationError({"error": "Failed to communicate with GMO API", "details": str(e)})
@@ -185,3 +207,123 @@ class GMOCreditPaymentSerializer(serializers.ModelSerializer):
             logger.error("Unexpected error during GMO API communication: %s", str(e))
             raise serializers.ValidationError(
                 {"error": "Unexpected error during GMO API communication", "details": str(e)})
+
+    async def _asend_gmo_request(self, url, payload):
+        """`_send_gmo_request` awaiting the pooled async client."""
+        operation = url.rsplit("/", 1)[-1].split(".")[0]
+        try:
+            with observe_gateway("gmo", operation):
+                response = await get_async_client().post(url, data=payload)
+                response.raise_for_status()
+            return self._parse_gmo_response(operation, response.text)
+        except httpx.HTTPError as e:
+            logger.error("GMO API request failed: %s", str(e))
+            raise serializers.ValidationError({"error": "Failed to communicate with GMO API", "details": str(e)})
+        except Exception as e:
+            logger.error("Unexpected error during GMO API communication: %s", str(e))
+            raise serializers.ValidationError(
+                {"error": "Unexpected error during GMO API communication", "details": str(e)})
+
+    @staticmethod
+    def _parse_gmo_response(operation, text):
+        result = dict(item.split("=") for item in text.split("&"))
+        if "ErrCode" in result:
+            record_gateway_error("gmo", operation)
+        return result
+
+
+class StaffEarningsQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False, help_text="First day, inclusive (YYYY-MM-DD)")
+    date_to = serializers.DateField(required=False, help_text="Last day, inclusive (YYYY-MM-DD)")
+    store_uid = serializers.UUIDField(required=False, help_text="Only this store")
+
+    def validate(self, attrs):
+        if attrs.get("date_from") and attrs.get("date_to") and attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError({"date_to": "Must not be before date_from."})
+        return attrs
+
+
+class StaffEarningSerializer(serializers.Serializer):
+    staff_uid = serializers.UUIDField()
+    staff_name = serializers.CharField(allow_null=True)
+    tips = serializers.IntegerField(help_text="Number of distributed payments")
+    gross = serializers.DecimalField(max_digits=14, decimal_places=2, help_text="Sum of the payment amounts")
+    net_share = serializers.DecimalField(max_digits=14, decimal_places=2, help_text="Sum of the staff shares")
+    average_tip = serializers.DecimalField(max_digits=14, decimal_places=2)
+    last_tip_at = serializers.DateTimeField(allow_null=True)
+
+
+class AgentCommissionSerializer(serializers.ModelSerializer):
+    sales_agent_uid = serializers.UUIDField(source="sales_agent.uid", read_only=True)
+    sales_agent_name = serializers.CharField(source="sales_agent.name", read_only=True)
+    restaurant_uid = serializers.UUIDField(source="restaurant.uid", read_only=True)
+    restaurant_name = serializers.CharField(source="restaurant.name", read_only=True)
+    month = serializers.DateField(format="%Y-%m", read_only=True)
+
+    class Meta:
+        model = AgentCommission
+        fields = [
+            "month", "sales_agent_uid", "sales_agent_name", "restaurant_uid", "restaurant_name",
+            "payment_count", "gross_amount", "commission", "is_closed", "closed_at",
+        ]
+        read_only_fields = fields
+
+
+class FeeSimulationSerializer(serializers.Serializer):
+    """
+    A date range and a candidate policy: an existing version, the policy in
+    effect now by default, with the rates given here changed. A candidate
+    started from the default policy rounds to the cent unless told otherwise,
+    the legacy rounding is not offered for new policies.
+    """
+    date_from = serializers.DateField(help_text="First day, inclusive (YYYY-MM-DD)")
+    date_to = serializers.DateField(help_text="Last day, inclusive (YYYY-MM-DD)")
+    version = serializers.IntegerField(required=False, help_text="Start from this fee policy version")
+    fee_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    fixed_fee = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    staff_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    glow_admin_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    fc_admin_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    sales_agent_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    rounding = serializers.ChoiceField(choices=list(fees.ROUNDING_UNITS), required=False)
+
+    def validate(self, attrs):
+        if attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError({"date_to": "Must not be before date_from."})
+        if "version" in attrs:
+            base = FeePolicy.objects.filter(version=attrs["version"]).first()
+            if base is None:
+                raise serializers.ValidationError({"version": "No fee policy with this version."})
+            base = base.as_policy()
+        else:
+            base = fees.policy_at()
+
+        rates = {field: attrs.get(field, getattr(base, field)) for field in fees.Policy._fields}
+        if rates["rounding"] not in fees.ROUNDING_UNITS:
+            rates["rounding"] = "cent"
+        candidate = FeePolicy(**{
+            field: value for field, value in rates.items() if field not in ("version", "effective_from")
+        })
+        try:
+            candidate.clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.message_dict if hasattr(exc, "error_dict") else exc.messages)
+        attrs["candidate"] = fees.Policy(**rates)
+        return attrs
+
+
+class FeeSplitSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=16, decimal_places=2, help_text="Sum of the payment amounts")
+    fee = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net = serializers.DecimalField(max_digits=16, decimal_places=2)
+    staff = serializers.DecimalField(max_digits=16, decimal_places=2)
+    glow_admin = serializers.DecimalField(max_digits=16, decimal_places=2)
+    fc_admin = serializers.DecimalField(max_digits=16, decimal_places=2)
+    sales_agent = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class FeeSimulationResultSerializer(serializers.Serializer):
+    payments = serializers.IntegerField(help_text="Number of distributed payments replayed")
+    current = FeeSplitSerializer(help_text="Totals under the policies the payments were split by")
+    candidate = FeeSplitSerializer(help_text="Totals under the candidate policy")
+    difference = FeeSplitSerializer(help_text="Candidate minus current")
@@ -0,0 +1,163 @@
+"""
+Local stand-in for the GMO PG idPass endpoints used by the tip flow.
+
+Implements ``EntryTran``, ``ExecTran`` and ``SearchTrade`` with the same
+``key=value&key=value`` response format as GMO, plus configurable latency
+and error injection. Used by the ``loadtest_tips`` command and the tests;
+never point production at it: it refuses to start with DEBUG off unless
+``confirm_not_production`` is set.
+"""
+
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+from django.utils import timezone
+
+from common.utils import ensure_not_production
+
+logger = logging.getLogger(__name__)
+
+
+class GMOStubServer:
+    """
+    Threaded HTTP server emulating GMO PG.
+
+    - ``latency``/``jitter``: seconds added to every response.
+    - ``error_rate``: fraction of calls that fail.
+    - ``error_mode``: ``"gmo"`` answers with a GMO ``ErrCode`` body,
+      ``"http"`` answers with HTTP 503.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_mode="gmo", seed=None, confirm_not_production=False):
+        ensure_not_production("The GMO stub", confirm_not_production)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_mode = error_mode
+        self.random = random.Random(seed)
+        self.orders = {}
+        self.calls = {"EntryTran": 0, "ExecTran": 0, "SearchTrade": 0}
+        self.errors = {"EntryTran": 0, "ExecTran": 0, "SearchTrade": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("GMO stub listening on %s", self.url)
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ---------------------
+    # Request handling
+    # ---------------------
+    def handle(self, operation, params):
+        """Return ``(http_status, body)`` for one GMO call."""
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        with self._lock:
+            self.calls[operation] += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors[operation] += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            if self.error_mode == "http":
+                return 503, "Service Unavailable"
+            return 200, urlencode({"ErrCode": "E01", "ErrInfo": "E01999999"})
+        return getattr(self, f"_{operation}")(params)
+
+    def _EntryTran(self, params):
+        order_id = params.get("OrderID")
+        access_id, access_pass = uuid.uuid4().hex, uuid.uuid4().hex
+        with self._lock:
+            self.orders[order_id] = {
+                "AccessID": access_id,
+                "AccessPass": access_pass,
+                "Amount": params.get("Amount"),
+                "Status": "UNPROCESSED",
+            }
+        return 200, urlencode({"AccessID": access_id, "AccessPass": access_pass})
+
+    def _ExecTran(self, params):
+        order_id = params.get("OrderID")
+        with self._lock:
+            order = self.orders.get(order_id)
+            if not order or order["AccessID"] != params.get("AccessID"):
+                return 200, urlencode({"ErrCode": "E01", "ErrInfo": "E01110002"})
+            order["Status"] = "CAPTURE"
+            order["TranID"] = uuid.uuid4().hex[:28]
+        return 200, urlencode({
+            "ACS": "0",
+            "OrderID": order_id,
+            "Forward": "2a99662",
+            "Method": "1",
+            "Approve": f"{self.random.randrange(10 ** 7):07d}",
+            "TranID": order["TranID"],
+            "TranDate": timezone.now().strftime("%Y%m%d%H%M%S"),
+            "CardNo": "************1111",
+            "Expire": "3012",
+        })
+
+    def _SearchTrade(self, params):
+        with self._lock:
+            order = self.orders.get(params.get("OrderID"))
+        if not order:
+            return 200, urlencode({"ErrCode": "E01", "ErrInfo": "E01110002"})
+        return 200, urlencode({
+            "OrderID": params.get("OrderID"),
+            "Status": order["Status"],
+            "Amount": order["Amount"],
+            "TranID": order.get("TranID", ""),
+        })
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                operation = self.path.rsplit("/", 1)[-1].split(".")[0]
+                length = int(self.headers.get("Content-Length") or 0)
+                params = {
+                    key: values[0]
+                    for key, values in parse_qs(self.rfile.read(length).decode()).items()
+                }
+                if operation not in server.calls:
+                    status_code, body = 404, "Not Found"
+                else:
+                    status_code, body = server.handle(operation, params)
+                payload = body.encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug("GMO stub: " + format, *args)
+
+        return Handler
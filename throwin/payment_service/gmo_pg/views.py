@@ -1,18 +1,44 @@
+import datetime
 import logging
+from itertools import islice
 
 from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions, pagination, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+
 from accounts.choices import UserKind
-from gacha.models import SpinBalance
-from store.models import Store
-from .models import GMOCreditPayment
-from .serializers import GMOCreditPaymentSerializer
+from common import feed
+from common.idempotency import IdempotentCreateMixin
+from common.permissions import (
+    CheckAnyPermission,
+    IsFCAdminUser,
+    IsGlowAdminUser,
+    IsRestaurantOwnerUser,
+    IsSalesAgentUser,
+    IsSuperAdminUser,
+)
+from gacha.spins import credit_spend
+from payment_service import fees
+from payment_service.recent_messages import push_message
+from .archive import read_archived_month
+from .earnings import staff_earnings
+from .models import AgentCommission, ArchivedPaymentMonth, GMOCreditPayment, StaffDailyEarning
+from .serializers import (
+    AgentCommissionSerializer,
+    FeeSimulationResultSerializer,
+    FeeSimulationSerializer,
+    GMOCreditPaymentSerializer,
+    StaffEarningSerializer,
+    StaffEarningsQuerySerializer,
+)
 
 User = get_user_model()
 
@@ -27,13 +53,138 @@ class StandardResultsPagination(pagination.PageNumberPagination):
     max_page_size = 100
 
 
+class ArchivedPaymentPagination(StandardResultsPagination):
+    """
+    Pages of a stream of archived payments: only the rows up to the requested
+    page are read. There is no total count, it would need the whole archive.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.number = 0
+        if self.number < 1:
+            raise NotFound("Invalid page.")
+        start = (self.number - 1) * page_size
+        # One more row tells whether there is a next page
+        page = list(islice(queryset, start, start + page_size + 1))
+        self.has_next = len(page) > page_size
+        return page[:page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        del response_schema["properties"]["count"]
+        response_schema["required"].remove("count")
+        return response_schema
+
+
+def settle_captured_payment(payment):
+    """
+    Credit the staff score and the consumer's spins for a captured payment and
+    distribute it. Returns an error response when the staff or store is gone.
+    """
+    try:
+        # Use a string literal for the type annotation to avoid Pylance errors
+        staff: "User" = User.objects.get(uid=payment.staff_uid)
+    except User.DoesNotExist:
+        logger.error("Staff user with uid %s not found", payment.staff_uid)
+        return Response({"error": "Staff user not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    staff_profile = staff.profile
+    staff_profile.total_score += int(payment.amount)
+    staff_profile.save(update_fields=['total_score'])
+
+    if payment.customer_id:
+        # Also the store (and sales agent) distribute_payment uses below
+        store = payment._get_store()
+        if store is None:
+            logger.error("Store with uid %s not found", payment.store_uid)
+            return Response({"error": "Store not found"}, status=status.HTTP_404_NOT_FOUND)
+        credit_spend(payment.customer_id, store, payment.amount)
+
+    # Distribute the net payment to Staff, Glow Admin, FC Admin, and Sales Agent.
+    # Note: The distribute_payment() method itself includes a guard for payment status.
+    payment.distribute_payment()
+    push_message(payment.staff_uid, payment.message, payment.created_at, payment.nickname)
+    feed.publish(
+        "tip.captured",
+        {
+            "uid": payment.order_id,
+            "staff_uid": payment.staff_uid,
+            "store_uid": payment.store_uid,
+            "amount": payment.amount,
+            "nickname": payment.nickname,
+            "message": payment.message,
+            "created_at": payment.created_at,
+        },
+        staff_uid=payment.staff_uid,
+        store_uid=payment.store_uid,
+    )
+    return None
+
+
+def payment_scope(user):
+    """
+    The GMO payments the user may see, by role, as `(field, values)`: the
+    payments whose `field` is in `values`. None means every payment.
+    """
+    if user.kind == UserKind.RESTAURANT_STAFF:
+        return "staff_uid", {user.uid}  # Only their received payments
+    if user.kind == UserKind.CONSUMER:
+        return "customer_id", {user.id}  # Only their own payments
+    if user.kind == UserKind.RESTAURANT_OWNER:
+        restaurant = user.get_restaurant_owner_restaurant
+        if not restaurant:
+            return "store_uid", set()  # No access if no linked restaurant
+        return "store_uid", {store.uid for store in restaurant.stores.all()}
+    if user.kind == UserKind.SALES_AGENT:
+        agent_restaurants = user.get_agent_restaurants or []
+        return "store_uid", {store.uid for restaurant in agent_restaurants for store in restaurant.stores.all()}
+    if user.kind in [UserKind.SUPER_ADMIN, UserKind.FC_ADMIN, UserKind.GLOW_ADMIN]:
+        return None
+    return "id", set()  # Deny access if unauthorized
+
+
+def payments_visible_to(user):
+    """GMO payments the user may see, scoped by role."""
+    scope = payment_scope(user)
+    if scope is None:
+        return GMOCreditPayment.objects.all()
+    field, values = scope
+    if not values:
+        return GMOCreditPayment.objects.none()
+    return GMOCreditPayment.objects.filter(**{f"{field}__in": values})
+
+
 # ------------------------------------
 # ✅ 1. API to Create & Process Payment
 # ------------------------------------
-class GMOCreditCardPaymentView(generics.CreateAPIView):
+class GMOCreditCardPaymentView(IdempotentCreateMixin, generics.CreateAPIView):
     """
     API to process GMO PG credit card payment.
     Endpoint: `/gmo-pg/credit-card/`
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    returns the first response instead of charging the card again.
     """
     serializer_class = GMOCreditPaymentSerializer
     permission_classes = [permissions.AllowAny]  # Supports anonymous payments
@@ -48,35 +199,9 @@ class GMOCreditCardPaymentView(generics.CreateAPIView):
 
             # Proceed only if payment status is "CAPTURE" (successful)
             if status_response and payment.status == "CAPTURE":
-                try:
-                    # Use a string literal for the type annotation to avoid Pylance errors
-                    staff: "User" = User.objects.get(uid=payment.staff_uid)
-                except User.DoesNotExist:
-                    logger.error("Staff user with uid %s not found", payment.staff_uid)
-                    return Response({"error": "Staff user not found"}, status=status.HTTP_404_NOT_FOUND)
-                
-                staff_profile = staff.profile
-                staff_profile.total_score += int(payment.amount)
-                staff_profile.save(update_fields=['total_score'])
-
-                if payment.customer:
-                    try:
-                        store = Store.objects.get(uid=payment.store_uid)
-                    except Store.DoesNotExist:
-                        logger.error("Store with uid %s not found", payment.store_uid)
-                        return Response({"error": "Store not found"}, status=status.HTTP_404_NOT_FOUND)
-                    spin_balance, created = SpinBalance.objects.get_or_create(
-                        consumer=payment.customer,
-                        store=store,
-                        restaurant=store.restaurant
-                    )
-                    spin_balance.refresh_from_db(fields=['total_spend'])
-                    spin_balance.total_spend += payment.amount
-                    spin_balance.save()
-
-                # Distribute the net payment to Staff, Glow Admin, FC Admin, and Sales Agent.
-                # Note: The distribute_payment() method itself includes a guard for payment status.
-                payment.distribute_payment()
+                error_response = settle_captured_payment(payment)
+                if error_response is not None:
+                    return error_response
 
             return Response(GMOCreditPaymentSerializer(payment).data, status=status.HTTP_201_CREATED)
         else:
@@ -104,32 +229,20 @@ class RoleBasedPaymentHistoryView(generics.ListAPIView):
     pagination_class = StandardResultsPagination
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = GMOCreditPayment.objects.all()
-
-        if user.kind == UserKind.RESTAURANT_STAFF:
-            queryset = queryset.filter(staff_uid=user.uid)  # Only their received payments
-        elif user.kind == UserKind.CONSUMER:
-            queryset = queryset.filter(customer=user)  # Only their own payments
-        elif user.kind == UserKind.RESTAURANT_OWNER:
-            restaurant = user.get_restaurant_owner_restaurant
-            if restaurant:
-                queryset = queryset.filter(store_uid__in=[store.uid for store in restaurant.stores.all()])
-            else:
-                queryset = GMOCreditPayment.objects.none()  # No access if no linked restaurant
-        elif user.kind == UserKind.SALES_AGENT:
-            agent_restaurants = user.get_agent_restaurants or []
-            store_uids = [store.uid for restaurant in agent_restaurants for store in restaurant.stores.all()]
-            queryset = queryset.filter(store_uid__in=store_uids)
-        elif user.kind not in [UserKind.SUPER_ADMIN, UserKind.FC_ADMIN, UserKind.GLOW_ADMIN]:
-            queryset = GMOCreditPayment.objects.none()  # Deny access if unauthorized
+        queryset = payments_visible_to(self.request.user)
 
         # Filtering by detected store, restaurant, or sales agent
         store_uid = self.request.query_params.get("store_uid")
         if store_uid:
             queryset = queryset.filter(store_uid=store_uid)
 
-        return queryset
+        return queryset.select_related("customer")
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            GMOCreditPayment.attach_stores(page)
+        return page
 
 
 # --------------------------------------------
@@ -144,7 +257,7 @@ class CheckGMOPaymentStatusView(APIView):
 
     def get(self, request, order_id):
         try:
-            payment = GMOCreditPayment.objects.get(order_id=order_id)
+            payment = payments_visible_to(request.user).get(order_id=order_id)
             return Response({
                 "order_id": order_id,
                 "status": payment.status,
@@ -157,3 +270,166 @@ class CheckGMOPaymentStatusView(APIView):
             }, status=status.HTTP_200_OK)
         except GMOCreditPayment.DoesNotExist:
             return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+# --------------------------------------------------
+# ✅ 4. Role-Based API to Retrieve Archived Payments
+# --------------------------------------------------
+class ArchivedPaymentHistoryView(generics.ListAPIView):
+    """
+    Payment history of a month moved to archive storage, scoped by role like
+    the payment history. The archive is streamed up to the requested page.
+    Endpoint: `/gmo-pg/credit-card/payment-history/archive/{year}/{month}/`
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = GMOCreditPaymentSerializer
+    pagination_class = ArchivedPaymentPagination
+
+    def get_queryset(self):
+        try:
+            month = datetime.date(self.kwargs["year"], self.kwargs["month"], 1)
+        except ValueError:
+            raise NotFound("Invalid month.")
+        archive = ArchivedPaymentMonth.objects.filter(month=month).first()
+        if archive is None:
+            raise NotFound("This month is not archived.")
+
+        filters = {}
+        scope = payment_scope(self.request.user)
+        if scope is not None:
+            field, values = scope
+            filters[field] = {str(value) for value in values}
+        store_uid = self.request.query_params.get("store_uid")
+        if store_uid:
+            filters["store_uid"] = filters.get("store_uid", {store_uid}) & {store_uid}
+        # Newest first, the order of the archive file
+        return read_archived_month(archive, filters)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            GMOCreditPayment.attach_stores(page)
+            customers = User.objects.in_bulk({payment.customer_id for payment in page if payment.customer_id})
+            for payment in page:
+                if payment.customer_id:
+                    payment.customer = customers.get(payment.customer_id)
+        return page
+
+
+@extend_schema(
+    summary="Earnings per staff over a date range",
+    parameters=[StaffEarningsQuerySerializer],
+    responses=StaffEarningSerializer(many=True),
+)
+class StaffEarningsView(generics.GenericAPIView):
+    """
+    Tips count, gross amount, net share, average tip and last tip of each
+    staff member, over the stores the user may see (the restaurant of an
+    owner, the restaurants of a sales agent, every store for admins).
+    Read from the per-staff daily earnings, distributed payments only.
+    Endpoint: `/analytics/staff-earnings/`
+    """
+    available_permission_classes = (
+        IsRestaurantOwnerUser,
+        IsSalesAgentUser,
+        IsSuperAdminUser,
+        IsFCAdminUser,
+        IsGlowAdminUser,
+    )
+    permission_classes = (CheckAnyPermission,)
+    serializer_class = StaffEarningSerializer
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        params = StaffEarningsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        earnings = StaffDailyEarning.objects.all()
+        scope = payment_scope(request.user)
+        if scope is not None:
+            field, values = scope
+            earnings = earnings.filter(**{f"{field}__in": values})
+        if filters.get("store_uid"):
+            earnings = earnings.filter(store_uid=filters["store_uid"])
+
+        rows = staff_earnings(earnings, filters.get("date_from"), filters.get("date_to"))
+        names = dict(User.objects.filter(uid__in=[row["staff_uid"] for row in rows]).values_list("uid", "name"))
+        for row in rows:
+            row["staff_name"] = names.get(row["staff_uid"])
+        return Response(self.get_serializer(rows, many=True).data)
+
+
+@extend_schema(
+    summary="Sales agent commission statement",
+    parameters=[
+        OpenApiParameter("month", str, required=False, description="Only this month (YYYY-MM)"),
+        OpenApiParameter("closed", bool, required=False, description="Only closed (true) or open (false) months"),
+        OpenApiParameter("sales_agent_uid", str, required=False, description="Admins only: one agent"),
+    ],
+)
+class AgentCommissionStatementView(generics.ListAPIView):
+    """
+    Commission of sales agents per restaurant and month, newest month first.
+    Sales agents see their own, admins everyone's. Closed months are final and
+    are the ones paid out.
+    Endpoint: `/analytics/agent-commissions/`
+    """
+    available_permission_classes = (
+        IsSalesAgentUser,
+        IsSuperAdminUser,
+        IsFCAdminUser,
+        IsGlowAdminUser,
+    )
+    permission_classes = (CheckAnyPermission,)
+    serializer_class = AgentCommissionSerializer
+    pagination_class = StandardResultsPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        params = self.request.query_params
+        queryset = AgentCommission.objects.select_related("sales_agent", "restaurant")
+        if user.kind == UserKind.SALES_AGENT:
+            queryset = queryset.filter(sales_agent=user)
+        elif params.get("sales_agent_uid"):
+            queryset = queryset.filter(sales_agent__uid=params["sales_agent_uid"])
+
+        if params.get("month"):
+            try:
+                month = datetime.datetime.strptime(params["month"], "%Y-%m").date()
+            except ValueError:
+                raise ValidationError({"month": "Must look like 2024-01."})
+            queryset = queryset.filter(month=month)
+        if params.get("closed") in ("true", "false"):
+            queryset = queryset.filter(is_closed=params["closed"] == "true")
+        return queryset
+
+
+@extend_schema(
+    summary="Replay a date range under a candidate fee policy",
+    request=FeeSimulationSerializer,
+    responses=FeeSimulationResultSerializer,
+)
+class FeeSimulationView(generics.GenericAPIView):
+    """
+    Totals per role (fee, staff, Glow admin, FC admin, sales agent) of the
+    distributed payments of a date range, under the policies they were split
+    by and under a candidate policy, to see the impact of a policy change
+    before publishing it. Nothing is written.
+    Endpoint: `/analytics/fee-simulation/`
+    """
+    available_permission_classes = (
+        IsSuperAdminUser,
+        IsFCAdminUser,
+        IsGlowAdminUser,
+    )
+    permission_classes = (CheckAnyPermission,)
+    serializer_class = FeeSimulationSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        result = fees.simulate(params["date_from"], params["date_to"], params["candidate"])
+        return Response(FeeSimulationResultSerializer(result).data)
@@ -2,6 +2,11 @@ import paypalrestsdk
 from dotenv import load_dotenv
 import os
 import logging
+import time
+from urllib.parse import quote
+
+from common.http import get_async_client
+from common.metrics import observe_gateway, record_gateway_error
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +19,8 @@ logger = logging.getLogger(__name__)
 PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")  # Default to sandbox mode
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
 PAYPAL_CLIENT_SECRET = os.getenv("PAYPAL_CLIENT_SECRET")
+# REST API used by the async helpers, the SDK derives the same host from the mode
+PAYPAL_API_BASE = "https://api-m.paypal.com" if PAYPAL_MODE == "live" else "https://api-m.sandbox.paypal.com"
 
 if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
     logger.error("PayPal client credentials are missing. Please check your environment variables.")
@@ -67,10 +74,13 @@ def create_paypal_payment(amount, currency, description, return_url, cancel_url)
             }
         })
 
-        if payment.create():
+        with observe_gateway("paypal", "create_payment"):
+            created = payment.create()
+        if created:
             logger.info(f"PayPal Payment created successfully: {payment.id}")
             return {"success": True, "payment": payment}
         else:
+            record_gateway_error("paypal", "create_payment")
             error_message = payment.error.get('message', 'Unknown error occurred.')
             logger.error(f"PayPal Payment creation failed: {error_message}")
             return {"success": False, "error": payment.error}
@@ -87,14 +97,71 @@ def execute_paypal_payment(payment_id, payer_id):
     :return: Dictionary with the success status and payment/ error details.
     """
     try:
-        payment = paypalrestsdk.Payment.find(payment_id)
-        if payment.execute({"payer_id": payer_id}):
+        with observe_gateway("paypal", "execute_payment"):
+            payment = paypalrestsdk.Payment.find(payment_id)
+            executed = payment.execute({"payer_id": payer_id})
+        if executed:
             logger.info(f"PayPal Payment executed successfully: {payment.id}")
             return {"success": True, "payment": payment}
         else:
+            record_gateway_error("paypal", "execute_payment")
             error_message = payment.error.get('message', 'Unknown error occurred.')
             logger.error(f"PayPal Payment execution failed: {error_message}")
             return {"success": False, "error": payment.error}
     except Exception as e:
         logger.exception("An error occurred while executing PayPal payment.")
         return {"success": False, "error": str(e)}
+
+
+# ---------------------
+# Async helpers (pooled httpx client) for the async views
+# ---------------------
+_access_token = {"value": None, "expires_at": 0.0}
+
+
+async def _aget_access_token():
+    """Return a cached OAuth token for the REST API, refreshed a minute before it expires."""
+    if _access_token["value"] and _access_token["expires_at"] > time.monotonic():
+        return _access_token["value"]
+
+    with observe_gateway("paypal", "oauth_token"):
+        response = await get_async_client().post(
+            f"{PAYPAL_API_BASE}/v1/oauth2/token",
+            auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
+            headers={"Accept": "application/json"},
+            data={"grant_type": "client_credentials"},
+        )
+        response.raise_for_status()
+    result = response.json()
+    _access_token["value"] = result["access_token"]
+    _access_token["expires_at"] = time.monotonic() + int(result.get("expires_in", 0)) - 60
+    return _access_token["value"]
+
+
+async def aexecute_paypal_payment(payment_id, payer_id):
+    """
+    Async version of `execute_paypal_payment`, calling the REST API directly.
+    :return: Dictionary with the success status and payment (dict)/ error details.
+    """
+    try:
+        token = await _aget_access_token()
+        with observe_gateway("paypal", "execute_payment"):
+            response = await get_async_client().post(
+                f"{PAYPAL_API_BASE}/v1/payments/payment/{quote(payment_id, safe='')}/execute",
+                json={"payer_id": payer_id},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+        if response.is_success:
+            payment = response.json()
+            logger.info(f"PayPal Payment executed successfully: {payment.get('id')}")
+            return {"success": True, "payment": payment}
+        record_gateway_error("paypal", "execute_payment")
+        try:
+            error = response.json()
+        except ValueError:
+            error = {"message": response.text}
+        logger.error(f"PayPal Payment execution failed: {error.get('message', 'Unknown error occurred.')}")
+        return {"success": False, "error": error}
+    except Exception as e:
+        logger.exception("An error occurred while executing PayPal payment.")
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,47 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_service.gmo_pg.archive import ArchiveError, archivable_months, archive_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed months of GMO payments to compressed files in archive storage "
+        "and remove them from the database. Archived months stay readable through "
+        "the archived payment history endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Archive this month only (YYYY-MM).")
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.GMO_ARCHIVE_AFTER_MONTHS,
+            help="Archive every month that ended at least this many months ago.",
+        )
+        parser.add_argument("--format", choices=["csv", "parquet"], default=settings.GMO_ARCHIVE_FORMAT)
+        parser.add_argument("--dry-run", action="store_true", help="List the months without archiving.")
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            try:
+                months = [datetime.datetime.strptime(options["month"], "%Y-%m").date()]
+            except ValueError:
+                raise CommandError("--month must look like 2024-01.")
+        elif options["older_than"] > 0:
+            months = archivable_months(options["older_than"])
+        else:
+            raise CommandError("Pass --month or --older-than (GMO_ARCHIVE_AFTER_MONTHS is not set).")
+
+        for month in months:
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+                continue
+            try:
+                archive = archive_month(month, options["format"])
+            except ArchiveError as exc:
+                self.stderr.write(self.style.WARNING(f"Skipped {month:%Y-%m}: {exc}"))
+                continue
+            self.stdout.write(f"Archived {archive.row_count} payments of {month:%Y-%m} to {archive.path}")
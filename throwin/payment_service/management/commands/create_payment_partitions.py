@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from payment_service.gmo_pg import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of the GMO payment table for the current "
+        "month and the coming ones. Does nothing unless the table is partitioned (Postgres)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3)
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write("The payment table is not partitioned, nothing to do.")
+            return
+        created = partitions.create_partitions(options["months_ahead"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created."))
@@ -0,0 +1,354 @@
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.choices import UserKind
+from accounts.models import UserProfile
+from common.utils import add_not_production_argument, ensure_not_production
+from gacha.models import SpinBalance
+from payment_service.gmo_pg import serializers as gmo_serializers
+from payment_service import fees
+from payment_service.gmo_pg.models import Balance, GMOCreditPayment, payment_shares
+from payment_service.gmo_pg.stub import GMOStubServer
+from store.models import Restaurant, RestaurantUser, Store, StoreUser
+
+User = get_user_model()
+
+TIP_PATH = "/payment_service/gmo-pg/credit-card/"
+FIXTURE_DOMAIN = "loadtest.throwin.invalid"
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def _shares(payment):
+    """Staff and management shares exactly as GMOCreditPayment.distribute_payment computes them."""
+    staff, glow, fc, sales_agent = payment_shares(payment.amount, fees.policy_at(payment.created_at))
+    return {"staff": staff, "glow": glow, "fc": fc, "sales_agent": sales_agent}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the GMO credit card tip flow against a local GMO stub and report "
+        "throughput, latency percentiles, DB query counts and balance consistency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumers", type=int, default=20, help="Number of concurrent virtual consumers.")
+        parser.add_argument("--tips", type=int, default=10, help="Tips sent by each consumer.")
+        parser.add_argument("--staff", type=int, default=5, help="Staff members in the load test restaurant.")
+        parser.add_argument("--stores", type=int, default=2, help="Stores in the load test restaurant.")
+        parser.add_argument(
+            "--hot-ratio", type=float, default=0.5,
+            help="Fraction of tips sent to the same staff and store (contention).",
+        )
+        parser.add_argument("--amounts", default="1000,3000,5000", help="Comma separated tip amounts.")
+        parser.add_argument("--message-ratio", type=float, default=0.2, help="Fraction of tips with a message.")
+        parser.add_argument(
+            "--base-url",
+            help="Drive a running server over HTTP instead of the in-process test client. "
+                 "The server must use the stub as GMO_API_URL.",
+        )
+        parser.add_argument("--gmo-host", default="127.0.0.1", help="Interface the GMO stub binds to.")
+        parser.add_argument("--gmo-port", type=int, default=0, help="Port the GMO stub binds to (0 = random).")
+        parser.add_argument("--gmo-latency-ms", type=float, default=50, help="Latency added to every GMO call.")
+        parser.add_argument("--gmo-jitter-ms", type=float, default=20, help="Random extra latency per GMO call.")
+        parser.add_argument("--gmo-error-rate", type=float, default=0.0, help="Fraction of GMO calls that fail.")
+        parser.add_argument(
+            "--gmo-error-mode", choices=["gmo", "http"], default="gmo",
+            help="Fail with a GMO ErrCode body or with HTTP 503.",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the random tip mix.")
+        add_not_production_argument(parser)
+
+    def handle(self, *args, **options):
+        # The fixture users, tips and the stub gateway must never reach production
+        ensure_not_production("The load test", options["not_production"], error=CommandError)
+        amounts = [Decimal(amount) for amount in options["amounts"].split(",") if amount.strip()]
+        if not amounts:
+            raise CommandError("--amounts must contain at least one amount.")
+
+        fixture = self._setup_fixture(options)
+        plan = self._build_plan(fixture, amounts, options)
+
+        stub = GMOStubServer(
+            host=options["gmo_host"],
+            port=options["gmo_port"],
+            latency=options["gmo_latency_ms"] / 1000,
+            jitter=options["gmo_jitter_ms"] / 1000,
+            error_rate=options["gmo_error_rate"],
+            error_mode=options["gmo_error_mode"],
+            seed=options["seed"],
+            confirm_not_production=True,
+        )
+        with stub:
+            if options["base_url"]:
+                self.stdout.write(self.style.WARNING(
+                    f"Make sure the target server runs with GMO_API_URL={stub.url}"
+                ))
+            else:
+                # Point the in-process payment flow at the stub
+                os.environ["GMO_API_URL"] = stub.url
+                gmo_serializers.GMO_API_URL = stub.url
+
+            before = self._snapshot(fixture)
+            self.stdout.write(self.style.NOTICE(
+                f"Sending {sum(len(tips) for tips in plan.values())} tips from {options['consumers']} consumers "
+                f"({options['hot_ratio']:.0%} to the hot staff)..."
+            ))
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["consumers"]) as executor:
+                results = [
+                    result
+                    for results in executor.map(
+                        lambda tips: self._run_consumer(tips, options["base_url"]), plan.values()
+                    )
+                    for result in results
+                ]
+            elapsed = time.perf_counter() - started
+
+        self._report(results, elapsed, stub)
+        self._check_consistency(fixture, before, results)
+
+    # ---------------------
+    # Fixture
+    # ---------------------
+    def _get_user(self, name, kind):
+        user, created = User.objects.get_or_create(
+            email=f"{name}@{FIXTURE_DOMAIN}",
+            defaults={"name": name, "kind": kind, "is_verified": True},
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+        return user
+
+    def _setup_fixture(self, options):
+        """Create (or reuse) the load test restaurant, stores, staff and consumers."""
+        owner = self._get_user("loadtest-owner", UserKind.RESTAURANT_OWNER)
+        sales_agent = self._get_user("loadtest-agent", UserKind.SALES_AGENT)
+        for kind in (UserKind.GLOW_ADMIN, UserKind.FC_ADMIN):
+            if not User.objects.filter(kind=kind).exists():
+                self._get_user(f"loadtest-{kind}", kind)
+
+        restaurant, _ = Restaurant.objects.get_or_create(
+            restaurant_owner=owner,
+            defaults={"name": "Load Test Restaurant", "sales_agent": sales_agent},
+        )
+        stores = [
+            Store.objects.get_or_create(
+                code=f"loadtest{i}",
+                defaults={"restaurant": restaurant, "name": f"Load Test Store {i}"},
+            )[0]
+            for i in range(options["stores"])
+        ]
+        staff = []
+        for i in range(options["staff"]):
+            user = self._get_user(f"loadtest-staff-{i}", UserKind.RESTAURANT_STAFF)
+            store = stores[i % len(stores)]
+            RestaurantUser.objects.get_or_create(
+                restaurant=restaurant, user=user, defaults={"role": UserKind.RESTAURANT_STAFF},
+            )
+            StoreUser.objects.get_or_create(store=store, user=user, defaults={"role": UserKind.RESTAURANT_STAFF})
+            staff.append((user, store))
+        consumers = [
+            self._get_user(f"loadtest-consumer-{i}", UserKind.CONSUMER)
+            for i in range(options["consumers"])
+        ]
+        return {"restaurant": restaurant, "stores": stores, "staff": staff, "consumers": consumers}
+
+    def _build_plan(self, fixture, amounts, options):
+        """Pre-compute every consumer's tips so the timed section only sends requests."""
+        rng = random.Random(options["seed"])
+        hot_staff, hot_store = fixture["staff"][0]
+        plan = {}
+        for consumer in fixture["consumers"]:
+            token = str(RefreshToken.for_user(consumer).access_token)
+            tips = []
+            for _ in range(options["tips"]):
+                if rng.random() < options["hot_ratio"]:
+                    staff, store = hot_staff, hot_store
+                else:
+                    staff, store = rng.choice(fixture["staff"])
+                payload = {
+                    "staff_uid": str(staff.uid),
+                    "store_uid": str(store.uid),
+                    "amount": str(rng.choice(amounts)),
+                    "token": f"loadtest-{rng.getrandbits(64):x}",
+                }
+                if rng.random() < options["message_ratio"]:
+                    payload["message"] = "Thank you!"
+                tips.append((token, payload))
+            plan[consumer.pk] = tips
+        return plan
+
+    # ---------------------
+    # Load generation
+    # ---------------------
+    def _run_consumer(self, tips, base_url):
+        """Send one virtual consumer's tips sequentially; runs in a worker thread."""
+        results = []
+        session = requests.Session() if base_url else None
+        client = None if base_url else Client()
+        try:
+            for token, payload in tips:
+                queries = {"count": 0, "time": 0.0}
+
+                def count_queries(execute, sql, params, many, context):
+                    started = time.perf_counter()
+                    try:
+                        return execute(sql, params, many, context)
+                    finally:
+                        queries["count"] += 1
+                        queries["time"] += time.perf_counter() - started
+
+                started = time.perf_counter()
+                try:
+                    if base_url:
+                        response = session.post(
+                            base_url.rstrip("/") + TIP_PATH, json=payload,
+                            headers={"Authorization": f"Bearer {token}"}, timeout=60,
+                        )
+                        status_code, body = response.status_code, response.json() if response.content else {}
+                    else:
+                        with connection.execute_wrapper(count_queries):
+                            response = client.post(
+                                TIP_PATH, payload, content_type="application/json",
+                                HTTP_AUTHORIZATION=f"Bearer {token}",
+                            )
+                        status_code, body = response.status_code, response.json() if response.content else {}
+                except Exception as exc:  # connection errors, invalid JSON, database locked...
+                    status_code, body = "error", {"error": str(exc)}
+                results.append({
+                    "latency": time.perf_counter() - started,
+                    "status": status_code,
+                    "order_id": body.get("order_id") if isinstance(body, dict) else None,
+                    "queries": None if base_url else queries["count"],
+                    "query_time": None if base_url else queries["time"],
+                })
+        finally:
+            if not base_url:
+                connection.close()
+        return results
+
+    # ---------------------
+    # Reporting
+    # ---------------------
+    def _report(self, results, elapsed, stub):
+        statuses = Counter(result["status"] for result in results)
+        ok = [result for result in results if result["status"] == 201]
+        latencies = sorted(result["latency"] * 1000 for result in ok)
+
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Throughput"))
+        self.stdout.write(f"  requests: {len(results)} in {elapsed:.2f}s, status codes: {dict(statuses)}")
+        self.stdout.write(f"  successful tips/s: {len(ok) / elapsed if elapsed else 0:.1f}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Latency of successful tips (ms)"))
+        if latencies:
+            self.stdout.write("  " + "  ".join(
+                f"p{pct}={_percentile(latencies, pct):.1f}" for pct in (50, 90, 95, 99)
+            ) + f"  max={latencies[-1]:.1f}")
+        else:
+            self.stdout.write("  no successful tips")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Database queries per tip"))
+        query_counts = sorted(result["queries"] for result in ok if result["queries"] is not None)
+        if query_counts:
+            query_time = sum(result["query_time"] for result in ok) * 1000 / len(ok)
+            self.stdout.write(
+                f"  mean={sum(query_counts) / len(query_counts):.1f}  p95={_percentile(query_counts, 95)}"
+                f"  max={query_counts[-1]}  mean SQL time={query_time:.1f}ms"
+            )
+        else:
+            self.stdout.write("  only measured in-process (without --base-url)")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("GMO stub"))
+        self.stdout.write(f"  calls: {stub.calls}  injected errors: {stub.errors}")
+
+    def _snapshot(self, fixture):
+        staff_ids = [staff.pk for staff, _ in fixture["staff"]]
+        return {
+            "balances": dict(Balance.objects.values_list("user_id", "current_balance")),
+            "scores": dict(UserProfile.objects.filter(user_id__in=staff_ids).values_list("user_id", "total_score")),
+            "spend": {
+                (row["consumer_id"], row["store_id"]): row["total_spend"]
+                for row in SpinBalance.objects.filter(
+                    consumer__in=fixture["consumers"]
+                ).values("consumer_id", "store_id", "total_spend")
+            },
+        }
+
+    def _check_consistency(self, fixture, before, results):
+        """Compare balances, scores and spin spend with what the captured tips should have produced."""
+        after = self._snapshot(fixture)
+        order_ids = [result["order_id"] for result in results if result["order_id"]]
+        payments = list(GMOCreditPayment.objects.filter(order_id__in=order_ids, status="CAPTURE"))
+
+        staff_by_uid = {staff.uid: staff for staff, _ in fixture["staff"]}
+        store_by_uid = {store.uid: store for store in fixture["stores"]}
+        recipients = {
+            "glow": User.objects.filter(kind=UserKind.GLOW_ADMIN).first(),
+            "fc": User.objects.filter(kind=UserKind.FC_ADMIN).first(),
+            "sales_agent": fixture["restaurant"].sales_agent,
+        }
+        cent = Decimal("0.01")
+        expected_balance = defaultdict(Decimal)
+        expected_score = defaultdict(int)
+        expected_spend = defaultdict(Decimal)
+        for payment in payments:
+            staff = staff_by_uid[payment.staff_uid]
+            shares = _shares(payment)
+            expected_balance[staff.pk] += shares["staff"].quantize(cent)
+            for role, user in recipients.items():
+                if user:
+                    expected_balance[user.pk] += shares[role].quantize(cent)
+            expected_score[staff.pk] += int(payment.amount)
+            if payment.customer_id:
+                expected_spend[(payment.customer_id, store_by_uid[payment.store_uid].pk)] += payment.amount
+
+        checks = []
+        tolerance = cent * max(len(payments), 1)
+        for user_id, expected in expected_balance.items():
+            actual = after["balances"].get(user_id, Decimal("0")) - before["balances"].get(user_id, Decimal("0"))
+            checks.append((f"balance of user {user_id}", expected, actual, abs(actual - expected) <= tolerance))
+        for user_id, expected in expected_score.items():
+            actual = after["scores"].get(user_id, 0) - before["scores"].get(user_id, 0)
+            checks.append((f"total_score of staff {user_id}", expected, actual, actual == expected))
+        for key, expected in expected_spend.items():
+            actual = after["spend"].get(key, Decimal("0")) - before["spend"].get(key, Decimal("0"))
+            checks.append((f"spin total_spend of consumer/store {key}", expected, actual, actual == expected))
+        duplicated = SpinBalance.objects.filter(consumer__in=fixture["consumers"]).values(
+            "consumer_id", "store_id"
+        ).order_by().annotate(rows=Count("id")).filter(rows__gt=1).count()
+        checks.append(("duplicate spin balance rows", 0, duplicated, duplicated == 0))
+        undistributed = sum(1 for payment in payments if not payment.is_distributed)
+        checks.append(("captured payments left undistributed", 0, undistributed, undistributed == 0))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Consistency ({len(payments)} captured payments)"))
+        failures = 0
+        for label, expected, actual, passed in checks:
+            if passed:
+                continue
+            failures += 1
+            self.stdout.write(self.style.ERROR(f"  {label}: expected {expected}, got {actual}"))
+        if failures:
+            self.stdout.write(self.style.ERROR(f"{failures} of {len(checks)} consistency checks failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"All {len(checks)} consistency checks passed."))
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_service.gmo_pg.earnings import first_rebuildable_day, rebuild_earnings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-staff daily earnings from the distributed GMO payments. "
+        "Days of archived months are kept as they are. Payments distributed while "
+        "the command runs can be missed, run it again for the days it covered if so."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        days = {}
+        for name in ("date_from", "date_to"):
+            if not options[name]:
+                days[name] = None
+                continue
+            try:
+                days[name] = datetime.date.fromisoformat(options[name])
+            except ValueError:
+                raise CommandError(f"--{name[5:]} must look like 2024-01-31.")
+
+        first_day = first_rebuildable_day()
+        if first_day:
+            self.stdout.write(f"Days before {first_day} belong to archived months and are kept.")
+        rows = rebuild_earnings(**days)
+        self.stdout.write(self.style.SUCCESS(f"{rows} staff daily earnings written."))
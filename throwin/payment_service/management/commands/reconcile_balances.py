@@ -0,0 +1,41 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_service.gmo_pg.reconcile import DEFAULT_CHUNK_SIZE, reconcile_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every user balance against the distributed GMO payments and the completed "
+        "PayPal disbursements, and list the balances that drift. With --repair the drifting "
+        "balances are set to the expected values; run it while no payment is being distributed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read per query.")
+        parser.add_argument("--tolerance", default="0", help="Drift ignored, in JPY (e.g. 0.01).")
+        parser.add_argument("--repair", action="store_true", help="Set the drifting balances to the expected values.")
+
+    def handle(self, *args, **options):
+        try:
+            tolerance = Decimal(options["tolerance"])
+        except InvalidOperation:
+            raise CommandError("--tolerance must be a number.")
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        report = reconcile_balances(options["chunk_size"], tolerance, repair=options["repair"])
+        for drift in report["drifts"]:
+            self.stdout.write(
+                "user {user_id}: current_balance {current_balance} (expected {expected_current_balance}), "
+                "total_received {total_received} (expected {expected_total_received})".format(**drift)
+            )
+        summary = (
+            f"{report['balances']} balances checked against {report['payments']} payments, "
+            f"{len(report['drifts'])} drifting"
+        )
+        if options["repair"]:
+            summary += f", {report['repaired']} repaired"
+        style = self.style.SUCCESS if not report["drifts"] or options["repair"] else self.style.WARNING
+        self.stdout.write(style(summary + "."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-19 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0012_gmocreditpayment_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gmocreditpayment',
+            index=models.Index(fields=['status', 'currency', 'created_at'], name='gmo_status_currency_created'),
+        ),
+        migrations.AddIndex(
+            model_name='gmocreditpayment',
+            index=models.Index(fields=['store_uid', 'created_at'], name='gmo_store_created'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:16
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0013_gmocreditpayment_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPaymentMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month (UTC).', unique=True)),
+                ('path', models.CharField(help_text='Path of the archive file in the archive storage.', max_length=255)),
+                ('format', models.CharField(choices=[('csv', 'Gzipped CSV'), ('parquet', 'Parquet')], default='csv', max_length=10)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of the archived payment amounts, to check the file against.', max_digits=14)),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+    ]
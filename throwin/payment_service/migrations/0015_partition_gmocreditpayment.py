@@ -0,0 +1,109 @@
+"""
+Turn the GMO payment table into a table partitioned by month on `created_at`
+(Postgres only, SQLite keeps the plain table).
+
+Postgres requires the partition key in every unique constraint, so the primary
+key becomes `(id, created_at)` and `order_id` is unique per `created_at`; 0019
+keeps order ids unique across partitions. Reviews no longer have a database
+foreign key to payments (review 0004).
+
+The rows are copied into the new table, which locks payments for the duration
+of the migration: run it in a maintenance window on large tables.
+"""
+
+import datetime
+import re
+
+from django.db import migrations
+
+TABLE = "payment_service_gmocreditpayment"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        if cursor.fetchone()[0] == "p":
+            return  # Already partitioned
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_order_id_created_uniq" UNIQUE (order_id, created_at)'
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_customer_id_fk" FOREIGN KEY (customer_id) '
+            f'REFERENCES "accounts_user" (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+        # One partition per month from the oldest payment until a few months ahead
+        cursor.execute(f'SELECT MIN(created_at) FROM "{OLD_TABLE}"')
+        oldest = cursor.fetchone()[0]
+        today = datetime.date.today()
+        month = datetime.date((oldest or today).year, (oldest or today).month, 1)
+        last = _add_months(datetime.date(today.year, today.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            start = datetime.datetime.combine(month, datetime.time.min, tzinfo=datetime.timezone.utc)
+            end = datetime.datetime.combine(_add_months(month, 1), datetime.time.min, tzinfo=datetime.timezone.utc)
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_p{month:%Y%m}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"')
+
+        # A serial id (not an identity column) keeps using the old sequence, which
+        # must not be dropped with the old table
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+            [TABLE],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [OLD_TABLE])
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{TABLE}".id')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM \"{TABLE}\"",
+            [TABLE],
+        )
+
+        # Move the non unique indexes (created_at, staff_uid, the hot path ones...)
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexdef NOT LIKE %s",
+            [OLD_TABLE, "CREATE UNIQUE INDEX%"],
+        )
+        indexes = cursor.fetchall()
+        for name, definition in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+            definition = re.sub(rf' ON (\S+\.)?"?{OLD_TABLE}"? ', f' ON "{TABLE}" ', definition)
+            cursor.execute(definition)
+
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment_service", "0014_archivedpaymentmonth"),
+        ("review", "0004_review_payment_no_db_constraint"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
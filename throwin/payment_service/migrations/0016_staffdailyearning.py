@@ -0,0 +1,32 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:38
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0015_partition_gmocreditpayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffDailyEarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('staff_uid', models.UUIDField(db_index=True)),
+                ('store_uid', models.UUIDField(blank=True, null=True)),
+                ('day', models.DateField()),
+                ('tip_count', models.PositiveIntegerField(default=0)),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of the payment amounts.', max_digits=14)),
+                ('net_share', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of the staff shares credited to the staff balance.', max_digits=14)),
+                ('last_tip_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['store_uid', 'day'], name='staff_earning_store_day')],
+                'constraints': [models.UniqueConstraint(fields=('staff_uid', 'store_uid', 'day'), name='staff_earning_per_store_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:41
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0016_staffdailyearning'),
+        ('store', '0007_alter_restaurant_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentCommission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month of distribution.')),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of the payment amounts.', max_digits=14)),
+                ('commission', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of the sales agent shares credited to the agent balance.', max_digits=14)),
+                ('is_closed', models.BooleanField(default=False)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_commissions', to='store.restaurant')),
+                ('sales_agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_commissions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month', 'restaurant_id'],
+                'constraints': [models.UniqueConstraint(fields=('sales_agent', 'restaurant', 'month'), name='agent_commission_per_restaurant_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.8 on 2026-10-19 02:25
+
+import django.db.models.deletion
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0017_agentcommission'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uid', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, unique=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive'), ('deleted', 'Deleted'), ('pending', 'Pending')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('version', models.PositiveIntegerField(help_text='Version number of the policy', unique=True)),
+                ('effective_from', models.DateTimeField(db_index=True, help_text='Payments created from this date on are split by this policy')),
+                ('fee_rate', models.DecimalField(decimal_places=4, default=Decimal('0.036'), help_text='Processing fee, as a rate of the amount', max_digits=5)),
+                ('fixed_fee', models.DecimalField(decimal_places=2, default=Decimal('40'), help_text='Processing fee added to every payment, in JPY', max_digits=10)),
+                ('staff_rate', models.DecimalField(decimal_places=4, default=Decimal('0.75'), help_text='Share of the staff, as a rate of the net amount', max_digits=5)),
+                ('glow_admin_rate', models.DecimalField(decimal_places=4, default=Decimal('0.30'), help_text='Share of the Glow admin, as a rate of the management share', max_digits=5)),
+                ('fc_admin_rate', models.DecimalField(decimal_places=4, default=Decimal('0.30'), help_text='Share of the FC admin, as a rate of the management share', max_digits=5)),
+                ('sales_agent_rate', models.DecimalField(decimal_places=4, default=Decimal('0.40'), help_text='Share of the sales agent, as a rate of the management share', max_digits=5)),
+                ('rounding', models.CharField(choices=[('cent', 'Cent'), ('yen', 'Yen')], default='cent', help_text='Unit the fee and the shares are rounded to', max_length=10)),
+                ('note', models.TextField(blank=True, default='')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created_by', to=settings.AUTH_USER_MODEL, verbose_name='Created Person')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated_by', to=settings.AUTH_USER_MODEL, verbose_name='Updated Person')),
+            ],
+            options={
+                'verbose_name': 'Fee Policy',
+                'verbose_name_plural': 'Fee Policies',
+                'ordering': ['-effective_from', '-version'],
+            },
+        ),
+    ]
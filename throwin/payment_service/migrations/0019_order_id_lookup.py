@@ -0,0 +1,127 @@
+# Generated by Django 5.1.8 on 2026-10-19 02:49
+"""
+Keep GMO order ids unique across the whole payment history.
+
+On Postgres the partitioned table (0015) can only have `(order_id,
+created_at)` unique, so order ids are reserved in `GMOOrderId` by triggers on
+the payment table instead: inserting a payment, or changing its order id, to an
+order id already taken fails like a unique column would. SQLite gets the same
+triggers and constraints so both databases behave, and match the models.
+
+The order ids of the payments in the database are reserved here; those of
+months archived before this migration only live in their archive files.
+"""
+
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = "payment_service_gmocreditpayment"
+LOOKUP_TABLE = "payment_service_gmoorderid"
+
+TRIGGERS = {
+    "postgresql": [
+        f"""
+        CREATE FUNCTION payment_service_reserve_order_id() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO "{LOOKUP_TABLE}" (order_id) VALUES (NEW.order_id);
+            RETURN NULL;
+        END
+        $$
+        """,
+        # Row triggers of a partitioned table are cloned to every partition, future ones included
+        f"""
+        CREATE TRIGGER payment_service_reserve_order_id AFTER INSERT ON "{TABLE}"
+        FOR EACH ROW EXECUTE FUNCTION payment_service_reserve_order_id()
+        """,
+        f"""
+        CREATE TRIGGER payment_service_reserve_changed_order_id AFTER UPDATE OF order_id ON "{TABLE}"
+        FOR EACH ROW WHEN (OLD.order_id IS DISTINCT FROM NEW.order_id)
+        EXECUTE FUNCTION payment_service_reserve_order_id()
+        """,
+    ],
+    "sqlite": [
+        f"""
+        CREATE TRIGGER payment_service_reserve_order_id AFTER INSERT ON "{TABLE}"
+        BEGIN
+            INSERT INTO "{LOOKUP_TABLE}" (order_id) VALUES (NEW.order_id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER payment_service_reserve_changed_order_id AFTER UPDATE OF order_id ON "{TABLE}"
+        WHEN OLD.order_id IS NOT NEW.order_id
+        BEGIN
+            INSERT INTO "{LOOKUP_TABLE}" (order_id) VALUES (NEW.order_id);
+        END
+        """,
+    ],
+}
+
+DROP_TRIGGERS = {
+    "postgresql": [
+        f'DROP TRIGGER IF EXISTS payment_service_reserve_changed_order_id ON "{TABLE}"',
+        f'DROP TRIGGER IF EXISTS payment_service_reserve_order_id ON "{TABLE}"',
+        "DROP FUNCTION IF EXISTS payment_service_reserve_order_id()",
+    ],
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS payment_service_reserve_changed_order_id",
+        "DROP TRIGGER IF EXISTS payment_service_reserve_order_id",
+    ],
+}
+
+
+def reserve_order_ids(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{LOOKUP_TABLE}" (order_id) SELECT DISTINCT order_id FROM "{TABLE}"')
+
+
+def create_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in TRIGGERS.get(schema_editor.connection.vendor, []):
+            cursor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_TRIGGERS.get(schema_editor.connection.vendor, []):
+            cursor.execute(statement)
+
+
+class AddConstraintUnlessPartitioned(migrations.AddConstraint):
+    """Postgres already has the constraint, 0015 created it with the partitioned table."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0018_feepolicy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GMOOrderId',
+            fields=[
+                ('order_id', models.CharField(max_length=50, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='gmocreditpayment',
+            name='order_id',
+            field=models.CharField(db_index=True, help_text='Unique identifier for the payment transaction (reserved in GMOOrderId)', max_length=50),
+        ),
+        AddConstraintUnlessPartitioned(
+            model_name='gmocreditpayment',
+            constraint=models.UniqueConstraint(fields=('order_id', 'created_at'), name='payment_service_gmocreditpayment_order_id_created_uniq'),
+        ),
+        # SQLite rebuilds the table on the changes above, which drops its triggers
+        migrations.RunPython(reserve_order_ids, migrations.RunPython.noop),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
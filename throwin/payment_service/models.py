@@ -1,10 +1,12 @@
 from decimal import Decimal
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from common.models import BaseModel
 from accounts.models import User
 from accounts.choices import UserKind
 from store.models import Restaurant, Store
+from payment_service import fees
 
 
 class PaymentHistory(BaseModel):
@@ -106,16 +108,15 @@ class PaymentHistory(BaseModel):
 
     def save(self, *args, **kwargs):
         """
-        Override the save method to calculate service fee and net amount.
+        Override the save method to calculate service fee and net amount
+        with the fee policy in effect (see payment_service.fees).
         """
-        service_fee_rate = Decimal("0.036")  # 3.6%
-        fixed_fee = Decimal("40")  # 40 JPY
-
-        if not self.service_fee:  # Calculate service fee only if not set
-            self.service_fee = (self.amount * service_fee_rate) + fixed_fee
-
-        if not self.net_amount:  # Calculate net amount only if not set
-            self.net_amount = self.amount - self.service_fee
+        if not self.service_fee or not self.net_amount:
+            split = fees.split(self.amount)
+            if not self.service_fee:  # Calculate service fee only if not set
+                self.service_fee = split.fee
+            if not self.net_amount:  # Calculate net amount only if not set
+                self.net_amount = self.amount - self.service_fee
 
         super().save(*args, **kwargs)
 
@@ -126,15 +127,21 @@ class PaymentHistory(BaseModel):
         - Ensure staff belongs to the provided restaurant.
         - Ensure the store (if provided) belongs to the same restaurant.
         """
+        from store.membership import get_staff_membership
+
         if self.amount <= 0:
             raise ValidationError("Payment amount must be greater than zero.")
 
-        # Ensure staff belongs to the restaurant
-        if not self.restaurant.restaurant_users.filter(user=self.staff).exists():
+        # Ensure staff belongs to the restaurant. The index only has staff users and
+        # roles, any other member of the restaurant is checked in the database
+        membership = get_staff_membership(self.staff.uid)
+        if not (membership and membership.works_at_restaurant(self.restaurant_id)) and not (
+            self.restaurant.restaurant_users.filter(user=self.staff).exists()
+        ):
             raise ValidationError("The selected staff does not belong to the specified restaurant.")
 
         # Ensure store belongs to the same restaurant (if store is provided)
-        if self.store and self.store.restaurant != self.restaurant:
+        if self.store and self.store.restaurant_id != self.restaurant_id:
             raise ValidationError("The selected store does not belong to the specified restaurant.")
 
         super().clean()
@@ -146,3 +153,95 @@ class PaymentHistory(BaseModel):
         ordering = ["-payment_date"]
         verbose_name = "Payment History"
         verbose_name_plural = "Payment Histories"
+
+
+class FeePolicy(BaseModel):
+    """
+    A version of the fee and split rates of tips, in effect from
+    `effective_from` until the next active version. Payments are split by the
+    version in effect when they were created, so a version should not change
+    once in effect: publish a new one instead (see payment_service.fees).
+    """
+    RATE_FIELD_OPTIONS = {"max_digits": 5, "decimal_places": 4}
+
+    version = models.PositiveIntegerField(
+        unique=True,
+        help_text="Version number of the policy"
+    )
+    effective_from = models.DateTimeField(
+        db_index=True,
+        help_text="Payments created from this date on are split by this policy"
+    )
+    fee_rate = models.DecimalField(
+        default=fees.DEFAULT_POLICY.fee_rate,
+        help_text="Processing fee, as a rate of the amount",
+        **RATE_FIELD_OPTIONS
+    )
+    fixed_fee = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=fees.DEFAULT_POLICY.fixed_fee,
+        help_text="Processing fee added to every payment, in JPY"
+    )
+    staff_rate = models.DecimalField(
+        default=fees.DEFAULT_POLICY.staff_rate,
+        help_text="Share of the staff, as a rate of the net amount",
+        **RATE_FIELD_OPTIONS
+    )
+    glow_admin_rate = models.DecimalField(
+        default=fees.DEFAULT_POLICY.glow_admin_rate,
+        help_text="Share of the Glow admin, as a rate of the management share",
+        **RATE_FIELD_OPTIONS
+    )
+    fc_admin_rate = models.DecimalField(
+        default=fees.DEFAULT_POLICY.fc_admin_rate,
+        help_text="Share of the FC admin, as a rate of the management share",
+        **RATE_FIELD_OPTIONS
+    )
+    sales_agent_rate = models.DecimalField(
+        default=fees.DEFAULT_POLICY.sales_agent_rate,
+        help_text="Share of the sales agent, as a rate of the management share",
+        **RATE_FIELD_OPTIONS
+    )
+    rounding = models.CharField(
+        max_length=10,
+        choices=[
+            ("cent", "Cent"),
+            ("yen", "Yen"),
+        ],
+        default="cent",
+        help_text="Unit the fee and the shares are rounded to"
+    )
+    note = models.TextField(blank=True, default="")
+
+    def clean(self):
+        """
+        Validate the rates.
+        - Ensure every rate is between 0 and 1.
+        - Ensure the management shares add up to 1.
+        - Ensure a new policy does not change the split of past payments.
+        """
+        rates = ("fee_rate", "staff_rate", "glow_admin_rate", "fc_admin_rate", "sales_agent_rate")
+        errors = {
+            name: "Must be between 0 and 1."
+            for name in rates
+            if getattr(self, name) is not None and not 0 <= getattr(self, name) <= 1
+        }
+        if errors:
+            raise ValidationError(errors)
+        if self.glow_admin_rate + self.fc_admin_rate + self.sales_agent_rate != 1:
+            raise ValidationError("The Glow admin, FC admin and sales agent rates must add up to 1.")
+        if self._state.adding and self.effective_from and self.effective_from < timezone.now():
+            raise ValidationError({"effective_from": "A new policy cannot take effect in the past."})
+        super().clean()
+
+    def as_policy(self):
+        return fees.build_policy(self)
+
+    def __str__(self):
+        return f"Fee policy v{self.version} from {self.effective_from:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        ordering = ["-effective_from", "-version"]
+        verbose_name = "Fee Policy"
+        verbose_name_plural = "Fee Policies"
@@ -0,0 +1,155 @@
+"""
+Recent tip messages of each staff member.
+
+The public recent-messages endpoint is polled, so the last `LIMIT` messages of
+each staff member are kept in a capped Redis list, newest first:
+
+    messages:staff:{uid}        the serialized messages
+    messages:staff:{uid}:ready  set once the list was built from the database
+
+`push_message` adds a message when a PayPal or GMO payment is captured and
+`recent_messages` reads the list in one round trip. A list that is not ready
+(evicted, expired, never read) is rebuilt from both payment tables on read,
+with the list watched so that a message pushed during the rebuild is not lost.
+Both keys expire after `TTL` seconds without a new message. Without Redis the
+messages are read from the database.
+"""
+
+import json
+import logging
+
+from redis.exceptions import WatchError
+
+from accounts.choices import UserKind
+from common.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY = "messages:staff:{uid}"
+LIMIT = 5
+TTL = 7 * 24 * 3600
+REBUILD_ATTEMPTS = 3
+
+
+def message_keys(staff_uid):
+    key = KEY.format(uid=staff_uid)
+    return key, f"{key}:ready"
+
+
+def _entry(message, date, nickname):
+    from payment_service.serializers import StaffRecentMessagesSerializer
+
+    return dict(StaffRecentMessagesSerializer({"message": message, "date": date, "nickname": nickname}).data)
+
+
+def messages_from_db(staff_uid):
+    """The last `LIMIT` messages of captured PayPal and GMO payments to the staff member, newest first."""
+    from payment_service.gmo_pg.models import GMOCreditPayment
+    from payment_service.models import PaymentHistory
+
+    paypal = (
+        PaymentHistory.objects.filter(staff__uid=staff_uid, status="success", message__isnull=False)
+        .exclude(message="")
+        .order_by("-payment_date")
+        .values_list("message", "payment_date", "nickname")[:LIMIT]
+    )
+    gmo = (
+        GMOCreditPayment.objects.filter(staff_uid=staff_uid, status="CAPTURE", message__isnull=False)
+        .exclude(message="")
+        .order_by("-created_at")
+        .values_list("message", "created_at", "nickname")[:LIMIT]
+    )
+    latest = sorted([*paypal, *gmo], key=lambda row: row[1], reverse=True)[:LIMIT]
+    return [_entry(*row) for row in latest]
+
+
+def push_message(staff_uid, message, date, nickname):
+    """Add the message of a captured payment in front of the staff member's list."""
+    if not message:
+        return
+    client = get_redis_client()
+    if client is None:
+        return
+    key, ready_key = message_keys(staff_uid)
+    try:
+        with client.pipeline() as pipe:
+            pipe.lpush(key, json.dumps(_entry(message, date, nickname)))
+            pipe.ltrim(key, 0, LIMIT - 1)
+            pipe.expire(key, TTL)
+            pipe.expire(ready_key, TTL)
+            pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not push a recent message of staff %s: %s", staff_uid, exc)
+
+
+def rebuild_messages(staff_uid, client=None):
+    """
+    Replace the list of a staff member with the messages in the database.
+
+    A message pushed between the database read and the write would be
+    overwritten, so the list is watched from before the read and the rebuild
+    starts over when it changed. The list is left not ready when messages
+    keep coming, the next read tries again.
+    """
+    client = client or get_redis_client()
+    if client is None:
+        return messages_from_db(staff_uid)
+    key, ready_key = message_keys(staff_uid)
+    with client.pipeline() as pipe:
+        for _ in range(REBUILD_ATTEMPTS):
+            try:
+                pipe.watch(key)
+                messages = messages_from_db(staff_uid)
+                pipe.multi()
+                pipe.delete(key)
+                if messages:
+                    pipe.rpush(key, *(json.dumps(message) for message in messages))
+                    pipe.expire(key, TTL)
+                pipe.set(ready_key, 1, ex=TTL)
+                pipe.execute()
+                return messages
+            except WatchError:
+                continue
+    return messages
+
+
+def drop_messages(staff_uid):
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.delete(*message_keys(staff_uid))
+    except Exception as exc:
+        logger.warning("Could not drop the recent messages of staff %s: %s", staff_uid, exc)
+
+
+def recent_messages(staff_uid):
+    """
+    The last messages of the staff member with `staff_uid`, newest first, None
+    when there is no such staff member.
+    """
+    from accounts.models import User
+
+    client = get_redis_client()
+    if client is not None:
+        key, ready_key = message_keys(staff_uid)
+        try:
+            with client.pipeline(transaction=False) as pipe:
+                pipe.exists(ready_key)
+                pipe.lrange(key, 0, LIMIT - 1)
+                ready, messages = pipe.execute()
+            if ready:
+                return [json.loads(message) for message in messages]
+        except Exception as exc:
+            logger.warning("Recent messages of staff %s unavailable, using the database: %s", staff_uid, exc)
+            client = None
+
+    if not User.objects.filter(uid=staff_uid, kind=UserKind.RESTAURANT_STAFF).exists():
+        return None
+    if client is None:
+        return messages_from_db(staff_uid)
+    try:
+        return rebuild_messages(staff_uid, client)
+    except Exception as exc:
+        logger.warning("Could not rebuild the recent messages of staff %s: %s", staff_uid, exc)
+        return messages_from_db(staff_uid)
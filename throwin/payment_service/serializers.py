@@ -267,17 +267,14 @@ class AdminPaymentHistorySerializer(serializers.ModelSerializer):
 
 
 
-class StaffRecentMessagesSerializer(serializers.ModelSerializer):
+class StaffRecentMessagesSerializer(serializers.Serializer):
     """
-    Serializer to send the last 5 messages for a staff's transactions.
+    Serializer to send the last 5 messages for a staff's transactions, PayPal
+    and GMO payments alike (see payment_service.recent_messages).
     """
-    date = serializers.DateTimeField(source="payment_date", read_only=True)  # Map to 'payment_date' explicitly
-    message = serializers.CharField(read_only=True)  # Keep this as it is
-    nickname = serializers.CharField(read_only=True)  # No 'source' required because field name matches the model
-
-    class Meta:
-        model = PaymentHistory
-        fields = ["message", "date", "nickname"]
+    message = serializers.CharField(read_only=True)
+    date = serializers.DateTimeField(read_only=True)  # Payment date
+    nickname = serializers.CharField(read_only=True, allow_null=True)
 
 
 
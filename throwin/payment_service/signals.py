@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.conditional import bump_version
+
+
+@receiver([post_save, post_delete], sender="payment_service.FeePolicy")
+def invalidate_fee_policies(sender, instance, **kwargs):
+    """Drop the cached fee policies now and again once the transaction commits."""
+    from payment_service.fees import invalidate_fee_policies
+
+    invalidate_fee_policies()
+    transaction.on_commit(invalidate_fee_policies)
+
+
+@receiver([post_save, post_delete], sender="payment_service.BankAccount")
+def bump_bank_account_owner_version(sender, instance, **kwargs):
+    bump_version(f"user:{instance.user_id}")
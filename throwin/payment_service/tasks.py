@@ -9,6 +9,8 @@ from django.conf import settings
 from django.db import transaction
 from dotenv import load_dotenv
 
+from common.metrics import observe_gateway, record_gateway_error
+
 # Load environment variables from your .env file.
 load_dotenv()
 
@@ -32,18 +34,20 @@ def get_access_token():
         "grant_type": "client_credentials"
     }
     
-    response = requests.post(
-        url, 
-        auth=(CLIENT_ID, CLIENT_SECRET), 
-        headers=headers,
-        data=data
-    )
+    with observe_gateway("paypal", "oauth_token"):
+        response = requests.post(
+            url,
+            auth=(CLIENT_ID, CLIENT_SECRET),
+            headers=headers,
+            data=data
+        )
     
     if response.status_code == 200:
         result = response.json()
         print(f"Access token obtained successfully. Expires in {result.get('expires_in')} seconds")
         return result['access_token']
     else:
+        record_gateway_error("paypal", "oauth_token")
         print(f"Error getting access token: {response.text}")
         return None
 
@@ -91,13 +95,15 @@ def create_batch_payout(recipients):
     }
     
     print(f"Sending batch payment to {len(items)} recipients...")
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    with observe_gateway("paypal", "batch_payout"):
+        response = requests.post(url, headers=headers, data=json.dumps(payload))
     
     if response.status_code in [200, 201]:
         result = response.json()
         print(f"Batch payout created successfully with batch ID: {batch_id}")
         return result
     else:
+        record_gateway_error("paypal", "batch_payout")
         print(f"Error creating batch payout: {response.status_code}")
         print(f"Response: {response.text}")
         return None
@@ -186,3 +192,82 @@ def disburse_paypal_payments():
             record.message = "Batch payout creation failed."
             record.save()
         return "Batch payout failed."
+
+
+@shared_task
+def create_payment_partitions():
+    """Create the coming monthly partitions of the GMO payment table (Postgres)."""
+    from payment_service.gmo_pg.partitions import create_partitions
+
+    created = create_partitions(months_ahead=3)
+    return f"{len(created)} payment partitions created"
+
+
+@shared_task
+def archive_old_payments():
+    """Archive the months older than GMO_ARCHIVE_AFTER_MONTHS, when it is set."""
+    from payment_service.gmo_pg.archive import ArchiveError, archivable_months, archive_month
+
+    if settings.GMO_ARCHIVE_AFTER_MONTHS <= 0:
+        return "payment archival disabled"
+    archived = 0
+    for month in archivable_months(settings.GMO_ARCHIVE_AFTER_MONTHS):
+        try:
+            archive_month(month, settings.GMO_ARCHIVE_FORMAT)
+        except ArchiveError as exc:
+            print(f"Skipped {month:%Y-%m}: {exc}")
+            continue
+        archived += 1
+    return f"{archived} months of payments archived"
+
+
+@shared_task
+def close_agent_commissions():
+    """Close the sales agent commissions of the months that are over, before they are paid out."""
+    from payment_service.gmo_pg.commissions import close_months
+
+    closed = close_months()
+    return f"{closed} agent commission rows closed"
+
+
+@shared_task
+def reconcile_balances():
+    """Report the user balances that drift from the distributed payments, without repairing them."""
+    from payment_service.gmo_pg.reconcile import reconcile_balances as reconcile
+
+    report = reconcile()
+    for drift in report["drifts"]:
+        print(
+            f"Balance of user {drift['user_id']} drifts: {drift['current_balance']} "
+            f"(expected {drift['expected_current_balance']})"
+        )
+    return f"{len(report['drifts'])} of {report['balances']} balances drifting"
+
+
+@shared_task
+def recheck_payment_statuses(payment_ids):
+    """Ask GMO for the status of the given payments and settle the ones captured since."""
+    from payment_service.gmo_pg.models import GMOCreditPayment
+    from payment_service.gmo_pg.views import settle_captured_payment
+
+    captured = 0
+    for payment in GMOCreditPayment.objects.filter(id__in=payment_ids).exclude(status="CAPTURE"):
+        if payment.check_payment_status() and payment.status == "CAPTURE":
+            settle_captured_payment(payment)
+            captured += 1
+    return f"{captured} of {len(payment_ids)} payments captured"
+
+
+@shared_task
+def distribute_payments(payment_ids):
+    """Distribute the given captured payments that are not distributed yet."""
+    from payment_service.gmo_pg.models import GMOCreditPayment
+
+    distributed = 0
+    for payment in GMOCreditPayment.objects.filter(id__in=payment_ids, status="CAPTURE", is_distributed=False):
+        try:
+            if payment.distribute_payment():
+                distributed += 1
+        except Exception as exc:
+            print(f"Payment {payment.order_id} not distributed: {exc}")
+    return f"{distributed} of {len(payment_ids)} payments distributed"
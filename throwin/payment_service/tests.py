@@ -2,6 +2,7 @@
 # from rest_framework.test import APIClient
 # from rest_framework import status
 # from accounts.models import User
+from common import feed
 # from payment_service.models import PaymentHistory, DisbursementRequest, PaymentStatus, DisbursementStatus
 # from accounts.choices import UserKind
 
@@ -188,3 +189,788 @@
 #         response = self.client.patch(url, data)
 #         self.assertEqual(response.status_code, status.HTTP_200_OK)
 #         self.assertEqual(response.data['status'], "in_progress")
+
+
+import asyncio
+import datetime
+import io
+import os
+import tempfile
+from importlib import import_module
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from redis.exceptions import WatchError
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from accounts.choices import UserKind
+from accounts.models import User
+from payment_service.gmo_pg import serializers as gmo_serializers
+from payment_service.gmo_pg.async_views import AsyncCheckGMOPaymentStatusView, AsyncGMOCreditCardPaymentView
+from payment_service.gmo_pg.archive import ArchiveError, archive_month
+from payment_service.gmo_pg import archive as archive_module
+from payment_service.gmo_pg import partitions
+from payment_service.gmo_pg.commissions import close_months
+from payment_service.gmo_pg.models import (
+    AgentCommission,
+    ArchivedPaymentMonth,
+    Balance,
+    GMOCreditPayment,
+    PayPalDisbursement,
+    StaffDailyEarning,
+)
+from payment_service.gmo_pg.reconcile import reconcile_balances
+from payment_service import fees, recent_messages, tasks as payment_tasks
+from payment_service.async_views import TipFeedView, tip_feed_channels
+from payment_service.gmo_pg.stub import GMOStubServer
+from payment_service.models import FeePolicy
+from review.models import Review
+from store.models import Restaurant, RestaurantUser, Store, StoreUser
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GMOTipFlowTestCase(TestCase):
+    """Base class running the GMO credit card tip flow against the local GMO stub."""
+
+    stub_options = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        def make_user(email, kind):
+            return User.objects.create(email=email, name=email.split("@")[0], kind=kind, is_verified=True)
+
+        cls.owner = make_user("owner@example.com", UserKind.RESTAURANT_OWNER)
+        cls.agent = make_user("agent@example.com", UserKind.SALES_AGENT)
+        cls.staff = make_user("staff@example.com", UserKind.RESTAURANT_STAFF)
+        cls.consumer = make_user("consumer@example.com", UserKind.CONSUMER)
+        cls.restaurant = Restaurant.objects.create(name="Tips", restaurant_owner=cls.owner, sales_agent=cls.agent)
+        cls.store = Store.objects.create(restaurant=cls.restaurant, name="Tips Store", code="tips1")
+        RestaurantUser.objects.create(restaurant=cls.restaurant, user=cls.staff, role=UserKind.RESTAURANT_STAFF)
+        StoreUser.objects.create(store=cls.store, user=cls.staff, role=UserKind.RESTAURANT_STAFF)
+
+    def setUp(self):
+        self.stub = GMOStubServer(confirm_not_production=True, **self.stub_options).start()
+        self.addCleanup(self.stub.stop)
+        for patcher in (
+            mock.patch.dict(os.environ, {"GMO_API_URL": self.stub.url}),
+            mock.patch.object(gmo_serializers, "GMO_API_URL", self.stub.url),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.consumer)
+
+    def tip(self, amount="3000", headers=None, **extra):
+        payload = {
+            "staff_uid": str(self.staff.uid),
+            "store_uid": str(self.store.uid),
+            "amount": amount,
+            "token": "stub-token",
+            **extra,
+        }
+        return self.client.post("/payment_service/gmo-pg/credit-card/", payload, format="json", headers=headers)
+
+
+class GMOStubTipFlowTests(GMOTipFlowTestCase):
+
+    def test_tip_is_captured_and_distributed(self):
+        response = self.tip("3000")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        payment = GMOCreditPayment.objects.get(order_id=response.data["order_id"])
+        self.assertEqual(payment.status, "CAPTURE")
+        self.assertTrue(payment.is_distributed)
+        self.staff.balance.refresh_from_db()
+        # (3000 - (3000 * 0.036 + 40)) * 0.75
+        self.assertEqual(self.staff.balance.current_balance, Decimal("2139.00"))
+        self.assertEqual(self.stub.calls, {"EntryTran": 1, "ExecTran": 1, "SearchTrade": 1})
+
+    def test_inactive_staff_can_still_be_tipped(self):
+        # As before the membership index: the staff kind and role are checked, not the active flag
+        User.objects.filter(pk=self.staff.pk).update(is_active=False)
+
+        self.assertEqual(self.tip("3000").status_code, 201)
+
+    def test_stub_and_load_test_refuse_to_run_without_debug(self):
+        with self.assertRaises(ImproperlyConfigured):
+            GMOStubServer()
+        with self.assertRaises(CommandError):
+            call_command("loadtest_tips", stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(email__endswith="loadtest.throwin.invalid").exists())
+
+
+class RecentMessagesTests(GMOTipFlowTestCase):
+
+    def test_captured_tip_messages_are_listed_newest_first(self):
+        self.tip("3000", message="Thanks!")
+        self.tip("1000")
+        self.tip("2000", message="Great service")
+
+        response = self.client.get(f"/payment_service/staff/{self.staff.uid}/recent-messages/")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row["message"] for row in response.data], ["Great service", "Thanks!"])
+        self.assertEqual(response.data[0]["nickname"], self.consumer.username)
+        self.assertEqual(
+            self.client.get(f"/payment_service/staff/{self.consumer.uid}/recent-messages/").status_code, 404
+        )
+
+    def test_rebuild_starts_over_when_a_message_is_pushed_meanwhile(self):
+        self.tip("3000", message="Thanks!")
+        client = mock.MagicMock()
+        pipe = client.pipeline.return_value.__enter__.return_value
+        pipe.execute.side_effect = [WatchError, None]
+
+        with mock.patch.object(
+            recent_messages, "messages_from_db", wraps=recent_messages.messages_from_db
+        ) as messages_from_db:
+            messages = recent_messages.rebuild_messages(self.staff.uid, client)
+
+        self.assertEqual(messages_from_db.call_count, 2)
+        self.assertEqual(pipe.watch.call_count, 2)
+        self.assertEqual([row["message"] for row in messages], ["Thanks!"])
+
+
+class StaffEarningsTests(GMOTipFlowTestCase):
+
+    def earnings(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get("/payment_service/analytics/staff-earnings/", params)
+
+    def test_distributed_tips_are_aggregated_per_staff(self):
+        self.tip("3000")
+        self.tip("5000")
+
+        response = self.earnings(self.owner)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        [row] = response.data
+        self.assertEqual(row["staff_uid"], str(self.staff.uid))
+        self.assertEqual(row["tips"], 2)
+        self.assertEqual(Decimal(row["gross"]), Decimal("8000.00"))
+        # Same as the staff balance: 2139.00 + (5000 - (5000 * 0.036 + 40)) * 0.75
+        self.assertEqual(Decimal(row["net_share"]), Decimal("5724.00"))
+        self.assertEqual(Decimal(row["average_tip"]), Decimal("4000.00"))
+
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        self.assertEqual(self.earnings(self.owner, date_to=yesterday.isoformat()).data, [])
+        self.assertEqual(self.earnings(self.consumer).status_code, 403)
+
+    def test_rebuild_matches_the_incremental_aggregates(self):
+        self.tip("3000")
+        self.tip("4500")
+        before = list(StaffDailyEarning.objects.values("staff_uid", "day", "tip_count", "gross_amount", "net_share"))
+
+        StaffDailyEarning.objects.update(tip_count=0)
+        call_command("rebuild_staff_earnings", stdout=io.StringIO())
+
+        after = list(StaffDailyEarning.objects.values("staff_uid", "day", "tip_count", "gross_amount", "net_share"))
+        self.assertEqual(after, before)
+
+
+class AgentCommissionTests(GMOTipFlowTestCase):
+
+    def statement(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get("/payment_service/analytics/agent-commissions/", params)
+
+    def test_distribution_writes_the_monthly_commission(self):
+        self.tip("3000")
+        self.tip("5000")
+
+        response = self.statement(self.agent)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        [row] = response.data["results"]
+        self.assertEqual(row["restaurant_uid"], str(self.restaurant.uid))
+        self.assertEqual(row["payment_count"], 2)
+        # Same as the agent balance: ((3000 + 5000) * 0.964 - 80) * 0.25 * 0.40
+        self.assertEqual(Decimal(row["commission"]), Decimal("763.20"))
+        self.agent.balance.refresh_from_db()
+        self.assertEqual(self.agent.balance.current_balance, Decimal(row["commission"]))
+        self.assertFalse(row["is_closed"])
+        self.assertEqual(self.statement(self.owner).status_code, 403)
+
+    def test_closed_months_are_frozen(self):
+        self.tip("3000")
+        this_month = partitions.month_start(timezone.localdate())
+
+        closed = close_months(before=partitions.add_months(this_month, 1))
+        self.tip("5000")
+
+        self.assertEqual(closed, 1)
+        rows = list(AgentCommission.objects.order_by("month").values_list("month", "payment_count", "is_closed"))
+        self.assertEqual(rows, [(this_month, 1, True), (partitions.add_months(this_month, 1), 1, False)])
+        self.assertEqual(len(self.statement(self.agent, closed="true").data["results"]), 1)
+
+
+class BalanceReconciliationTests(GMOTipFlowTestCase):
+
+    def test_drifting_balance_is_reported_and_repaired(self):
+        self.tip("3000")
+        self.tip("5000")
+        self.assertEqual(reconcile_balances(chunk_size=1)["drifts"], [])
+
+        Balance.objects.filter(user=self.staff).update(current_balance=Decimal("100.00"))
+        PayPalDisbursement.objects.create(user=self.agent, amount=Decimal("500.00"), status="COMPLETED")
+        out = io.StringIO()
+        call_command("reconcile_balances", "--chunk-size", "1", "--repair", stdout=out)
+
+        self.assertIn("2 drifting, 2 repaired", out.getvalue())
+        self.staff.balance.refresh_from_db()
+        self.assertEqual(self.staff.balance.current_balance, Decimal("5724.00"))
+        self.agent.balance.refresh_from_db()
+        self.assertEqual(self.agent.balance.current_balance, Decimal("263.20"))
+        self.assertEqual(self.agent.balance.total_received, Decimal("763.20"))
+        self.assertEqual(reconcile_balances()["drifts"], [])
+
+
+class PaymentAdminTests(GMOTipFlowTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create(
+            email="root@example.com", name="root", is_staff=True, is_superuser=True, is_verified=True
+        )
+        self.admin_client = APIClient()
+        self.admin_client.force_login(self.admin_user)
+
+    def test_changelists_show_annotated_columns_and_autocomplete_filters(self):
+        self.tip("3000")
+
+        response = self.admin_client.get("/admin/payment_service/gmocreditpayment/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Tips Store")
+
+        response = self.admin_client.get(
+            "/admin/payment_service/paymenthistory/", {"restaurant__id__exact": self.restaurant.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'data-filter-parameter="restaurant__id__exact"')
+        self.assertContains(self.admin_client.get("/admin/payment_service/balance/"), "staff@example.com")
+
+    def test_bulk_actions_are_queued_as_celery_jobs(self):
+        self.tip("3000")
+        payment = GMOCreditPayment.objects.get()
+        GMOCreditPayment.objects.filter(pk=payment.pk).update(is_distributed=False)
+
+        with mock.patch.object(payment_tasks.distribute_payments, "delay") as delay:
+            response = self.admin_client.post(
+                "/admin/payment_service/gmocreditpayment/",
+                {"action": "distribute", "_selected_action": [payment.pk]},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        delay.assert_called_once_with([payment.pk])
+        self.assertEqual(payment_tasks.distribute_payments([payment.pk]), "1 of 1 payments distributed")
+
+    def test_overlapping_distributions_credit_once(self):
+        self.tip("3000")
+        GMOCreditPayment.objects.update(is_distributed=False)
+        Balance.objects.filter(user=self.staff).update(current_balance=0)
+        first, second = GMOCreditPayment.objects.get(), GMOCreditPayment.objects.get()
+
+        self.assertTrue(first.distribute_payment())
+        self.assertFalse(second.distribute_payment())
+        self.staff.balance.refresh_from_db()
+        self.assertEqual(self.staff.balance.current_balance, Decimal("2139.00"))
+
+
+class GMOStubErrorTests(GMOTipFlowTestCase):
+    stub_options = {"error_rate": 1.0}
+
+    def test_gmo_error_is_rejected(self):
+        response = self.tip("3000")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GMOCreditPayment.objects.exists())
+        self.assertEqual(self.stub.calls["ExecTran"], 0)
+
+
+class IdempotentTipTests(GMOTipFlowTestCase):
+
+    def test_retry_with_same_key_replays_the_first_response(self):
+        first = self.tip("3000", headers={"Idempotency-Key": "tip-1"})
+        retry = self.tip("3000", headers={"Idempotency-Key": "tip-1"})
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(GMOCreditPayment.objects.count(), 1)
+        self.assertEqual(self.stub.calls["ExecTran"], 1)
+
+    def test_key_reused_for_another_payload_is_rejected(self):
+        self.tip("3000", headers={"Idempotency-Key": "tip-2"})
+        response = self.tip("5000", headers={"Idempotency-Key": "tip-2"})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(GMOCreditPayment.objects.count(), 1)
+
+    def test_retry_while_first_request_is_in_flight_conflicts(self):
+        with mock.patch("common.idempotency.cache.add", return_value=False):
+            response = self.tip("3000", headers={"Idempotency-Key": "tip-3"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.stub.calls["EntryTran"], 0)
+
+    def test_anonymous_keys_belong_to_the_session(self):
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        sessions = {}
+
+        def guest(name):
+            client = APIClient()
+            if name:
+                if name not in sessions:
+                    session = sessions[name] = session_store()
+                    session.create()
+                client.cookies[settings.SESSION_COOKIE_NAME] = sessions[name].session_key
+            return client
+
+        payload = {
+            "staff_uid": str(self.staff.uid), "store_uid": str(self.store.uid), "amount": "3000",
+            "token": "stub-token", "nickname": "Guest",
+        }
+        url = "/payment_service/gmo-pg/credit-card/"
+        headers = {"Idempotency-Key": "guest-1"}
+
+        first = guest("guest-session-a").post(url, payload, format="json", headers=headers)
+        other = guest("guest-session-b").post(url, payload, format="json", headers=headers)
+        retry = guest("guest-session-a").post(url, payload, format="json", headers=headers)
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertNotEqual(other.json()["order_id"], first.json()["order_id"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        # Without a session, or with an unknown one, guests still tip but are not deduplicated
+        unknown = APIClient()
+        unknown.cookies[settings.SESSION_COOKIE_NAME] = "guest-session-a"
+        self.assertEqual(unknown.post(url, payload, format="json", headers=headers).status_code, 201)
+        for _ in range(2):
+            response = guest(None).post(url, payload, format="json", headers=headers)
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(GMOCreditPayment.objects.count(), 5)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.tip("3000")
+        self.tip("3000")
+
+        self.assertEqual(GMOCreditPayment.objects.count(), 2)
+
+
+class AsyncGMOViewTests(GMOTipFlowTestCase):
+
+    def call(self, view, request, **kwargs):
+        force_authenticate(request, user=self.consumer)
+        response = async_to_sync(view.as_view())(request, **kwargs)
+        return response.render()
+
+    def async_tip(self, amount="3000", headers=None):
+        payload = {
+            "staff_uid": str(self.staff.uid),
+            "store_uid": str(self.store.uid),
+            "amount": amount,
+            "token": "stub-token",
+        }
+        request = APIRequestFactory().post(
+            "/payment_service/gmo-pg/credit-card/", payload, format="json", headers=headers
+        )
+        return self.call(AsyncGMOCreditCardPaymentView, request)
+
+    def test_tip_is_captured_and_distributed(self):
+        response = self.async_tip("3000")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        payment = GMOCreditPayment.objects.get(order_id=response.data["order_id"])
+        self.assertEqual(payment.status, "CAPTURE")
+        self.assertTrue(payment.is_distributed)
+        self.staff.balance.refresh_from_db()
+        self.assertEqual(self.staff.balance.current_balance, Decimal("2139.00"))
+        self.assertEqual(self.stub.calls, {"EntryTran": 1, "ExecTran": 1, "SearchTrade": 1})
+
+    def test_retry_with_same_key_replays_the_first_response(self):
+        first = self.async_tip("3000", headers={"Idempotency-Key": "async-1"})
+        retry = self.async_tip("3000", headers={"Idempotency-Key": "async-1"})
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(self.stub.calls["ExecTran"], 1)
+
+    def test_status_is_only_visible_to_the_payer(self):
+        order_id = self.async_tip("3000").data["order_id"]
+        url = f"/payment_service/gmo-pg/credit-card/payment-status/{order_id}/"
+
+        response = self.call(AsyncCheckGMOPaymentStatusView, APIRequestFactory().get(url), order_id=order_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "CAPTURE")
+
+        other = User.objects.create(email="other@example.com", kind=UserKind.CONSUMER, is_verified=True)
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=other)
+        response = async_to_sync(AsyncCheckGMOPaymentStatusView.as_view())(request, order_id=order_id)
+        self.assertEqual(response.status_code, 404)
+
+
+class TipFeedTests(GMOTipFlowTestCase):
+
+    class MemoryHub:
+        """A `FeedHub` without Redis, delivering what the test puts in."""
+
+        def __init__(self):
+            self.queues = {}
+
+        async def subscribe(self, channels):
+            queue = asyncio.Queue()
+            for channel in channels:
+                self.queues[channel] = queue
+            return queue
+
+        async def unsubscribe(self, channels, queue):
+            for channel in channels:
+                self.queues.pop(channel, None)
+
+    def test_channels_follow_the_kind_of_user(self):
+        RestaurantUser.objects.create(restaurant=self.restaurant, user=self.agent, role=UserKind.SALES_AGENT)
+        self.assertEqual(tip_feed_channels(self.staff), [f"feed:staff:{self.staff.uid}"])
+        self.assertEqual(tip_feed_channels(self.owner), [f"feed:restaurant:{self.restaurant.uid}"])
+        self.assertEqual(tip_feed_channels(self.agent), [f"feed:restaurant:{self.restaurant.uid}"])
+        self.assertEqual(tip_feed_channels(self.owner, str(self.store.uid)), [f"feed:store:{self.store.uid}"])
+        self.assertIsNone(tip_feed_channels(self.consumer))
+
+        other_owner = User.objects.create(email="other@example.com", kind=UserKind.RESTAURANT_OWNER)
+        Restaurant.objects.create(name="Other", restaurant_owner=other_owner)
+        self.assertIsNone(tip_feed_channels(other_owner, str(self.store.uid)))
+
+    def test_stream_frames_events_and_unsubscribes(self):
+        hub = self.MemoryHub()
+        channel = feed.channel_name("staff", self.staff.uid)
+
+        async def read():
+            events = feed.stream(hub, [channel], heartbeat=0.01)
+            frames = [await events.__anext__(), await events.__anext__()]
+            hub.queues[channel].put_nowait('{"type": "tip.captured", "uid": "order-1"}')
+            frames.append(await events.__anext__())
+            await events.aclose()
+            return frames
+
+        frames = async_to_sync(read)()
+
+        self.assertEqual(frames[0], "retry: 5000\n\n")
+        self.assertEqual(frames[1], ": keep-alive\n\n")
+        self.assertEqual(
+            frames[2], 'id: order-1\nevent: tip.captured\ndata: {"type": "tip.captured", "uid": "order-1"}\n\n'
+        )
+        self.assertEqual(hub.queues, {})
+
+    def get_feed(self, user=None, query=""):
+        scope = {"type": "http", "method": "GET", "path": "/payment_service/tip-feed/", "query_string": query.encode()}
+        request = ASGIRequest(scope, io.BytesIO())
+        if user is not None:
+            force_authenticate(request, user=user)
+        return async_to_sync(TipFeedView.as_view())(request)
+
+    def test_feed_needs_a_feed_and_redis(self):
+        self.assertEqual(self.get_feed(self.consumer).status_code, 403)
+        response = self.get_feed(self.staff)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data["error"], "The tip feed is unavailable.")
+        self.assertIsNone(feed.publish("tip.captured", {"uid": "order-1"}, staff_uid=self.staff.uid))
+
+    def test_feed_is_not_streamed_under_wsgi(self):
+        request = APIRequestFactory().get("/payment_service/tip-feed/")
+        force_authenticate(request, user=self.staff)
+        response = async_to_sync(TipFeedView.as_view())(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data["error"], "The tip feed needs an ASGI server.")
+
+    def test_event_source_clients_open_the_feed_with_a_token(self):
+        client = APIClient()
+        client.force_authenticate(self.consumer)
+        self.assertEqual(client.post("/payment_service/tip-feed/token/").status_code, 403)
+        client.force_authenticate(self.staff)
+        token = client.post("/payment_service/tip-feed/token/").data["token"]
+
+        # Past the authentication, there is no Redis here
+        response = self.get_feed(query=f"token={token}")
+        self.assertEqual(response.data["error"], "The tip feed is unavailable.")
+        self.assertEqual(self.get_feed(query="token=forged").status_code, 403)
+        with mock.patch.object(feed, "TOKEN_MAX_AGE", -1):
+            self.assertEqual(self.get_feed(query=f"token={token}").status_code, 403)
+
+
+class FeePolicyTests(GMOTipFlowTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(fees.invalidate_fee_policies)
+
+    def test_shares_add_up_to_the_net_amount(self):
+        cent = fees.DEFAULT_POLICY._replace(rounding="cent")
+        split = fees.split("3000", cent)
+        self.assertEqual(split.fee, Decimal("148.00"))
+        self.assertEqual((split.staff, split.glow_admin, split.fc_admin, split.sales_agent),
+                         (Decimal("2139.00"), Decimal("213.90"), Decimal("213.90"), Decimal("285.20")))
+
+        # 1001 yen: fee 76.036, net 924.964, staff 693.723, agent 92.4964
+        yen = fees.DEFAULT_POLICY._replace(rounding="yen")
+        split = fees.split("1001", yen)
+        self.assertEqual((split.fee, split.net), (Decimal("76.00"), Decimal("925.00")))
+        self.assertEqual((split.staff, split.glow_admin, split.fc_admin, split.sales_agent),
+                         (Decimal("694.00"), Decimal("69.00"), Decimal("69.00"), Decimal("93.00")))
+
+        amounts = [Decimal(amount) for amount in ("1", "99.99", "1001", "3000", "123456.78")]
+        for policy in (cent, yen):
+            count, totals = fees.split_totals(amounts, policy)
+            self.assertEqual(count, 5)
+            self.assertEqual(totals.staff + totals.glow_admin + totals.fc_admin + totals.sales_agent, totals.net)
+            splits = [fees.split(amount, policy) for amount in amounts]
+            self.assertEqual(totals, fees.Split(*(sum(values) for values in zip(*splits))))
+
+    def test_default_policy_splits_like_before_fee_policies(self):
+        for amount in ("1", "99.99", "1001", "1015", "1150", "3000", "123456.78"):
+            amount = Decimal(amount)
+            # The shares credited before fee policies, rounded by the balance columns
+            fee = amount * Decimal("0.036") + Decimal("40")
+            net = amount - fee
+            management = net * Decimal("0.25")
+            legacy = [fee, net, net * Decimal("0.75"), management * Decimal("0.30"),
+                      management * Decimal("0.30"), management * Decimal("0.40")]
+            expected = fees.Split(amount, *(value.quantize(Decimal("0.01"), ROUND_HALF_UP) for value in legacy))
+            self.assertEqual(fees.split(amount, fees.DEFAULT_POLICY), expected)
+
+        # 1015 yen: staff 703.845, rounded half up like Postgres
+        self.assertEqual(fees.split("1015", fees.DEFAULT_POLICY).staff, Decimal("703.85"))
+        # 1002 yen: net 925.928, staff 694.446, agent 92.5928, a cent is lost
+        split = fees.split("1002", fees.DEFAULT_POLICY)
+        self.assertEqual((split.net, split.staff, split.glow_admin, split.sales_agent),
+                         (Decimal("925.93"), Decimal("694.45"), Decimal("69.44"), Decimal("92.59")))
+        self.assertEqual(fees.split("1002", fees.DEFAULT_POLICY._replace(rounding="cent")).glow_admin,
+                         Decimal("69.45"))
+
+    @skipUnless(fees.numpy, "NumPy is not installed")
+    def test_vectorised_totals_match_the_python_engine(self):
+        amounts = list(range(1, 20000, 7))
+        for policy in (fees.DEFAULT_POLICY, fees.DEFAULT_POLICY._replace(rounding="cent"),
+                       fees.DEFAULT_POLICY._replace(rounding="yen", staff_rate=Decimal("0.8"))):
+            vectorised = fees.split_totals(amounts, policy)
+            with mock.patch.object(fees, "numpy", None):
+                self.assertEqual(fees.split_totals(amounts, policy), vectorised)
+
+    def test_payments_are_split_by_the_policy_in_effect(self):
+        first = self.tip("3000").data["order_id"]
+        GMOCreditPayment.objects.filter(order_id=first).update(created_at=timezone.now() - datetime.timedelta(days=3))
+        FeePolicy.objects.create(
+            version=1, effective_from=timezone.now() - datetime.timedelta(days=1), staff_rate=Decimal("0.80")
+        )
+        self.tip("3000")
+
+        self.staff.balance.refresh_from_db()
+        # 2139.00 + (3000 - 148) * 0.80
+        self.assertEqual(self.staff.balance.current_balance, Decimal("4420.60"))
+        self.assertEqual(fees.policy_at(timezone.now() - datetime.timedelta(days=2)), fees.DEFAULT_POLICY)
+
+    def test_simulation_replays_a_date_range(self):
+        FeePolicy.objects.create(
+            version=1, effective_from=timezone.now() - datetime.timedelta(days=1), staff_rate=Decimal("0.80")
+        )
+        self.tip("3000")
+        self.tip("5000")
+        today = timezone.localdate()
+        payload = {"date_from": str(today - datetime.timedelta(days=3)), "date_to": str(today), "version": 1,
+                   "staff_rate": "0.75"}
+        url = "/payment_service/analytics/fee-simulation/"
+
+        self.assertEqual(self.client.post(url, payload, format="json").status_code, 403)
+        admin = User.objects.create(email="admin@example.com", kind=UserKind.SUPER_ADMIN, is_verified=True)
+        self.client.force_authenticate(admin)
+        response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["payments"], 2)
+        # Both tips were split by version 1: 2852 * 0.80 + 4780 * 0.80
+        self.assertEqual(response.data["current"]["staff"], "6105.60")
+        self.assertEqual(response.data["candidate"]["staff"], "5724.00")
+        self.assertEqual(response.data["difference"]["staff"], "-381.60")
+        self.assertEqual(response.data["candidate"]["fee"], "368.00")
+
+        response = self.client.post(url, {**payload, "sales_agent_rate": "0.5"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_simulation_candidate_rounds_to_the_cent_by_default(self):
+        self.tip("1002")
+        today = timezone.localdate()
+        payload = {"date_from": str(today), "date_to": str(today)}
+        admin = User.objects.create(email="admin@example.com", kind=UserKind.SUPER_ADMIN, is_verified=True)
+        self.client.force_authenticate(admin)
+        url = "/payment_service/analytics/fee-simulation/"
+
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        # The payment was split with the legacy rounding, the candidate with the cent one
+        self.assertEqual(response.data["current"]["glow_admin"], "69.44")
+        self.assertEqual(response.data["candidate"]["glow_admin"], "69.45")
+        response = self.client.post(url, {**payload, "rounding": "legacy"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class PaymentArchiveTestCase(GMOTipFlowTestCase):
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            "gmo_archive": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+                "OPTIONS": {"location": archive_dir.name},
+            },
+        }
+        override = override_settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def make_payment(self, order_id, created_at, customer=None, **fields):
+        fields = {"status": "CAPTURE", "is_distributed": True, **fields}
+        payment = GMOCreditPayment.objects.create(
+            order_id=order_id,
+            customer=customer,
+            staff_uid=self.staff.uid,
+            store_uid=self.store.uid,
+            amount=Decimal("1000.00"),
+            token="secret",
+            **fields,
+        )
+        GMOCreditPayment.objects.filter(pk=payment.pk).update(created_at=created_at)
+        return payment
+
+
+class PaymentArchiveTests(PaymentArchiveTestCase):
+
+    def test_month_is_archived_and_readable(self):
+        january = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        paid = self.make_payment("old-1", january, customer=self.consumer)
+        self.make_payment("old-2", january)
+        self.make_payment("kept", datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        review = Review.objects.create(payment=paid, transaction_id="old-1", message="Thanks")
+
+        archive = archive_month(datetime.date(2024, 1, 1))
+
+        self.assertEqual((archive.row_count, archive.total_amount), (2, Decimal("2000.00")))
+        self.assertEqual(list(GMOCreditPayment.objects.values_list("order_id", flat=True)), ["kept"])
+        review.refresh_from_db()
+        self.assertIsNone(review.payment_id)
+
+        client = APIClient()
+        client.force_authenticate(self.consumer)
+        response = client.get("/payment_service/gmo-pg/credit-card/payment-history/archive/2024/1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["order_id"] for row in response.data["results"]], ["old-1"])
+        self.assertEqual(response.data["results"][0]["restaurant_name"], "Tips")
+        self.assertEqual(response.data["results"][0]["customer_name"], self.consumer.name)
+
+        client.force_authenticate(self.staff)
+        response = client.get("/payment_service/gmo-pg/credit-card/payment-history/archive/2024/1/")
+        self.assertEqual(len(response.data["results"]), 2)
+        response = client.get("/payment_service/gmo-pg/credit-card/payment-history/archive/2024/2/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_is_paged_newest_first(self):
+        for day in (3, 1, 2):
+            self.make_payment(f"day-{day}", datetime.datetime(2024, 1, day, tzinfo=datetime.timezone.utc))
+        archive_month(datetime.date(2024, 1, 1))
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        url = "/payment_service/gmo-pg/credit-card/payment-history/archive/2024/1/?page_size=2"
+        response = client.get(url)
+        self.assertEqual([row["order_id"] for row in response.data["results"]], ["day-3", "day-2"])
+        self.assertIsNone(response.data["previous"])
+        response = client.get(response.data["next"])
+        self.assertEqual([row["order_id"] for row in response.data["results"]], ["day-1"])
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+        self.assertEqual(client.get(f"{url}&page=0").status_code, 404)
+
+    def test_order_ids_stay_taken_after_archiving(self):
+        self.make_payment("once", datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc))
+        archive_month(datetime.date(2024, 1, 1))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.make_payment("once", datetime.datetime(2024, 2, 15, tzinfo=datetime.timezone.utc))
+        payment = self.make_payment("twice", datetime.datetime(2024, 2, 15, tzinfo=datetime.timezone.utc))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GMOCreditPayment.objects.filter(pk=payment.pk).update(order_id="once")
+
+    def test_month_changed_while_archived_is_not_deleted(self):
+        january = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        payment = self.make_payment("changed", january)
+        write_csv = archive_module._write_csv
+
+        def write_then_change(rows, target):
+            write_csv(rows, target)
+            GMOCreditPayment.objects.filter(pk=payment.pk).update(status="CANCEL")
+
+        with mock.patch.object(archive_module, "_write_csv", write_then_change):
+            with self.assertRaises(ArchiveError):
+                archive_month(datetime.date(2024, 1, 1))
+        self.assertFalse(ArchivedPaymentMonth.objects.exists())
+        self.assertTrue(GMOCreditPayment.objects.filter(order_id="changed").exists())
+        self.assertFalse(archive_module.archive_storage().exists("gmo_payments/2024/2024-01.csv.gz"))
+
+    def test_month_with_undistributed_payments_is_not_archived(self):
+        self.make_payment("pending", datetime.datetime(2024, 3, 2, tzinfo=datetime.timezone.utc), is_distributed=False)
+
+        with self.assertRaises(ArchiveError):
+            archive_month(datetime.date(2024, 3, 1))
+        self.assertFalse(ArchivedPaymentMonth.objects.exists())
+        self.assertTrue(GMOCreditPayment.objects.filter(order_id="pending").exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "Rounds like the Postgres numeric columns")
+class LegacyRoundingTests(GMOTipFlowTestCase):
+
+    def test_default_policy_matches_the_stored_shares(self):
+        # Shares were credited unrounded before fee policies, the columns rounded them
+        for amount, share, field in (("1015", "703.845", "staff"), ("1150", "80.145", "glow_admin")):
+            Balance.objects.filter(user=self.staff).update(current_balance=Decimal(share))
+            self.staff.balance.refresh_from_db()
+            split = fees.split(amount, fees.DEFAULT_POLICY)
+            self.assertEqual(self.staff.balance.current_balance, getattr(split, field))
+
+
+@skipUnless(connection.vendor == "postgresql", "Payments are only partitioned on Postgres")
+class PaymentPartitionTests(PaymentArchiveTestCase):
+
+    def test_payments_are_partitioned(self):
+        self.assertTrue(partitions.is_partitioned())
+        current = partitions.month_start(datetime.date.today())
+        self.assertIn(current, partitions.existing_partitions())
+
+    def test_archiving_empties_the_partition_and_the_default_partition(self):
+        partitions.create_partition(datetime.date(2024, 1, 1))
+        self.make_payment("partitioned", datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc))
+        # No partition for December, the row is in the default partition
+        self.make_payment("default", datetime.datetime(2023, 12, 15, tzinfo=datetime.timezone.utc))
+
+        archive_month(datetime.date(2024, 1, 1))
+        archive_month(datetime.date(2023, 12, 1))
+
+        self.assertNotIn(datetime.date(2024, 1, 1), partitions.existing_partitions())
+        self.assertFalse(GMOCreditPayment.objects.filter(order_id__in=["partitioned", "default"]).exists())
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     MakePaymentView,
@@ -12,14 +13,30 @@ from .views import (
 
 
 from .dashboard_stats import PaymentStatsView
+from .async_views import TipFeedTokenView, TipFeedView
 
 
 from .gmo_pg.views import (
     GMOCreditCardPaymentView,
     RoleBasedPaymentHistoryView,
-    CheckGMOPaymentStatusView
+    CheckGMOPaymentStatusView,
+    ArchivedPaymentHistoryView,
+    StaffEarningsView,
+    AgentCommissionStatementView,
+    FeeSimulationView,
 )
 
+# Gateway bound endpoints have async versions for ASGI deployments
+if settings.ASYNC_PAYMENT_VIEWS:
+    from .async_views import (
+        AsyncPayPalCancelView as PayPalCancelView,
+        AsyncPayPalSuccessView as PayPalSuccessView,
+    )
+    from .gmo_pg.async_views import (
+        AsyncCheckGMOPaymentStatusView as CheckGMOPaymentStatusView,
+        AsyncGMOCreditCardPaymentView as GMOCreditCardPaymentView,
+    )
+
 # Namespace for the app
 app_name = "payment_service"
 
@@ -37,6 +54,11 @@ urlpatterns = [
     # Endppoint to get last 5 messgaes for staff
     path('staff/<uuid:uid>/recent-messages/', StaffRecentMessagesView.as_view(), name='staff-recent-messages'),
 
+    # Server-sent events of new tips, reviews and replies (served by ASGI)
+    path("tip-feed/", TipFeedView.as_view(), name="tip-feed"),
+    # Short-lived token to open the tip feed from EventSource, which cannot send headers
+    path("tip-feed/token/", TipFeedTokenView.as_view(), name="tip-feed-token"),
+
 
     # Endppoint for Bank Details
     path("bank-accounts/", UserBankAccountListCreateView.as_view(), name="user-bank-accounts"),
@@ -48,10 +70,22 @@ urlpatterns = [
     path("gmo-pg/credit-card/", GMOCreditCardPaymentView.as_view(), name="gmo_credit_card_payment"),
     # Get payment history based on user roles
     path("gmo-pg/credit-card/payment-history/", RoleBasedPaymentHistoryView.as_view(), name="gmo_payment_history"),
-    # # Check payment status
-    # path("gmo-pg/credit-card/payment-status/<str:order_id>/", CheckGMOPaymentStatusView.as_view(), name="gmo_payment_status"),
+    # Get payment history of an archived month based on user roles
+    path(
+        "gmo-pg/credit-card/payment-history/archive/<int:year>/<int:month>/",
+        ArchivedPaymentHistoryView.as_view(),
+        name="gmo_archived_payment_history",
+    ),
+    # Check payment status
+    path("gmo-pg/credit-card/payment-status/<str:order_id>/", CheckGMOPaymentStatusView.as_view(), name="gmo_payment_status"),
 
 
     
     path("analytics/stats/", PaymentStatsView.as_view(), name="payment_stats"),
+    # Tips and earnings per staff over a date range
+    path("analytics/staff-earnings/", StaffEarningsView.as_view(), name="staff_earnings"),
+    # Sales agent commissions per restaurant and month
+    path("analytics/agent-commissions/", AgentCommissionStatementView.as_view(), name="agent_commissions"),
+    # Totals per role of a date range replayed under a candidate fee policy
+    path("analytics/fee-simulation/", FeeSimulationView.as_view(), name="fee_simulation"),
 ]
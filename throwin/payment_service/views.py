@@ -10,10 +10,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.choices import UserKind
+from common import feed
+from common.idempotency import IdempotentCreateMixin
 
 from .filters import PaymentHistoryFilter
 from .helpers.paypal_helper import create_paypal_payment, execute_paypal_payment
 from .models import PaymentHistory
+from .recent_messages import push_message, recent_messages
 from .serializers import (
     MakePaymentSerializer,
     StaffPaymentHistorySerializer,
@@ -50,9 +53,10 @@ class StandardResultsPagination(pagination.PageNumberPagination):
         )
     },
 )
-class MakePaymentView(generics.CreateAPIView):
+class MakePaymentView(IdempotentCreateMixin, generics.CreateAPIView):
     """
     Create a payment and generate a PayPal approval URL.
+    Retries carrying the same `Idempotency-Key` header get the first response back.
     """
     serializer_class = MakePaymentSerializer
     permission_classes = [permissions.AllowAny]
@@ -107,6 +111,28 @@ class MakePaymentView(generics.CreateAPIView):
         raise serializers.ValidationError({"error": error_message})
 
 
+def settle_paypal_payment(payment):
+    """Follow-ups of a PayPal payment that just succeeded."""
+    staff_uid = payment.staff.uid
+    store_uid = payment.store.uid if payment.store_id else None
+    push_message(staff_uid, payment.message, payment.payment_date, payment.nickname)
+    feed.publish(
+        "tip.captured",
+        {
+            "uid": payment.uid,
+            "staff_uid": staff_uid,
+            "store_uid": store_uid,
+            "amount": payment.amount,
+            "nickname": payment.nickname,
+            "message": payment.message,
+            "created_at": payment.payment_date,
+        },
+        staff_uid=staff_uid,
+        store_uid=store_uid,
+        restaurant_uid=payment.restaurant.uid,
+    )
+
+
 @extend_schema(
     parameters=[
         OpenApiParameter("search", str, description="Search across relevant fields."),
@@ -188,8 +214,11 @@ class PayPalSuccessView(APIView):
         if paypal_response["success"]:
             try:
                 payment = PaymentHistory.objects.get(transaction_id=payment_id)
+                captured = payment.status != "success"
                 payment.status = "success"
                 payment.save()
+                if captured:
+                    settle_paypal_payment(payment)
                 return Response({"message": "Payment completed successfully."}, status=status.HTTP_200_OK)
             except PaymentHistory.DoesNotExist:
                 return Response({"error": "Payment not found in the system."}, status=status.HTTP_404_NOT_FOUND)
@@ -220,9 +249,7 @@ class PayPalCancelView(APIView):
 
 
 
-from .serializers import StaffRecentMessagesSerializer
 from rest_framework import status, permissions
-from accounts.models import User
 
 class StaffRecentMessagesView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -231,25 +258,15 @@ class StaffRecentMessagesView(APIView):
     """
     def get(self, request, uid):
         try:
-            # Fetch the staff user with the given UID
-            staff = User.objects.get(uid=uid, kind=UserKind.RESTAURANT_STAFF)
-
-            # Fetch the last 5 transactions with non-empty messages for the staff
-            recent_transactions = PaymentHistory.objects.filter(
-                staff=staff, message__isnull=False
-            ).exclude(
-                message__exact=""
-            ).order_by('-payment_date')[:5]
+            # The last 5 messages, from the Redis list of the staff
+            messages = recent_messages(uid)
+            if messages is None:
+                return Response(
+                    {"error": "Staff not found or not authorized."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return Response(messages, status=status.HTTP_200_OK)
 
-            # Serialize the transaction data
-            serializer = StaffRecentMessagesSerializer(recent_transactions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except User.DoesNotExist:
-            return Response(
-                {"error": "Staff not found or not authorized."},
-                status=status.HTTP_404_NOT_FOUND,
-            )
         except Exception as e:
             return Response(
                 {"error": "An unexpected error occurred. Please try again later."},
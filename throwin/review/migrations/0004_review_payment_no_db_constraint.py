@@ -0,0 +1,20 @@
+# Generated by Django 5.1.8 on 2026-10-19 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0013_gmocreditpayment_hot_path_indexes'),
+        ('review', '0003_review_staff_uid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='payment',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The payment transaction this review is associated with.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='payment_service.gmocreditpayment'),
+        ),
+    ]
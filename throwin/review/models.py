@@ -13,6 +13,9 @@ class Review(BaseModel):
         blank=True,
         null=True,
         related_name="reviews",
+        # No database constraint: payments live in a partitioned table in
+        # Postgres, which cannot be referenced by id alone
+        db_constraint=False,
         help_text="The payment transaction this review is associated with."
     )
     payment_type = models.CharField(
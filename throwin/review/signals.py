@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender="review.Review")
+def publish_review(sender, instance, created, **kwargs):
+    from common import feed
+
+    if not created:
+        return
+    payload = {
+        "uid": instance.uid,
+        "staff_uid": instance.staff_uid,
+        "store_uid": instance.store_uid,
+        "consumer_name": instance.consumer_name,
+        "message": instance.message,
+        "created_at": instance.created_at,
+    }
+    staff_uid, store_uid = instance.staff_uid, instance.store_uid
+    transaction.on_commit(
+        lambda: feed.publish("review.created", payload, staff_uid=staff_uid, store_uid=store_uid)
+    )
+
+
+@receiver(post_save, sender="review.Reply")
+def publish_reply(sender, instance, created, **kwargs):
+    from common import feed
+
+    if not created:
+        return
+    review = instance.review
+    author = instance.restaurant_owner or instance.consumer
+    payload = {
+        "uid": instance.uid,
+        "review_uid": review.uid,
+        "staff_uid": review.staff_uid,
+        "store_uid": review.store_uid,
+        "author_name": author.name if author else None,
+        "message": instance.message,
+        "created_at": instance.created_at,
+    }
+    staff_uid, store_uid = review.staff_uid, review.store_uid
+    transaction.on_commit(
+        lambda: feed.publish("reply.created", payload, staff_uid=staff_uid, store_uid=store_uid)
+    )
@@ -0,0 +1,134 @@
+"""
+Cached configuration snapshots of stores.
+
+The tip and gacha paths only need a few settings of a store: its ids, status,
+throwin amounts, gacha flag, exposure and the restaurant and sales agent it
+belongs to. `get_store_config` returns them as an immutable `StoreConfig`
+from a two tier cache (in-process + Redis), keyed by the store uid, and only
+reads the database on a miss. Configs are dropped by the signals in
+``store.signals`` whenever the store or its restaurant changes; another
+process can keep its in-process copy for `STORE_CONFIG_CACHE_LOCAL_TTL`
+seconds at most.
+"""
+
+import logging
+import uuid
+import zlib
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from common.cache import TwoTierCache
+from common.choices import Status
+from store.choices import ExposeStatus, GachaTicketEnabled
+
+logger = logging.getLogger(__name__)
+
+config_cache = TwoTierCache(
+    "store:config",
+    local_ttl=getattr(settings, "STORE_CONFIG_CACHE_LOCAL_TTL", 5),
+    remote_ttl=getattr(settings, "STORE_CONFIG_CACHE_TTL", 3600),
+)
+
+
+class StoreConfig(NamedTuple):
+    id: int
+    uid: uuid.UUID
+    code: Optional[str]
+    name: str
+    status: str
+    throwin_amounts: tuple
+    gacha_enabled: bool
+    exposure: str
+    restaurant_id: Optional[int]
+    restaurant_uid: Optional[uuid.UUID]
+    sales_agent_id: Optional[int]
+
+    @property
+    def is_active(self):
+        return self.status == Status.ACTIVE
+
+    @property
+    def is_public(self):
+        return self.exposure == ExposeStatus.PUBLIC
+
+
+# Cached configs are dropped whenever the fields of StoreConfig change
+_TAG = zlib.crc32(repr(StoreConfig._fields).encode())
+
+
+def parse_throwin_amounts(value):
+    """The amounts of a `Store.throwin_amounts` string, skipping the invalid ones."""
+    amounts = []
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        try:
+            amounts.append(Decimal(part.strip()))
+        except InvalidOperation:
+            logger.warning("Invalid throwin amount %r", part)
+    return tuple(amounts)
+
+
+def build_store_config(store):
+    restaurant = store.restaurant
+    return StoreConfig(
+        id=store.id,
+        uid=store.uid,
+        code=store.code,
+        name=store.name,
+        status=store.status,
+        throwin_amounts=parse_throwin_amounts(store.throwin_amounts),
+        gacha_enabled=store.gacha_enabled == GachaTicketEnabled.YES,
+        exposure=store.exposure,
+        restaurant_id=store.restaurant_id,
+        restaurant_uid=restaurant.uid if restaurant else None,
+        sales_agent_id=restaurant.sales_agent_id if restaurant else None,
+    )
+
+
+def _key(store_uid):
+    return f"{_TAG}:{store_uid}"
+
+
+def get_store_config(store_uid):
+    """The `StoreConfig` of the store with `store_uid`, None when there is none."""
+    from store.models import Store
+
+    key = _key(store_uid)
+    config = config_cache.get(key)
+    if config is not None:
+        return config
+    store = Store.objects.select_related("restaurant").filter(uid=store_uid).first()
+    if store is None:
+        return None
+    config = build_store_config(store)
+    config_cache.set(key, config)
+    return config
+
+
+def get_store_config_by_code(code):
+    """The `StoreConfig` of the store with `code`, None when there is none."""
+    from store.models import Store
+
+    # The uid a code maps to is checked against the config, a code given to
+    # another store is looked up again
+    code_key = f"{_TAG}:code:{code}"
+    store_uid = config_cache.get(code_key)
+    if store_uid is not None:
+        config = get_store_config(store_uid)
+        if config is not None and config.code == code:
+            return config
+    store = Store.objects.select_related("restaurant").filter(code=code).first()
+    if store is None:
+        return None
+    config = build_store_config(store)
+    config_cache.set(_key(store.uid), config)
+    config_cache.set(code_key, store.uid)
+    return config
+
+
+def invalidate_store_config(*store_uids):
+    for store_uid in store_uids:
+        config_cache.delete(_key(store_uid))
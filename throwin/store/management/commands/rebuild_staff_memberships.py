@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.choices import UserKind
+from common.cache import get_redis_client
+from store.membership import KEY, load_memberships, write_membership
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the staff membership index in Redis from the StoreUser and "
+        "RestaurantUser rows: drop every entry, then write the staff chunk by chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Staff members per chunk.")
+
+    def handle(self, *args, **options):
+        client = get_redis_client()
+        if client is None:
+            raise CommandError("The default cache is not Redis, there is no membership index to rebuild.")
+        chunk_size = options["chunk_size"]
+
+        dropped = 0
+        keys = []
+        for key in client.scan_iter(match=KEY.format(uid="*"), count=chunk_size):
+            keys.append(key)
+            if len(keys) >= chunk_size:
+                dropped += client.delete(*keys)
+                keys = []
+        if keys:
+            dropped += client.delete(*keys)
+
+        written = 0
+        last_id = 0
+        staff = User.objects.filter(kind=UserKind.RESTAURANT_STAFF).order_by("id")
+        while True:
+            ids = list(staff.filter(id__gt=last_id).values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            memberships = load_memberships(User.objects.filter(id__in=ids))
+            with client.pipeline() as pipe:
+                for staff_uid, membership in memberships.items():
+                    write_membership(pipe, staff_uid, membership)
+                pipe.execute()
+            written += len(memberships)
+
+        self.stdout.write(self.style.SUCCESS(f"{dropped} keys dropped, {written} staff memberships written."))
@@ -0,0 +1,157 @@
+"""
+Staff membership index: the stores and restaurants each staff member works at.
+
+Tips are only accepted for staff of the store's restaurant, and staff pages
+are only shown under a store the staff works at. The index keeps, for each
+staff uid, in Redis:
+
+    membership:staff:{uid}              hash of the user id and active flag
+    membership:staff:{uid}:stores       set of store uids
+    membership:staff:{uid}:restaurants  set of restaurant ids
+
+so `get_staff_membership` is one pipelined round trip. The signals in
+``store.signals`` rewrite an entry from the database once a ``StoreUser``
+or ``RestaurantUser`` change commits and drop it when the user changes; a
+missing entry is built on first read and ``rebuild_staff_memberships``
+rewrites all of them. Without Redis the membership is read from the database.
+
+Only staff users and their staff roles are indexed, the rule tip validation
+always used. Checks that accepted other users before look them up in the
+database when the index has no entry.
+"""
+
+import logging
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+
+from accounts.choices import UserKind
+from common.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+KEY = "membership:staff:{uid}"
+
+
+class StaffMembership(NamedTuple):
+    user_id: int
+    is_active: bool
+    store_uids: frozenset
+    restaurant_ids: frozenset
+
+    def works_at_store(self, store_uid):
+        return str(store_uid) in self.store_uids
+
+    def works_at_restaurant(self, restaurant_id):
+        return restaurant_id in self.restaurant_ids
+
+
+def membership_keys(staff_uid):
+    key = KEY.format(uid=staff_uid)
+    return key, f"{key}:stores", f"{key}:restaurants"
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def load_memberships(users):
+    """
+    `{uid: StaffMembership}` of the staff among `users`, a queryset of users,
+    read from the database in three queries.
+    """
+    from store.models import RestaurantUser, StoreUser
+
+    staff = {
+        user_id: (uid, is_active)
+        for user_id, uid, is_active in users.filter(kind=UserKind.RESTAURANT_STAFF).values_list(
+            "id", "uid", "is_active"
+        )
+    }
+    if not staff:
+        return {}
+    store_uids = {user_id: set() for user_id in staff}
+    for user_id, store_uid in StoreUser.objects.filter(
+        user_id__in=staff, role=UserKind.RESTAURANT_STAFF
+    ).values_list("user_id", "store__uid"):
+        store_uids[user_id].add(str(store_uid))
+    restaurant_ids = {user_id: set() for user_id in staff}
+    for user_id, restaurant_id in RestaurantUser.objects.filter(
+        user_id__in=staff, role=UserKind.RESTAURANT_STAFF
+    ).values_list("user_id", "restaurant_id"):
+        restaurant_ids[user_id].add(restaurant_id)
+    return {
+        str(uid): StaffMembership(user_id, is_active, frozenset(store_uids[user_id]), frozenset(restaurant_ids[user_id]))
+        for user_id, (uid, is_active) in staff.items()
+    }
+
+
+def write_membership(pipe, staff_uid, membership):
+    """Queue the commands replacing the entry of `staff_uid` on a Redis pipeline."""
+    key, stores_key, restaurants_key = membership_keys(staff_uid)
+    pipe.delete(key, stores_key, restaurants_key)
+    pipe.hset(key, mapping={"id": membership.user_id, "active": int(membership.is_active)})
+    if membership.store_uids:
+        pipe.sadd(stores_key, *membership.store_uids)
+    if membership.restaurant_ids:
+        pipe.sadd(restaurants_key, *membership.restaurant_ids)
+
+
+def get_staff_membership(staff_uid):
+    """The `StaffMembership` of the staff member with `staff_uid`, None when there is none."""
+    client = get_redis_client()
+    if client is None:
+        return load_memberships(User.objects.filter(uid=staff_uid)).get(str(staff_uid))
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            key, stores_key, restaurants_key = membership_keys(staff_uid)
+            pipe.hgetall(key)
+            pipe.smembers(stores_key)
+            pipe.smembers(restaurants_key)
+            meta, store_uids, restaurant_ids = pipe.execute()
+    except Exception as exc:
+        logger.warning("Staff membership of %s unavailable, using the database: %s", staff_uid, exc)
+        return load_memberships(User.objects.filter(uid=staff_uid)).get(str(staff_uid))
+    if meta:
+        meta = {_text(field): _text(value) for field, value in meta.items()}
+        return StaffMembership(
+            user_id=int(meta["id"]),
+            is_active=meta["active"] == "1",
+            store_uids=frozenset(_text(store_uid) for store_uid in store_uids),
+            restaurant_ids=frozenset(int(restaurant_id) for restaurant_id in restaurant_ids),
+        )
+    return refresh_staff_membership(uid=staff_uid)
+
+
+def refresh_staff_membership(**user_filter):
+    """
+    Rewrite the entries of the users matching `user_filter` (``id=...`` or
+    ``uid=...``) from the database. Returns the membership of the first one,
+    None without Redis.
+    """
+    client = get_redis_client()
+    if client is None:
+        return None
+    memberships = load_memberships(User.objects.filter(**user_filter))
+    if memberships:
+        try:
+            with client.pipeline() as pipe:
+                for staff_uid, membership in memberships.items():
+                    write_membership(pipe, staff_uid, membership)
+                pipe.execute()
+        except Exception as exc:
+            logger.warning("Could not write staff membership of %s: %s", user_filter, exc)
+    return next(iter(memberships.values()), None)
+
+
+def drop_staff_membership(staff_uid):
+    """Drop the entry of a staff member, the next read builds it again."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.delete(*membership_keys(staff_uid))
+    except Exception as exc:
+        logger.warning("Could not drop staff membership of %s: %s", staff_uid, exc)
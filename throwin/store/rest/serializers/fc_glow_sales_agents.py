@@ -19,7 +19,7 @@ from accounts.utils import (
     generate_admin_new_account_activation_url,
     generate_admin_account_activation_url
 )
-from accounts.tasks import send_mail_task
+from common.mail import queue_mail
 
 from payment_service.bank_details.bank_details_model import BankAccount
 
@@ -208,7 +208,7 @@ class OrganizationCreateSerializer(serializers.Serializer):
         activation_url = generate_admin_new_account_activation_url(owner)
         subject = "Activate Your Account"
         message = f"Please click the following link to set password and activate your account: {activation_url}"
-        send_mail_task.delay(subject, message, owner.email)
+        queue_mail(subject, message, owner.email)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -269,7 +269,7 @@ class OrganizationCreateSerializer(serializers.Serializer):
             activation_url = generate_admin_account_activation_url(owner, new_email)
             subject = "Email Change Request"
             message = f"Please click the following link to verify your new email: {activation_url}"
-            send_mail_task.delay(subject, message, new_email)
+            queue_mail(subject, message, new_email)
 
         owner.name = validated_data.get("owner_name", owner.name)
         owner.phone_number = new_phone or owner.phone_number
@@ -628,7 +628,7 @@ class SalesAgentListCreateSerializer(serializers.ModelSerializer):
             )
 
         transaction.on_commit(
-            lambda: send_mail_task.delay(subject, message, user.email)
+            lambda: queue_mail(subject, message, user.email)
         )
 
     def to_representation(self, instance):
@@ -684,7 +684,7 @@ class AdminsChangeEmailRequestSerializer(serializers.Serializer):
         # Send activation email
         subject = "Email Change Request"
         message = f"Please click the following link to verify your new email: {activation_url}"
-        send_mail_task.delay(subject, message, new_email)
+        queue_mail(subject, message, new_email)
 
 
 class ChangeAdminNameSerializer(serializers.Serializer):
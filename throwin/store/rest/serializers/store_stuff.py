@@ -27,6 +27,7 @@ class StoreStuffListSerializer(StaffDetailForConsumerSerializer):
             "username",
             "introduction",
             "score",
+            "likes",
             "image",
             "fun_fact",
         )
@@ -53,6 +54,7 @@ class StoreUserSerializer(serializers.ModelSerializer):
         source="user.profile.introduction", allow_null=True, allow_blank=True
     )
     score = serializers.IntegerField(source="user.profile.total_score", default=0)
+    likes = serializers.IntegerField(source="user.profile.like_count", default=0, read_only=True)
     fun_fact = serializers.CharField(
         source="user.profile.fun_fact", allow_null=True, allow_blank=True
     )
@@ -70,6 +72,7 @@ class StoreUserSerializer(serializers.ModelSerializer):
             "username",
             "introduction",
             "score",
+            "likes",
             "image",
             "fun_fact",
             "store_name",
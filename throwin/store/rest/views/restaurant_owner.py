@@ -12,6 +12,7 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.response import Response
 
 from accounts.choices import UserKind, PublicStatus
+from common.conditional import ConditionalGetMixin, updated_version, version_token
 from common.permissions import (
     CheckAnyPermission,
     IsRestaurantOwnerUser
@@ -41,7 +42,7 @@ User = get_user_model()
     summary="List and Create Stores for Restaurant Owner",
     methods=["GET", "POST"],
 )
-class StoreListCreateView(generics.ListCreateAPIView):
+class StoreListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     """View for restaurant owner to create or list stores."""
 
     filterset_class = StoreFilter
@@ -57,6 +58,12 @@ class StoreListCreateView(generics.ListCreateAPIView):
             return StoreCreateSerializer
         return StoreListSerializer
 
+    def get_version(self):
+        restaurant = self.request.user.get_restaurant_owner_restaurant
+        if restaurant is None:
+            return None
+        return updated_version(Store.objects.filter(restaurant_id=restaurant.id))
+
     def get_queryset(self):
         # Get the restaurant of the logged in restaurant owner
         try:
@@ -356,11 +363,15 @@ class RestaurantOwnerChangeNameView(generics.CreateAPIView):
     summary="Get the restaurant owner's detail.",
     methods=["GET"],
 )
-class RestaurantOwnerDetailView(generics.GenericAPIView):
+class RestaurantOwnerDetailView(ConditionalGetMixin, generics.GenericAPIView):
     available_permission_classes = (IsRestaurantOwnerUser,)
     permission_classes = (CheckAnyPermission,)
     serializer_class = RestaurantOwnerDetailSerializer
 
+    def get_version(self):
+        # Bumped by the owner, their restaurant and their bank accounts
+        return version_token(f"user:{self.request.user.pk}")
+
     def get(self, request, *args, **kwargs):
         # Assuming the user is the restaurant owner
         user = request.user
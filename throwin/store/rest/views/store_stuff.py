@@ -1,11 +1,12 @@
 from django.contrib.auth import get_user_model
 
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from rest_framework import generics, status
 from rest_framework.response import Response
 
 from accounts.choices import UserKind
+from common.conditional import ConditionalGetMixin, version_token
 
 from common.permissions import (
     IsConsumerUser,
@@ -28,10 +29,14 @@ User = get_user_model()
 
 @extend_schema(
     summary="Store stuff list",
-    description="Get store stuff list based on store code",
+    description="Get store stuff list based on store code. "
+                "Pass `ordering=popular` to list the most liked staff first.",
+    parameters=[
+        OpenApiParameter("ordering", str, required=False, enum=["popular"]),
+    ],
     responses=StoreUserSerializer
 )
-class StoreStuffList(generics.ListAPIView):
+class StoreStuffList(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = StoreUserSerializer
     available_permission_classes = (
         IsConsumerOrGuestUser,
@@ -42,6 +47,10 @@ class StoreStuffList(generics.ListAPIView):
     )
     permission_classes = (CheckAnyPermission,)
 
+    def get_version(self):
+        # Bumped by the store, its staff memberships and the staff profiles and likes
+        return version_token(f"store-staff:{self.kwargs.get('code')}")
+
     def get_queryset(self):
         """
         Get users associated with a specific store based on the store code
@@ -54,7 +63,7 @@ class StoreStuffList(generics.ListAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            return StoreUser.objects.filter(
+            queryset = StoreUser.objects.filter(
                 store__code=code, role=UserKind.RESTAURANT_STAFF
             ).select_related(
                 "user",
@@ -62,6 +71,10 @@ class StoreStuffList(generics.ListAPIView):
                 "store",
                 "store__restaurant",
             )
+            if self.request.query_params.get("ordering") == "popular":
+                # The like counters of the profiles, ties in a stable order
+                queryset = queryset.order_by("-user__profile__like_count", "user__uid")
+            return queryset
         except Exception as e:
             return Response({
                 "detail": "Invalid code provided",
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.choices import UserKind
+from accounts.signals import invalidate_cached_users
+from common.conditional import bump_version
+
+
+def _invalidate_store_configs(*store_uids):
+    """Drop store config snapshots now and again once the transaction commits."""
+    from store.config import invalidate_store_config
+
+    def invalidate():
+        invalidate_store_config(*store_uids)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def _refresh_staff_membership(user_id):
+    """Rewrite the staff membership index entry of a user once the transaction commits."""
+    from store.membership import refresh_staff_membership
+
+    transaction.on_commit(lambda: refresh_staff_membership(id=user_id))
+
+
+@receiver(pre_save, sender="store.Restaurant")
+def remember_restaurant_owner(sender, instance, **kwargs):
+    """Keep the owner being replaced, it loses the restaurant along with the new one gaining it."""
+    instance._previous_owner_id = None
+    if not instance._state.adding:
+        instance._previous_owner_id = (
+            sender.objects.filter(pk=instance.pk).values_list("restaurant_owner_id", flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender="store.Restaurant")
+def invalidate_restaurant_snapshots(sender, instance, **kwargs):
+    from notification.inbox import drop_unread_count
+
+    owner_ids = {instance.restaurant_owner_id, getattr(instance, "_previous_owner_id", None)} - {None}
+    agent_ids = instance.restaurant_users.filter(role=UserKind.SALES_AGENT).values_list("user_id", flat=True)
+    invalidate_cached_users(*owner_ids, *agent_ids)
+    if owner_ids:
+        bump_version(*(f"user:{owner_id}" for owner_id in owner_ids))
+    # The owners gain or lose the notifications of the restaurant
+    transaction.on_commit(lambda: drop_unread_count(*owner_ids))
+    # Store configs carry the restaurant uid and its sales agent
+    _invalidate_store_configs(*instance.stores.values_list("uid", flat=True))
+
+
+@receiver([post_save, post_delete], sender="store.Store")
+def bump_store_versions(sender, instance, **kwargs):
+    # Store names are shown in every consumer's spins
+    bump_version(f"store-staff:{instance.code}", "stores")
+    _invalidate_store_configs(instance.uid)
+
+
+@receiver([post_save, post_delete], sender="store.RestaurantUser")
+def invalidate_restaurant_user_snapshot(sender, instance, **kwargs):
+    from notification.inbox import drop_unread_count
+
+    invalidate_cached_users(instance.user_id)
+    _refresh_staff_membership(instance.user_id)
+    # The notifications of the restaurant join or leave the user's inbox
+    user_id = instance.user_id
+    transaction.on_commit(lambda: drop_unread_count(user_id))
+
+
+@receiver([post_save, post_delete], sender="store.StoreUser")
+def invalidate_store_like_ranking(sender, instance, **kwargs):
+    from accounts.likes import invalidate_ranking
+    from store.models import Store
+
+    store_id = instance.store_id
+    transaction.on_commit(lambda: invalidate_ranking(store_id))
+    _refresh_staff_membership(instance.user_id)
+    # Without loading the store, which may be gone with a cascaded delete
+    code = Store.objects.filter(pk=store_id).values_list("code", flat=True).first()
+    if code:
+        bump_version(f"store-staff:{code}")
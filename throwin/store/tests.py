@@ -1,3 +1,104 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from accounts.choices import UserKind
+from accounts.models import User
+from payment_service.models import PaymentHistory
+from store.choices import GachaTicketEnabled
+from store.config import config_cache, get_store_config
+from store.membership import get_staff_membership
+from store.models import Restaurant, RestaurantUser, Store, StoreUser
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StoreConfigTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(email="owner@example.com", kind=UserKind.RESTAURANT_OWNER)
+        cls.agent = User.objects.create(email="agent@example.com", kind=UserKind.SALES_AGENT)
+        cls.restaurant = Restaurant.objects.create(name="Config", restaurant_owner=owner)
+        cls.store = Store.objects.create(
+            restaurant=cls.restaurant,
+            name="Config Store",
+            code="conf1",
+            throwin_amounts="1000, 5000,,oops",
+            gacha_enabled=GachaTicketEnabled.YES,
+        )
+
+    def setUp(self):
+        config_cache.clear_local()
+
+    def test_config_is_parsed_and_cached(self):
+        config = get_store_config(self.store.uid)
+        self.assertEqual(config.throwin_amounts, (Decimal("1000"), Decimal("5000")))
+        self.assertTrue(config.gacha_enabled)
+        self.assertEqual(config.restaurant_uid, self.restaurant.uid)
+        self.assertIsNone(config.sales_agent_id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_store_config(self.store.uid), config)
+        self.assertIsNone(get_store_config("00000000-0000-0000-0000-000000000000"))
+
+    def test_store_and_restaurant_changes_invalidate_the_config(self):
+        get_store_config(self.store.uid)
+
+        self.store.gacha_enabled = GachaTicketEnabled.NO
+        self.store.save()
+        self.assertFalse(get_store_config(self.store.uid).gacha_enabled)
+
+        self.restaurant.sales_agent = self.agent
+        self.restaurant.save()
+        self.assertEqual(get_store_config(self.store.uid).sales_agent_id, self.agent.id)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaffMembershipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(email="owner@example.com", kind=UserKind.RESTAURANT_OWNER)
+        cls.restaurant = Restaurant.objects.create(name="Members", restaurant_owner=owner)
+        cls.store = Store.objects.create(restaurant=cls.restaurant, name="Members Store", code="memb1")
+        cls.other_store = Store.objects.create(restaurant=cls.restaurant, name="Other Store", code="memb2")
+        cls.staff = User.objects.create(
+            email="staff@example.com", username="memberstaff", kind=UserKind.RESTAURANT_STAFF
+        )
+        RestaurantUser.objects.create(restaurant=cls.restaurant, user=cls.staff, role=UserKind.RESTAURANT_STAFF)
+        StoreUser.objects.create(store=cls.store, user=cls.staff, role=UserKind.RESTAURANT_STAFF)
+
+    def setUp(self):
+        config_cache.clear_local()
+
+    def test_membership_lists_stores_and_restaurants(self):
+        membership = get_staff_membership(self.staff.uid)
+        self.assertEqual(membership.user_id, self.staff.id)
+        self.assertTrue(membership.is_active)
+        self.assertTrue(membership.works_at_store(self.store.uid))
+        self.assertFalse(membership.works_at_store(self.other_store.uid))
+        self.assertTrue(membership.works_at_restaurant(self.restaurant.id))
+        self.assertIsNone(get_staff_membership(self.restaurant.restaurant_owner.uid))
+
+    def test_staff_page_needs_the_staff_to_work_at_the_store(self):
+        response = self.client.get(f"/auth/users/store/{self.store.code}/staff/{self.staff.username}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["store_name"], self.store.name)
+
+        response = self.client.get(f"/auth/users/store/{self.other_store.code}/staff/{self.staff.username}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_checks_match_the_database_rules(self):
+        # Not a staff user, so not in the index, but a staff member of the store
+        member = User.objects.create(email="member@example.com", username="member", kind=UserKind.CONSUMER)
+        StoreUser.objects.create(store=self.store, user=member, role=UserKind.RESTAURANT_STAFF)
+        RestaurantUser.objects.create(restaurant=self.restaurant, user=member, role=UserKind.RESTAURANT_STAFF)
+        self.assertIsNone(get_staff_membership(member.uid))
+
+        response = self.client.get(f"/auth/users/store/{self.store.code}/staff/{member.username}")
+        self.assertEqual(response.status_code, 200)
+        PaymentHistory(
+            staff=member, restaurant=self.restaurant, store=self.store, amount=Decimal("1000")
+        ).clean()
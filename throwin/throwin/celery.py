@@ -17,6 +17,11 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Automatically discover tasks in all registered Django app configs
 app.autodiscover_tasks()
 
+# Export task durations to Prometheus
+from common.metrics import connect_celery_signals  # noqa: E402
+
+connect_celery_signals()
+
 # Celery configuration with Redis as the broker and result backend
 app.conf.update(
     broker_url="redis://redis_cache:6379",  # Broker URL for Redis
@@ -25,12 +30,18 @@ app.conf.update(
     accept_content=["json"],  # Accept only JSON content for tasks
     result_serializer="json",  # Result serialization format
     timezone=TIME_ZONE,  # Set the timezone for Celery tasks
+    task_routes={
+        # Mails are sent by workers consuming the "mail" queue
+        "common.tasks.drain_mail_outbox": {"queue": "mail"},
+        "common.tasks.send_mail_batch": {"queue": "mail"},
+    },
 )
 
 # Deleting old temporary users
 app.conf.beat_schedule = {
-    "delete-old-temporary-users-every-day": {
-        "task": "accounts.tasks.delete_old_temporary_users",
+    # Temporary users, expired sessions, stale payments... see common/retention.py
+    "run-retention-rules-every-day": {
+        "task": "common.tasks.run_retention",
         "schedule": crontab(hour=0, minute=0),  # For production: Run at midnight
     },
 }
@@ -53,4 +64,25 @@ app.conf.beat_schedule.update({
          "schedule": crontab(hour=0, minute=0),
         # "schedule": crontab(minute="*/1"),  # every minute
     },
+    "create-payment-partitions-every-month": {
+        "task": "payment_service.tasks.create_payment_partitions",
+        "schedule": crontab(day_of_month=1, hour=1, minute=0),
+    },
+    "close-agent-commissions-every-month": {
+        "task": "payment_service.tasks.close_agent_commissions",
+        "schedule": crontab(day_of_month=1, hour=0, minute=30),
+    },
+    # Requeues the mails of drains interrupted by a crashed worker, see common/mail.py
+    "drain-mail-outbox-every-10-minutes": {
+        "task": "common.tasks.drain_mail_outbox",
+        "schedule": crontab(minute="*/10"),
+    },
+    "reconcile-balances-every-week": {
+        "task": "payment_service.tasks.reconcile_balances",
+        "schedule": crontab(day_of_week=0, hour=4, minute=0),
+    },
+    "archive-old-payments-every-month": {
+        "task": "payment_service.tasks.archive_old_payments",
+        "schedule": crontab(day_of_month=2, hour=3, minute=0),
+    },
 })
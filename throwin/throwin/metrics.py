@@ -0,0 +1,38 @@
+import ipaddress
+import secrets
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
+
+from common.metrics import render_metrics
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint.
+
+    The scraper must send METRICS_TOKEN as a bearer token. Without a token
+    nothing is served, except to loopback and private network addresses
+    when DEBUG is on: behind the production proxy every request comes from
+    a private address.
+    """
+
+    def get(self, request):
+        if not self._is_allowed(request):
+            return HttpResponseForbidden()
+        payload, content_type = render_metrics()
+        return HttpResponse(payload, content_type=content_type)
+
+    @staticmethod
+    def _is_allowed(request):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        if token:
+            return secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+        if not settings.DEBUG:
+            return False
+        try:
+            address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+        except ValueError:
+            return False
+        return address.is_loopback or address.is_private
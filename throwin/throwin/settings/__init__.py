@@ -10,8 +10,7 @@ elif DEVELOPMENT:
 else:
     from .local import *
 
-# Session Settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Store sessions in the database
+# Session Settings (SESSION_ENGINE is set per environment, sessions live in the cache)
 SESSION_COOKIE_AGE = 60*60  # 1 hour (60 minutes * 60 seconds)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Expire session when the browser is closed
 SESSION_SAVE_EVERY_REQUEST = True  # Refresh session expiry on each request
@@ -22,11 +22,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECRET_KEY: Used for cryptographic signing, keep it secret in production.
 # DEBUG: Should be False in production for security.
 # ENABLE_SILK: Toggle for Silk profiling middleware.
+# METRICS_TOKEN: Bearer token required to scrape /metrics (closed without it unless DEBUG).
+# ASYNC_PAYMENT_VIEWS: Route the gateway bound payment endpoints to their async views (ASGI).
 # ALLOWED_HOSTS: List of allowed host/domain names.
 
 SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG", default=False, cast=bool)
 ENABLE_SILK = config("ENABLE_SILK", default=False, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+ASYNC_PAYMENT_VIEWS = config("ASYNC_PAYMENT_VIEWS", default=False, cast=bool)
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=lambda v: [s.strip() for s in v.split(",")])
 
 # =========================
@@ -96,9 +100,10 @@ DEBUG_TOOLBAR_PANELS = [
 ]
 
 MIDDLEWARE = [
+    "common.middleware.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    "common.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -234,6 +239,7 @@ CORS_ALLOW_HEADERS = (
     "accept",
     "authorization",
     "content-type",
+    "idempotency-key",
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
@@ -253,6 +259,9 @@ SESSION_COOKIE_SECURE = False
 CORS_ALLOW_CREDENTIALS = True
 
 CSRF_USE_SESSIONS = True
+
+# Sessions (mostly guest names and likes) live in Redis instead of django_session
+SESSION_ENGINE = config("SESSION_ENGINE", default="django.contrib.sessions.backends.cache")
 # CSRF_COOKIE_DOMAIN = 'localhost:5173'
 # CSRF_COOKIE_DOMAIN = 'core-sm.online'
 CSRF_COOKIE_DOMAIN = None  # Defaults to the current domain
@@ -264,12 +273,18 @@ CSRF_COOKIE_DOMAIN = None  # Defaults to the current domain
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
+    # The browsable API is only built while debugging
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        "common.renderers.ORJSONRenderer",
+        *(("rest_framework.renderers.BrowsableAPIRenderer",) if DEBUG else ()),
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "common.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ),
     "DEFAULT_THROTTLE_CLASSES": (
         "rest_framework.throttling.AnonRateThrottle",
@@ -400,6 +415,25 @@ EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", cast=int, default=30)
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Batched mail dispatch, see common/mail.py
+MAIL_BATCH_SIZE = config("MAIL_BATCH_SIZE", default=50, cast=int)
+MAIL_RATE_LIMIT = config("MAIL_RATE_LIMIT", default=10, cast=int)  # Messages per second per provider
+MAIL_MAX_ATTEMPTS = config("MAIL_MAX_ATTEMPTS", default=5, cast=int)
+
+# Closed months of GMO payments older than this are moved to archive storage
+# by Celery beat, see payment_service/gmo_pg/archive.py. 0 disables it.
+GMO_ARCHIVE_AFTER_MONTHS = config("GMO_ARCHIVE_AFTER_MONTHS", default=0, cast=int)
+GMO_ARCHIVE_FORMAT = config("GMO_ARCHIVE_FORMAT", default="csv")  # csv or parquet (needs pyarrow)
+
+# Nightly cleanup of old rows, see common/retention.py. Rule ages can be
+# changed with RETENTION_OVERRIDES = {"rule name": {"age": timedelta(...)}}
+RETENTION_SLEEP_SECONDS = config("RETENTION_SLEEP_SECONDS", default=0.5, cast=float)  # Between batches
+RETENTION_OVERRIDES = {}
+
+# Throwin amount (JPY) spent at a store for each gacha spin. After changing it,
+# run `manage.py recompute_spins` to update the existing spin balances.
+GACHA_SPEND_PER_SPIN = config("GACHA_SPEND_PER_SPIN", default=3000, cast=int)
+
 FRONTEND_URL = config("FRONTEND_URL", default="http://localhost:5173")
 SITE_DOMAIN = config("SITE_DOMAIN", default="http://localhost:8000")
 
@@ -6,4 +6,11 @@ class StaticStorage(S3Boto3Storage):
 
 class MediaStorage(S3Boto3Storage):
     location = "media"
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
+
+class ArchiveStorage(S3Boto3Storage):
+    """Private location for archived payment months."""
+    location = "archive"
+    default_acl = "private"
+    querystring_auth = True
+    file_overwrite = False
@@ -9,9 +9,11 @@ admin.site.site_title = "Throwin Admin Panel"
 admin.site.index_title = "Welcome to Throwin Panel"
 
 from .health_check import HealthCheckView
+from .metrics import MetricsView
 
 urlpatterns = [
     path('', HealthCheckView.as_view(), name='health_check'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     
     path('admin/', admin.site.urls),
     path("auth", include("accounts.rest.urls")),
@@ -19,7 +21,7 @@ urlpatterns = [
     path('payment_service/', include('payment_service.urls')),
     path('restaurant-owner', include('store.rest.urls.restaurant_owner')),
     path("admins", include("store.rest.urls.fc_glow_sales_agents")),
-    # path("notifications", include("notification.rest.urls.notification")),
+    path("notifications", include("notification.rest.urls.notification")),
 
     path("gacha", include("gacha.urls")),
 ]